@@ -7,6 +7,7 @@ from sklearn.metrics import mean_squared_error, r2_score
 import joblib
 import logging
 import os
+from data.dataset_store import load_crop_dataset
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,8 +16,8 @@ logger = logging.getLogger(__name__)
 def load_data():
     """Load and preprocess the crop yield dataset"""
     try:
-        # Load the dataset
-        df = pd.read_csv('data/crop_yields.csv')
+        # Load the dataset (the same CSV the model is trained and updated on)
+        df = load_crop_dataset(mmap=False)
         
         # Basic preprocessing
         df = df.dropna()  # Remove rows with missing values
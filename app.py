@@ -1,13 +1,22 @@
-from flask import Flask, render_template, request, jsonify
-import joblib
-import pandas as pd
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
 import numpy as np
 from data.location_data import get_states, get_districts, get_taluks, get_weather_for_location
-from data.crop_data import CROP_DATA, load_crop_yield_data, average_yield_per_crop
-from train_model import train_model
+from data.crop_data import get_crop_data
+from data.dataset_store import dataset_store, get_dataset
+from data.group_index import get_group_index
+from data.crop_lookup import get_crop_lookup
+from data.analog_index import get_analog_index
+from models.model_bundle import ModelBundle, MODEL_FILENAME
+from models.crop_shards import shards_enabled
+from models.micro_batcher import MicroBatcher
+from models.model_warmup import ModelWarmup, ModelNotReady
 import logging
 import os
 import json
+import threading
+from datetime import datetime
+from functools import wraps
+from metrics import registry as metrics_registry
 
 app = Flask(__name__)
 
@@ -20,84 +29,95 @@ MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
 if not os.path.exists(MODEL_DIR):
     os.makedirs(MODEL_DIR)
 
-MODEL_PATH = os.path.join(MODEL_DIR, 'crop_yield_model.pkl')
-SCALER_PATH = os.path.join(MODEL_DIR, 'scaler.pkl')
-FEATURES_PATH = os.path.join(MODEL_DIR, 'feature_columns.json')
-CATEGORICAL_VALUES_PATH = os.path.join(MODEL_DIR, 'categorical_values.json')
-CROP_STATS_PATH = os.path.join(MODEL_DIR, 'crop_stats.json')
-
-# Initialize model and scaler
-model = None
-scaler = None
-feature_columns = None
-categorical_values = None
-
-def initialize_model():
-    global model, scaler, feature_columns, categorical_values
-    
-    try:
-        # Check if model exists, if not train it
-        if not os.path.exists(MODEL_PATH):
-            logger.info("Model not found. Training new model...")
-            result = train_model()
-            
-            if result['status'] != 'success':
-                raise Exception(f"Model training failed: {result.get('error', 'Unknown error')}")
-                
-            model = result['model']
-            feature_columns = result['feature_columns']
-            scaler = result['scaler']  # Ensure scaler is included in the training result
-            
-            # Save the model components
-            joblib.dump(model, MODEL_PATH)
-            joblib.dump(scaler, SCALER_PATH)  # Save the scaler
-            with open(FEATURES_PATH, 'w') as f:
-                json.dump(feature_columns, f)
-            
-            # Save categorical values
-            categorical_values = result.get('categorical_values', {})
-            with open(CATEGORICAL_VALUES_PATH, 'w') as f:
-                json.dump(categorical_values, f)
-            
-            logger.info("Model trained and saved successfully")
-        else:
-            # Load existing model components
-            logger.info("Loading existing model...")
-            model = joblib.load(MODEL_PATH)
-            scaler = joblib.load(SCALER_PATH)  # Load the scaler
-            with open(FEATURES_PATH, 'r') as f:
-                feature_columns = json.load(f)
-            
-            # Load categorical values
-            with open(CATEGORICAL_VALUES_PATH, 'r') as f:
-                categorical_values = json.load(f)
-        
-        logger.info("Model initialization successful")
-        return True
-    except Exception as e:
-        logger.error(f"Error initializing model: {str(e)}")
-        return False
-
-# Initialize the model when app starts
-if not initialize_model():
-    logger.error("Failed to initialize model. Application may not work correctly.")
-
-# Load and clean the data once when the app starts
-try:
-    df = pd.read_csv('data/crop_yield.csv')
-    # Clean the data
-    df['Season'] = df['Season'].str.strip()  # Remove extra spaces
-    df['State'] = df['State'].str.strip()    # Remove extra spaces
-    df['Crop'] = df['Crop'].str.strip()      # Remove extra spaces
-    
-    # Debug info
-    logger.info(f"Data loaded successfully. Shape: {df.shape}")
-    logger.info(f"Unique seasons: {sorted(df['Season'].unique())}")
-    logger.info(f"Unique states: {sorted(df['State'].unique())}")
-    logger.info(f"Sample of first few rows:\n{df.head()}")
-except Exception as e:
-    logger.error(f"Error loading data: {str(e)}")
-    df = None
+MODEL_PATH = os.path.join(MODEL_DIR, MODEL_FILENAME)
+
+# Currently published model bundle. Requests read this reference once and use
+# that bundle throughout, so swapping in a new bundle is a single assignment.
+model_bundle = None
+_reload_lock = threading.Lock()
+
+def current_bundle():
+    """Return the published model bundle, or raise ModelNotReady while it warms up"""
+    bundle = model_bundle
+    if bundle is None:
+        raise ModelNotReady("Model is warming up")
+    return bundle
+
+# Opt-in per-crop shards (CROPSMART_SHARDS=1, which also makes train_model.py
+# build them), read into memory on first use and held in an LRU capped at
+# CROPSMART_SHARD_CACHE_MB of tree arrays per worker; other crops use the
+# global model
+SHARDS_ENABLED = shards_enabled()
+SHARD_CACHE_MB = float(os.environ.get('CROPSMART_SHARD_CACHE_MB', '64'))
+
+# Opt-in: also load the pickled sklearn forest and score batches of
+# ESTIMATOR_MIN_ROWS+ rows with it (about 2x faster at 4096 rows). It costs
+# every worker a private copy of the trees, about the size of
+# crop_yield_model.pkl (~140 MB), on top of the shared memory-mapped forest,
+# and a few more seconds per (re)load.
+BATCH_ESTIMATOR_ENABLED = os.environ.get('CROPSMART_BATCH_ESTIMATOR', '0') == '1'
+
+def reload_model():
+    """Load the artifacts on disk into a new bundle and swap it in"""
+    global model_bundle
+
+    with _reload_lock:
+        try:
+            shard_cache_bytes = SHARD_CACHE_MB * 1024 * 1024 if SHARDS_ENABLED else None
+            bundle = ModelBundle.load(
+                MODEL_DIR, shard_cache_bytes=shard_cache_bytes, batch_estimator=BATCH_ESTIMATOR_ENABLED
+            )
+        except Exception as e:
+            logger.error(f"Error reloading model: {str(e)}")
+            return False
+        previous = model_bundle
+        model_bundle = bundle
+    model_warmup.mark_ready()
+    logger.info(f"Model bundle swapped: {previous.version if previous else None} -> {bundle.version}")
+
+    # A new model may come with new dataset rows (an incremental update appends
+    # them), so republish the dataset; its listeners rebuild the crop lookup and
+    # group index. Not loaded yet means the first request reads it fresh.
+    if dataset_store.loaded:
+        try:
+            dataset_store.reload()
+        except Exception as e:
+            logger.error(f"Error reloading dataset: {str(e)}")
+    return True
+
+def reload_model_async():
+    """Reload the model bundle on a background thread"""
+    thread = threading.Thread(target=reload_model, name='model-reload', daemon=True)
+    thread.start()
+    return thread
+
+def _predict_micro_batch(items):
+    """Score queued (record, crop) pairs with one call on the current bundle"""
+    bundle = current_bundle()
+    records = [record for record, _ in items]
+    crops = [crop for _, crop in items]
+    outputs = bundle.predict_bounded(records, crops)
+    return [tuple(output[i:i + 1] for output in outputs) for i in range(len(items))]
+
+# Opt-in micro-batching of concurrent /api/predict calls
+MICRO_BATCH_ENABLED = os.environ.get('CROPSMART_MICRO_BATCH', '0') == '1'
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('CROPSMART_MICRO_BATCH_MAX_SIZE', '32'))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get('CROPSMART_MICRO_BATCH_MAX_WAIT_MS', '5'))
+
+micro_batcher = None
+if MICRO_BATCH_ENABLED:
+    micro_batcher = MicroBatcher(
+        _predict_micro_batch,
+        max_batch_size=MICRO_BATCH_MAX_SIZE,
+        max_wait_ms=MICRO_BATCH_MAX_WAIT_MS
+    )
+    logger.info(f"Micro-batching enabled (max size {MICRO_BATCH_MAX_SIZE}, window {MICRO_BATCH_MAX_WAIT_MS} ms)")
+
+# Train (when the artifacts are missing) and load the model in the background
+# so lightweight routes are served while the model warms up
+AUTOTRAIN = os.environ.get('CROPSMART_AUTOTRAIN', '1') == '1'
+model_warmup = ModelWarmup(MODEL_PATH, reload_model, autotrain=AUTOTRAIN)
+model_warmup.start()
 
 @app.route('/')
 def home():
@@ -115,165 +135,219 @@ def predict_page():
     try:
         states = get_states()
         # Use the same crop list as optimize page
-        crops = sorted(df['Crop'].unique())
+        crops = sorted(get_dataset()['Crop'].unique())
         return render_template('predict.html', states=states, crops=crops)
     except Exception as e:
         logger.error(f"Error in predict route: {str(e)}")
         return render_template('error.html', error=str(e))
 
+def timed_route(name):
+    """Record request and stage latencies for a view under ``name``.
+
+    The view's timer is available as ``g.timer``; it is a no-op until
+    /metrics has been scraped.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.timer = metrics_registry.route(name)
+            with g.timer:
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timed_stream_route(name):
+    """Like :func:`timed_route` for views that may return a streamed response.
+
+    A streamed body is generated after the view returns, so the request is
+    observed when the response is closed rather than when the view exits.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            timer = g.timer = metrics_registry.route(name)
+            timer.__enter__()
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except BaseException:
+                timer.__exit__(None, None, None)
+                raise
+            if response.is_streamed:
+                response.call_on_close(lambda: timer.__exit__(None, None, None))
+            else:
+                timer.__exit__(None, None, None)
+            return response
+        return wrapper
+    return decorator
+
+def model_warming_response():
+    """503 returned by prediction routes until the model bundle is ready"""
+    status = model_warmup.status()
+    response = jsonify({
+        'success': False,
+        'status': 'warming' if status['state'] not in ('failed', 'missing') else status['state'],
+        'error': 'Model is warming up. Please retry shortly.',
+        'model': status
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+@app.route('/healthz')
+def healthz():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe: succeeds only once the model bundle is loaded"""
+    status = model_warmup.status()
+    if model_bundle is None:
+        return jsonify({'ready': False, 'model': status}), 503
+    return jsonify({'ready': True, 'model': status, 'version': model_bundle.version})
+
+@app.route('/metrics')
+def metrics():
+    """Expose latency histograms in the Prometheus text format"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+# Fallback inputs used when a request leaves a numeric field empty
+DEFAULT_INPUT_VALUES = {
+    'Area': 1.0,  # 1 hectare
+    'Production': 0.0,
+    'Annual_Rainfall': 1000.0,  # 1000mm
+    'Fertilizer': 100.0,  # 100kg
+    'Pesticide': 1.0  # 1kg
+}
+
+# 1 hectare = 2.47105 acres
+ACRES_PER_HECTARE = 2.47105
+
+# Inputs /api/predict/sensitivity can sweep, by payload name
+SWEEP_VARIABLES = {
+    'fertilizer': 'Fertilizer',
+    'pesticide': 'Pesticide',
+    'rainfall': 'Annual_Rainfall',
+    'area': 'Area',
+    'production': 'Production',
+    'year': 'Crop_Year'
+}
+# Swept on whole values only; the model never saw fractional years
+INTEGER_SWEEP_VARIABLES = {'year'}
+MAX_SWEEP_VARIABLES = 2
+DEFAULT_SWEEP_STEPS = 50
+MAX_SWEEP_STEPS = 100
+
+# Model-driven optimization scores a GRID_SIZE x GRID_SIZE grid of fertilizer
+# and pesticide rates spanning +/- OPTIMIZE_SPAN around the user's rates; the
+# grid size is odd so its center is exactly the user's current inputs
+OPTIMIZE_GRID_SIZE = 17
+OPTIMIZE_SPAN = 0.5
+
+def safe_float(value, default=0.0):
+    """Convert a form value to float, falling back to a default"""
+    try:
+        return float(value) if value else default
+    except (ValueError, TypeError):
+        return default
+
+def prepare_prediction_input(data):
+    """Build the model input record for one /api/predict payload"""
+    # Get weather data for the location
+    with g.timer.stage('weather'):
+        weather = get_weather_for_location(data['state'], data.get('district', ''))
+
+    # Get current year if not provided
+    current_year = datetime.now().year
+
+    # Prepare input data with actual provided values
+    return {
+        'State': data['state'],
+        'District': data.get('district', ''),
+        'Crop': data['crop'],
+        'Season': data.get('season', 'Kharif'),
+        'Area': safe_float(data.get('area')),  # Remove default to see if value is provided
+        'Production': safe_float(data.get('production')),
+        'Annual_Rainfall': weather.get('annual_rainfall'),
+        'Fertilizer': safe_float(data.get('fertilizer')),
+        'Pesticide': safe_float(data.get('pesticide')),
+        'Crop_Year': int(data.get('year', current_year))
+    }
+
+def fill_default_inputs(input_data):
+    """Return a copy of the input record with missing numeric values filled"""
+    record = dict(input_data)
+    for col, default_val in DEFAULT_INPUT_VALUES.items():
+        if record[col] is None:
+            logger.info(f"Filling missing value for {col} with default: {default_val}")
+            record[col] = default_val
+    return record
+
+def sweep_axis(name, low, high, steps):
+    """Values of one swept input: ``steps`` evenly spaced values from ``low`` to
+    ``high``, or for integer inputs the whole numbers in that range thinned to
+    at most ``steps``"""
+    if name not in INTEGER_SWEEP_VARIABLES:
+        return np.linspace(low, high, steps)
+    values = np.arange(np.ceil(low), np.floor(high) + 1)
+    if len(values) == 0:
+        raise ValueError(f"{name} range {low} to {high} contains no whole values")
+    if len(values) > steps:
+        # Evenly spaced positions that always keep both ends
+        values = values[np.round(np.linspace(0, len(values) - 1, steps)).astype(int)]
+    return values
+
+
+def yields_per_acre(bounded_yields, areas):
+    """Convert tonnes/hectare to tons/acre and total tons, rounded to 2 places"""
+    per_acre = bounded_yields / ACRES_PER_HECTARE
+    totals = per_acre * areas
+    return np.round(per_acre, 2), np.round(totals, 2)
+
 @app.route('/api/predict', methods=['POST'])
+@timed_route('/api/predict')
 def predict():
     """Make crop yield predictions"""
     try:
-        # Ensure model is initialized
-        if model is None or scaler is None or feature_columns is None or categorical_values is None:
-            if not initialize_model():
-                raise ValueError("Failed to initialize model components")
+        # Fails with ModelNotReady until the model has warmed up
+        bundle = current_bundle()
 
         # Get JSON data
-        data = request.json
+        with g.timer.stage('parse'):
+            data = request.json
         logger.info(f"Received prediction request with data: {data}")
 
-        # Get weather data for the location
-        weather = get_weather_for_location(data['state'], data.get('district', ''))
-        
-        # Convert numeric values
-        def safe_float(value, default=0.0):
-            try:
-                return float(value) if value else default
-            except (ValueError, TypeError):
-                return default
-        
-        # Get current year if not provided
-        from datetime import datetime
-        current_year = datetime.now().year
-        
-        # Prepare input data with actual provided values
-        input_data = {
-            'State': data['state'],
-            'District': data.get('district', ''),
-            'Crop': data['crop'],
-            'Season': data.get('season', 'Kharif'),
-            'Area': safe_float(data.get('area')),  # Remove default to see if value is provided
-            'Production': safe_float(data.get('production')),
-            'Annual_Rainfall': weather.get('annual_rainfall'),
-            'Fertilizer': safe_float(data.get('fertilizer')),
-            'Pesticide': safe_float(data.get('pesticide')),
-            'Crop_Year': int(data.get('year', current_year))
-        }
-
-        # Log the received data for debugging
-        logger.info(f"Received input data: {data}")
+        input_data = prepare_prediction_input(data)
         logger.info(f"Processed input data: {input_data}")
-        
-        # Create initial DataFrame
-        df = pd.DataFrame([input_data])
-        
-        # Fill missing numeric values with defaults after creating DataFrame
-        default_values = {
-            'Area': 1.0,  # 1 hectare
-            'Production': 0.0,
-            'Annual_Rainfall': 1000.0,  # 1000mm
-            'Fertilizer': 100.0,  # 100kg
-            'Pesticide': 1.0  # 1kg
-        }
-        
-        # Fill NaN values with defaults and log what was filled
-        for col, default_val in default_values.items():
-            if pd.isna(df[col]).any():
-                logger.info(f"Filling missing value for {col} with default: {default_val}")
-                df[col] = df[col].fillna(default_val)
-
-        logger.info(f"DataFrame after filling defaults: {df.to_dict('records')}")
-
-        # Strip whitespace from string columns
-        categorical_columns = ['Crop', 'Season', 'State']
-        for col in categorical_columns:
-            df[col] = df[col].str.strip()
-
-        # Create dummy variables for each categorical column
-        encoded_df = df.copy()
-        for col in categorical_columns:
-            # Get all possible categories for this column from training
-            possible_categories = categorical_values[col]
-            
-            # Create dummy variables for the current column
-            dummies = pd.get_dummies(encoded_df[col], prefix=col)
-            
-            # Add all possible dummy columns from training
-            for category in possible_categories:
-                dummy_col = f"{col}_{category}"
-                if dummy_col not in dummies.columns:
-                    dummies[dummy_col] = 0
-            
-            # Only keep dummy columns that were in training
-            keep_cols = [f"{col}_{category}" for category in possible_categories]
-            dummies = dummies[keep_cols]
-            
-            # Add dummy variables to the dataset
-            encoded_df = pd.concat([encoded_df, dummies], axis=1)
-            # Remove the original categorical column
-            encoded_df.drop(col, axis=1, inplace=True)
 
-        # Ensure all numeric feature columns are present
-        numeric_features = ['Crop_Year', 'Area', 'Production', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
-        
-        # Log the values before scaling
-        logger.info("Numeric feature values before scaling:")
-        for col in numeric_features:
-            if col in encoded_df.columns:
-                logger.info(f"{col}: {encoded_df[col].values[0]}")
-
-        # Reorder columns to match training data
-        encoded_df = encoded_df[feature_columns]
-        logger.info(f"Final feature values before scaling: {encoded_df.iloc[0].to_dict()}")
-
-        # Scale the features
-        scaled_features = scaler.transform(encoded_df)
-        logger.info(f"Scaled features shape: {scaled_features.shape}")
-
-        # Make prediction
-        prediction = model.predict(scaled_features)
-        predicted_yield = float(prediction[0])
-        
-        # Get crop statistics for this specific crop
-        with open(CROP_STATS_PATH, 'r') as f:
-            crop_stats = json.load(f)
-            
         crop_name = data['crop']
-        crop_mean = crop_stats['means'].get(crop_name, 5.0)  # Default mean if crop not found
-        crop_std = crop_stats['stds'].get(crop_name, 2.0)   # Default std if crop not found
-        
-        # Set reasonable bounds based on crop statistics (mean ± 3 standard deviations)
-        min_yield = max(0.1, crop_mean - 3 * crop_std)
-        max_yield = crop_mean + 3 * crop_std
-        
-        # Ensure prediction is within reasonable bounds for this specific crop
-        predicted_yield = max(min_yield, min(max_yield, predicted_yield))
-        
-        # Convert yield from tonnes/hectare to tons/acre (1 hectare = 2.47105 acres)
-        predicted_yield_per_acre = predicted_yield / 2.47105
-        
+        record = fill_default_inputs(input_data)
+        if micro_batcher is not None:
+            with g.timer.stage('micro_batch'):
+                raw_yields, bounded_yields, crop_means, crop_stds = micro_batcher.predict((record, crop_name))
+        else:
+            raw_yields, bounded_yields, crop_means, crop_stds = bundle.predict_bounded(
+                [record], [crop_name], timer=g.timer
+            )
+
         # Calculate total yield based on area if provided
         area = safe_float(data.get('area', 1.0))
-        total_predicted_yield = predicted_yield_per_acre * area  # Total yield in tons
-        
-        # Round all values to 2 decimal places
-        predicted_yield_per_acre = round(predicted_yield_per_acre, 2)
-        total_predicted_yield = round(total_predicted_yield, 2)
-        
+        per_acre, totals = yields_per_acre(bounded_yields, np.array([area]))
+        predicted_yield_per_acre = float(per_acre[0])
+        total_predicted_yield = float(totals[0])
+
         logger.info(f"Prediction details:")
         logger.info(f"Crop: {crop_name}")
-        logger.info(f"Mean yield for crop: {crop_mean:.2f} tonnes/hectare")
-        logger.info(f"Std dev for crop: {crop_std:.2f} tonnes/hectare")
-        logger.info(f"Raw prediction: {prediction[0]:.2f} tonnes/hectare")
-        logger.info(f"Bounded prediction: {predicted_yield:.2f} tonnes/hectare")
+        logger.info(f"Mean yield for crop: {crop_means[0]:.2f} tonnes/hectare")
+        logger.info(f"Std dev for crop: {crop_stds[0]:.2f} tonnes/hectare")
+        logger.info(f"Raw prediction: {raw_yields[0]:.2f} tonnes/hectare")
+        logger.info(f"Bounded prediction: {bounded_yields[0]:.2f} tonnes/hectare")
         logger.info(f"Area: {area:.2f} acres")
         logger.info(f"Final prediction per acre: {predicted_yield_per_acre:.2f} tons/acre")
         logger.info(f"Total predicted yield: {total_predicted_yield:.2f} tons")
 
         # Get crop information
-        crop_info = CROP_DATA.get(data['crop'], {})
+        crop_info = get_crop_data().get(data['crop'], {})
         
         response = {
             'success': True,
@@ -285,8 +359,11 @@ def predict():
         }
         
         logger.info(f"Prediction response: {response}")
-        return jsonify(response)
+        with g.timer.stage('serialize'):
+            return jsonify(response)
 
+    except ModelNotReady:
+        return model_warming_response()
     except Exception as e:
         logger.error(f"Error in predict route: {str(e)}")
         return jsonify({
@@ -294,10 +371,170 @@ def predict():
             'error': str(e)
         })
 
+@app.route('/api/predict/batch', methods=['POST'])
+@timed_route('/api/predict/batch')
+def predict_batch():
+    """Make crop yield predictions for many fields in one request.
+
+    Accepts a JSON array of /api/predict payloads (or ``{"inputs": [...]}``).
+    Rows with invalid input get their own error entry; the remaining rows are
+    scored together in a single model call.
+    """
+    try:
+        # Fails with ModelNotReady until the model has warmed up
+        bundle = current_bundle()
+
+        with g.timer.stage('parse'):
+            data = request.json
+        items = data.get('inputs') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of prediction inputs")
+        logger.info(f"Received batch prediction request with {len(items)} inputs")
+
+        results = [None] * len(items)
+        valid_indices, input_rows, records, crops, areas = [], [], [], [], []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("Prediction input must be an object")
+                input_data = prepare_prediction_input(item)
+                records.append(fill_default_inputs(input_data))
+            except Exception as e:
+                results[index] = {'index': index, 'success': False, 'error': str(e)}
+                continue
+            valid_indices.append(index)
+            input_rows.append(input_data)
+            crops.append(item['crop'])
+            areas.append(safe_float(item.get('area', 1.0)))
+
+        if records:
+            areas = np.array(areas)
+            _, bounded_yields, _, _ = bundle.predict_bounded(records, crops, timer=g.timer)
+            per_acre, totals = yields_per_acre(bounded_yields, areas)
+            for row, index in enumerate(valid_indices):
+                results[index] = {
+                    'index': index,
+                    'success': True,
+                    'predicted_yield': float(per_acre[row]),
+                    'total_yield': float(totals[row]),
+                    'area': float(areas[row]),
+                    'input_data': input_rows[row]
+                }
+
+        failed = len(items) - len(valid_indices)
+        logger.info(f"Batch prediction completed: {len(valid_indices)} succeeded, {failed} failed")
+        with g.timer.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'count': len(items),
+                'failed': failed,
+                'results': results
+            })
+
+    except ModelNotReady:
+        return model_warming_response()
+    except Exception as e:
+        logger.error(f"Error in predict_batch route: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/predict/sensitivity', methods=['POST'])
+@timed_route('/api/predict/sensitivity')
+def predict_sensitivity():
+    """Predicted yield as one or two inputs sweep over a range.
+
+    Takes an /api/predict payload plus ``sweep``: a list of one or two
+    ``{"variable", "min", "max", "steps"}`` objects. The whole grid is
+    scored in a single model call. With two variables the yields form a
+    surface with one row per value of the first variable.
+    """
+    try:
+        # Fails with ModelNotReady until the model has warmed up
+        bundle = current_bundle()
+
+        with g.timer.stage('parse'):
+            data = request.json
+            sweep = data.get('sweep')
+            if not isinstance(sweep, list) or not 1 <= len(sweep) <= MAX_SWEEP_VARIABLES:
+                raise ValueError(f"sweep must list 1 to {MAX_SWEEP_VARIABLES} variables")
+            names, axes = [], []
+            for spec in sweep:
+                name = spec['variable']
+                if name not in SWEEP_VARIABLES:
+                    raise ValueError(f"Cannot sweep {name}; choose from {', '.join(SWEEP_VARIABLES)}")
+                if name in names:
+                    raise ValueError(f"{name} is swept twice")
+                steps = int(spec.get('steps', DEFAULT_SWEEP_STEPS))
+                if not 2 <= steps <= MAX_SWEEP_STEPS:
+                    raise ValueError(f"steps must be between 2 and {MAX_SWEEP_STEPS}")
+                names.append(name)
+                axes.append(sweep_axis(name, float(spec['min']), float(spec['max']), steps))
+        logger.info(f"Received sensitivity request sweeping {names}")
+
+        input_data = prepare_prediction_input(data)
+        record = fill_default_inputs(input_data)
+        crop_name = data['crop']
+
+        raw_yields = bundle.predict_grid(record, {SWEEP_VARIABLES[name]: axis for name, axis in zip(names, axes)},
+                                         timer=g.timer)
+        with g.timer.stage('crop_stats'):
+            bounded_yields, _, _ = bundle.crop_stats.clamp([crop_name], raw_yields.ravel())
+
+        if 'area' in names:
+            areas = np.meshgrid(*axes, indexing='ij')[names.index('area')].ravel()
+        else:
+            areas = np.full(len(bounded_yields), safe_float(data.get('area', 1.0)))
+        per_acre, totals = yields_per_acre(bounded_yields, areas)
+
+        response = {
+            'success': True,
+            'variables': [{'name': name, 'values': axis.tolist()} for name, axis in zip(names, axes)],
+            'predicted_yield': per_acre.reshape(raw_yields.shape).tolist(),
+            'total_yield': totals.reshape(raw_yields.shape).tolist(),
+            'input_data': input_data
+        }
+        logger.info(f"Sensitivity sweep scored {len(bounded_yields)} inputs")
+        with g.timer.stage('serialize'):
+            return jsonify(response)
+
+    except ModelNotReady:
+        return model_warming_response()
+    except Exception as e:
+        logger.error(f"Error in predict_sensitivity route: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/model', methods=['GET'])
+def model_info():
+    """Describe the model bundle currently serving predictions"""
+    bundle = model_bundle
+    if bundle is None:
+        return jsonify({'success': False, 'error': 'Model is not loaded', 'model': model_warmup.status()}), 503
+    response = {'success': True, 'model': bundle.describe()}
+    if micro_batcher is not None:
+        response['micro_batching'] = micro_batcher.stats()
+    return jsonify(response)
+
+@app.route('/api/model/reload', methods=['POST'])
+def model_reload():
+    """Load the model artifacts on disk in the background and swap them in"""
+    bundle = model_bundle
+    reload_model_async()
+    return jsonify({
+        'success': True,
+        'status': 'reloading',
+        'current_version': bundle.version if bundle else None
+    }), 202
+
 @app.route('/optimize')
 def optimize():
     """Render the optimize page"""
     try:
+        df = get_dataset()
         states = sorted(df['State'].unique())
         seasons = sorted(df['Season'].unique())
         logger.info(f"Available states: {states}")
@@ -348,125 +585,151 @@ def get_crops():
         if not state or not season:
             return jsonify({'error': 'State and season are required'}), 400
             
-        # Debug info
-        logger.info(f"Received request for state: '{state}' and season: '{season}'")
-        logger.info(f"Sample of data for this state/season:\n{df[df['State'] == state].head()}")
-            
-        # Filter crops based on state and season
-        filtered_df = df[
-            (df['State'] == state) & 
-            (df['Season'] == season)
-        ]
-        
-        # Debug info
-        logger.info(f"Filtered data shape: {filtered_df.shape}")
-        logger.info(f"Filtered data sample:\n{filtered_df.head()}")
-        
-        filtered_crops = filtered_df['Crop'].unique().tolist()
-        filtered_crops.sort()
-        
-        logger.info(f"Found {len(filtered_crops)} crops for {state} in {season} season")
-        logger.info(f"Crops: {filtered_crops}")
-        
-        return jsonify(filtered_crops)
+        # Serve the precomputed crop list; browsers revalidate with If-None-Match
+        body, etag = get_crop_lookup().response_for(state, season)
+        logger.info(f"Crop list requested for {state} in {season} season")
+
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"Error in get_crops: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/optimize', methods=['POST'])
-def optimize_yield():
-    try:
-        data = request.json
-        logger.info(f"Received optimization request: {data}")
+def optimize_inputs_with_model(bundle, data, group, area, fertilizer, pesticide, rainfall):
+    """Search fertilizer and pesticide rates (kg/acre) for the best predicted yield.
 
-        # Load crop yield data
-        df = pd.read_csv('data/crop_yield.csv')
+    Every point of the grid around the given rates is scored in one model
+    call and clamped to the crop's bounds. Among equally good points the one
+    closest to the current rates wins, so flat regions of the response
+    surface don't suggest needless changes.
 
-        # Get input parameters
-        state = data['state']
-        season = data['season']
-        crop = data['crop']
-        area = float(data['area'])  # in acres
-        fertilizer = float(data['fertilizer'])  # per acre
-        pesticide = float(data['pesticide'])  # per acre
-        rainfall = float(data['rainfall'])  # in mm
+    The model was trained on state-level totals, so like /api/recommend the
+    rates are scored as totals over the group's historical mean area; the
+    predicted yields (per hectare) are then scaled to the farm's ``area``.
+    Production is scaled the same way, and taken from the group's mean
+    yield when not given: the model leans on it heavily, and a zero puts
+    every candidate outside the training data.
+    """
+    group_area = group.mean('Area')
+    production = safe_float(data.get('production'))
+    production_per_hectare = production / (area * 0.4047) if production > 0 and area > 0 else group.mean('Yield')
+    # Rates of zero have no neighborhood; center on the group's history instead
+    if fertilizer <= 0:
+        fertilizer = group.mean('fertilizer_ratio') * 0.4047
+    if pesticide <= 0:
+        pesticide = group.mean('pesticide_ratio') * 0.4047
+    multipliers = np.linspace(1 - OPTIMIZE_SPAN, 1 + OPTIMIZE_SPAN, OPTIMIZE_GRID_SIZE)
+    fertilizer_axis = fertilizer * multipliers
+    pesticide_axis = pesticide * multipliers
+    fertilizer_grid, pesticide_grid = np.meshgrid(fertilizer_axis, pesticide_axis)
 
-        # Convert acres to hectares (1 acre = 0.4047 hectares)
-        area_hectares = area * 0.4047
-        fertilizer_per_hectare = fertilizer / 0.4047  # convert to kg/hectare
-        pesticide_per_hectare = pesticide / 0.4047  # convert to kg/hectare
+    record = {
+        'State': data['state'],
+        'Season': data['season'],
+        'Crop': data['crop'],
+        'Crop_Year': int(data.get('year', datetime.now().year)),
+        'Area': group_area,
+        'Production': production_per_hectare * group_area,
+        'Annual_Rainfall': rainfall,
+        'Fertilizer': fertilizer / 0.4047 * group_area,
+        'Pesticide': pesticide / 0.4047 * group_area
+    }
+    # Per-hectare rates as totals over the group's typical area, as in the training data
+    raw_yields = bundle.predict_variations(record, {
+        'Fertilizer': fertilizer_grid.ravel() / 0.4047 * group_area,
+        'Pesticide': pesticide_grid.ravel() / 0.4047 * group_area
+    }, timer=g.timer)
+    with g.timer.stage('crop_stats'):
+        bounded_yields, _, _ = bundle.crop_stats.clamp([data['crop']] * len(raw_yields), raw_yields)
+    per_acre, totals = yields_per_acre(bounded_yields, np.full(len(bounded_yields), area))
 
-        # Filter data for the state, season, and crop
-        filtered_data = df[
-            (df['State'].str.strip() == state.strip()) &
-            (df['Season'].str.strip() == season.strip()) &
-            (df['Crop'].str.strip() == crop.strip())
-        ].copy()
+    distance = np.abs(multipliers[:, None] - 1) + np.abs(multipliers[None, :] - 1)
+    best_candidates = np.flatnonzero(bounded_yields >= bounded_yields.max() - 1e-9)
+    best = best_candidates[np.argmin(distance.ravel()[best_candidates])]
+    current = fertilizer_grid.size // 2
 
-        if filtered_data.empty:
-            return jsonify({
-                'error': f'No data available for {crop} in {state} during {season} season'
-            }), 404
+    def operating_point(i):
+        return {
+            'fertilizer': round(float(fertilizer_grid.flat[i]), 2),
+            'pesticide': round(float(pesticide_grid.flat[i]), 2),
+            'yield_per_acre': float(per_acre[i]),
+            'expected_yield': float(totals[i])
+        }
 
-        # Calculate input ratios (per hectare)
-        input_fertilizer_ratio = fertilizer_per_hectare
-        input_pesticide_ratio = pesticide_per_hectare
+    best_point = operating_point(best)
+    current_yield = bounded_yields[current]
+    best_point['yield_gain_pct'] = (
+        round(float((bounded_yields[best] - current_yield) / current_yield * 100), 1) if current_yield > 0 else 0.0
+    )
+    return {
+        'candidates': int(fertilizer_grid.size),
+        'model_version': bundle.version,
+        'current': operating_point(current),
+        'best': best_point,
+        'surface': {
+            'fertilizer': np.round(fertilizer_axis, 2).tolist(),
+            'pesticide': np.round(pesticide_axis, 2).tolist(),
+            # One row per pesticide rate, one column per fertilizer rate
+            'yield_per_acre': per_acre.reshape(fertilizer_grid.shape).tolist()
+        }
+    }
 
-        # Calculate same ratios for historical data
-        filtered_data['fertilizer_ratio'] = filtered_data['Fertilizer'] / filtered_data['Area']
-        filtered_data['pesticide_ratio'] = filtered_data['Pesticide'] / filtered_data['Area']
+def historical_recommendations(group, crop, season, areas, fertilizer_per_hectare, pesticide_per_hectare):
+    """Historical recommendation for every farm of one (State, Season, Crop) group.
 
-        # Calculate similarity scores based on input ratios
-        filtered_data['fertilizer_similarity'] = 1 / (1 + abs(filtered_data['fertilizer_ratio'] - input_fertilizer_ratio))
-        filtered_data['pesticide_similarity'] = 1 / (1 + abs(filtered_data['pesticide_ratio'] - input_pesticide_ratio))
+    The group's statistics are shared by its farms; only the similarity of
+    each farm's input rates to the group's rows and the area-dependent totals
+    differ, and both are computed for all farms with array operations.
+    """
+    # Similarity of the group's rows to each farm's input ratios (per hectare)
+    fertilizer_similarity = (
+        1 / (1 + np.abs(group.values('fertilizer_ratio')[None, :] - fertilizer_per_hectare[:, None]))
+    ).mean(axis=1)
+    pesticide_similarity = (
+        1 / (1 + np.abs(group.values('pesticide_ratio')[None, :] - pesticide_per_hectare[:, None]))
+    ).mean(axis=1)
 
-        # Calculate overall similarity score (weighted average)
-        filtered_data['similarity_score'] = (
-            filtered_data['fertilizer_similarity'] * 0.4 +
-            filtered_data['pesticide_similarity'] * 0.4 +
-            filtered_data['Yield'] * 0.2  # Also consider historical yield
-        )
+    # Precomputed statistics for the selected crop
+    avg_yield = group.mean('Yield')
+    yield_std = group.std('Yield')
+    avg_rainfall = group.mean('Annual_Rainfall')
+    avg_fertilizer = group.mean('fertilizer_ratio')
+    avg_pesticide = group.mean('pesticide_ratio')
 
-        # Calculate statistics for the selected crop
-        avg_yield = filtered_data['Yield'].mean()
-        yield_std = filtered_data['Yield'].std()
-        avg_rainfall = filtered_data['Annual_Rainfall'].mean()
-        avg_fertilizer = filtered_data['fertilizer_ratio'].mean()
-        avg_pesticide = filtered_data['pesticide_ratio'].mean()
+    # Overall similarity score (weighted average), averaged over the group
+    similarity_scores = (
+        fertilizer_similarity * 0.4 +
+        pesticide_similarity * 0.4 +
+        avg_yield * 0.2  # Also consider historical yield
+    )
 
-        # Calculate yield stability
-        yield_stability = 1 - (yield_std / avg_yield) if avg_yield > 0 else 0
+    # Calculate yield stability
+    yield_stability = 1 - (yield_std / avg_yield) if avg_yield > 0 else 0
 
-        # Convert yield from tonnes/hectare to tons/acre
-        # 1 hectare = 2.47105 acres
-        yield_per_acre = avg_yield / 2.47105  # Convert to tons/acre directly
-        total_expected_yield = yield_per_acre * area  # Total yield in tons
+    # Convert yield from tonnes/hectare to tons/acre
+    # 1 hectare = 2.47105 acres
+    yield_per_acre = avg_yield / 2.47105  # Convert to tons/acre directly
+    total_expected_yields = yield_per_acre * areas  # Total yield in tons
+    yield_per_acre = round(yield_per_acre, 2)
 
-        # Round all values to 2 decimal places
-        yield_per_acre = round(yield_per_acre, 2)
-        total_expected_yield = round(total_expected_yield, 2)
+    # Convert input ratios to per acre basis
+    fertilizer_per_acre = avg_fertilizer / 2.47105
+    pesticide_per_acre = avg_pesticide / 2.47105
 
-        # Log the yield calculations for debugging
-        logger.info(f"Yield calculations:")
-        logger.info(f"Average yield: {avg_yield:.2f} tonnes/hectare")
-        logger.info(f"Area: {area:.2f} acres")
-        logger.info(f"Yield per acre: {yield_per_acre:.2f} tons/acre")
-        logger.info(f"Total expected yield: {total_expected_yield:.2f} tons")
-
-        # Convert input ratios to per acre basis
-        fertilizer_per_acre = avg_fertilizer / 2.47105
-        pesticide_per_acre = avg_pesticide / 2.47105
-
-        # Prepare recommendations
-        recommendations = [{
+    recommendations = []
+    for area, similarity_score, total_expected_yield in zip(areas, similarity_scores, total_expected_yields):
+        total_expected_yield = round(float(total_expected_yield), 2)
+        recommendations.append({
             'crop': crop,
             'season': season,
-            'similarity_score': round(filtered_data['similarity_score'].mean(), 2),
+            'similarity_score': round(float(similarity_score), 2),
             'yield_per_acre': yield_per_acre,  # Yield per acre in tons
             'expected_yield': total_expected_yield,  # Total yield in tons for the given area
             'yield_stability': round(yield_stability * 100, 1),
             'requirements': {
-                'area': f"{area} acres",
+                'area': f"{float(area)} acres",
                 'fertilizer': f"{round(fertilizer_per_acre, 2)} kg/acre",
                 'pesticide': f"{round(pesticide_per_acre, 2)} kg/acre",
                 'rainfall': f"{round(avg_rainfall, 2)} mm/year"
@@ -478,7 +741,79 @@ def optimize_yield():
                 f"Total expected yield: {total_expected_yield} tons",
                 f"Expected yield stability: {round(yield_stability * 100, 1)}%"
             ]
-        }]
+        })
+    return recommendations
+
+@app.route('/api/optimize', methods=['POST'])
+@timed_route('/api/optimize')
+def optimize_yield():
+    """Recommend inputs for a crop from historical data.
+
+    With ``"mode": "model"`` the response also carries ``model_optimization``:
+    the trained model's best fertilizer and pesticide rates and its
+    predicted yield surface around the given rates.
+    """
+    try:
+        data = request.json
+        logger.info(f"Received optimization request: {data}")
+
+        # Get input parameters
+        with g.timer.stage('parse'):
+            state = data['state']
+            season = data['season']
+            crop = data['crop']
+            area = float(data['area'])  # in acres
+            fertilizer = float(data['fertilizer'])  # per acre
+            pesticide = float(data['pesticide'])  # per acre
+            rainfall = float(data['rainfall'])  # in mm
+            mode = data.get('mode', 'historical')
+            n_analogs = int(data.get('analogs', 5))
+            cross_state = bool(data.get('cross_state', False))
+
+        if mode not in ('historical', 'model'):
+            return jsonify({'error': f"Unknown optimization mode: {mode}"}), 400
+
+        # Convert acres to hectares (1 acre = 0.4047 hectares)
+        area_hectares = area * 0.4047
+        fertilizer_per_hectare = fertilizer / 0.4047  # convert to kg/hectare
+        pesticide_per_hectare = pesticide / 0.4047  # convert to kg/hectare
+
+        # Look up the historical group for the state, season, and crop
+        with g.timer.stage('lookup'):
+            group = get_group_index().lookup(state, season, crop)
+
+        if group is None:
+            return jsonify({
+                'error': f'No data available for {crop} in {state} during {season} season'
+            }), 404
+
+        with g.timer.stage('aggregate'):
+            recommendation = historical_recommendations(
+                group, crop, season, np.array([area]),
+                np.array([fertilizer_per_hectare]), np.array([pesticide_per_hectare])
+            )[0]
+
+        # Closest historical seasons to the input, in this state and optionally anywhere
+        with g.timer.stage('analogs'):
+            analog_index = get_analog_index()
+            point = analog_index.query_point(
+                fertilizer_per_hectare, pesticide_per_hectare, rainfall, int(data.get('year', datetime.now().year))
+            )
+            recommendation['historical_analogs'] = analog_index.analogs(state, season, crop, point, k=n_analogs)
+            if cross_state:
+                recommendation['cross_state_analogs'] = analog_index.cross_state_analogs(
+                    season, crop, point, k=n_analogs
+                )
+
+        # Log the yield calculations for debugging
+        logger.info(f"Yield calculations:")
+        logger.info(f"Average yield: {group.mean('Yield'):.2f} tonnes/hectare")
+        logger.info(f"Area: {area:.2f} acres")
+        logger.info(f"Yield per acre: {recommendation['yield_per_acre']:.2f} tons/acre")
+        logger.info(f"Total expected yield: {recommendation['expected_yield']:.2f} tons")
+
+        # Prepare recommendations
+        recommendations = [recommendation]
 
         response = {
             'recommendations': recommendations,
@@ -492,13 +827,228 @@ def optimize_yield():
                 'rainfall': rainfall
             }
         }
+        if mode == 'model':
+            response['model_optimization'] = optimize_inputs_with_model(
+                current_bundle(), data, group, area, fertilizer, pesticide, rainfall
+            )
         logger.info(f"Optimization results: {response}")  # Log the results before returning
-        return jsonify(response)
+        with g.timer.stage('serialize'):
+            return jsonify(response)
 
+    except ModelNotReady:
+        return model_warming_response()
     except Exception as e:
         logger.error(f"Error in optimize_yield: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/optimize/batch', methods=['POST'])
+@timed_stream_route('/api/optimize/batch')
+def optimize_yield_batch():
+    """Historical recommendations for many farms, streamed as NDJSON.
+
+    Accepts a JSON array of /api/optimize payloads (or ``{"farms": [...]}``,
+    where ``analogs`` and ``cross_state`` may be set for all farms). Farms
+    are grouped by (State, Season, Crop); each group's slice and statistics
+    are resolved once and its farms are scored together. Every output line
+    carries the farm's ``index`` in the request. Lines are written group by
+    group, so they are not in request order.
+    """
+    try:
+        with g.timer.stage('parse'):
+            data = request.json
+        options = data if isinstance(data, dict) else {}
+        farms = data.get('farms') if isinstance(data, dict) else data
+        if not isinstance(farms, list):
+            raise ValueError("Expected a JSON array of farms")
+        n_analogs = int(options.get('analogs', 5))
+        cross_state = bool(options.get('cross_state', False))
+        current_year = datetime.now().year
+        logger.info(f"Received batch optimization request with {len(farms)} farms")
+
+        errors = []
+        groups = {}
+        for index, farm in enumerate(farms):
+            try:
+                if not isinstance(farm, dict):
+                    raise ValueError("Farm must be an object")
+                key = (farm['state'].strip(), farm['season'].strip(), farm['crop'].strip())
+                inputs = (
+                    index, float(farm['area']), float(farm['fertilizer']), float(farm['pesticide']),
+                    float(farm['rainfall']), int(farm.get('year', current_year))
+                )
+            except Exception as e:
+                errors.append({'index': index, 'success': False, 'error': str(e)})
+                continue
+            groups.setdefault(key, []).append(inputs)
+        logger.info(f"Batch optimization: {len(groups)} groups, {len(errors)} invalid farms")
+
+        # Stages are timed inside the generator, which runs as the response is
+        # streamed; each group's lines are built first and then written out, so
+        # the stage timings exclude time spent waiting on the client
+        def generate():
+            for error in errors:
+                yield json.dumps(error) + '\n'
+            with g.timer.stage('load'):
+                group_index = get_group_index()
+                analog_index = get_analog_index()
+            for (state, season, crop), members in groups.items():
+                indices, areas, fertilizer, pesticide, rainfall, years = (np.array(column) for column in zip(*members))
+                group = group_index.lookup(state, season, crop)
+                if group is None:
+                    for index in indices:
+                        yield json.dumps({
+                            'index': int(index),
+                            'success': False,
+                            'error': f'No data available for {crop} in {state} during {season} season'
+                        }) + '\n'
+                    continue
+
+                with g.timer.stage('recommend'):
+                    # Convert acres to hectares (1 acre = 0.4047 hectares)
+                    fertilizer_per_hectare = fertilizer / 0.4047
+                    pesticide_per_hectare = pesticide / 0.4047
+                    recommendations = historical_recommendations(
+                        group, crop, season, areas, fertilizer_per_hectare, pesticide_per_hectare
+                    )
+                with g.timer.stage('analogs'):
+                    points = analog_index.query_points(fertilizer_per_hectare, pesticide_per_hectare, rainfall, years)
+                    analogs = analog_index.analogs_many(state, season, crop, points, k=n_analogs)
+                    if cross_state:
+                        cross_state_analogs = analog_index.cross_state_analogs_many(season, crop, points, k=n_analogs)
+
+                with g.timer.stage('serialize'):
+                    lines = []
+                    for row, recommendation in enumerate(recommendations):
+                        recommendation['historical_analogs'] = analogs[row]
+                        if cross_state:
+                            recommendation['cross_state_analogs'] = cross_state_analogs[row]
+                        lines.append(json.dumps({
+                            'index': int(indices[row]),
+                            'success': True,
+                            'recommendations': [recommendation],
+                            'input_parameters': {
+                                'state': state,
+                                'season': season,
+                                'crop': crop,
+                                'area': float(areas[row]),
+                                'fertilizer_ratio': round(float(fertilizer[row]), 2),
+                                'pesticide_ratio': round(float(pesticide[row]), 2),
+                                'rainfall': float(rainfall[row])
+                            }
+                        }) + '\n')
+                yield ''.join(lines)
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    except Exception as e:
+        logger.error(f"Error in optimize_yield_batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/recommend', methods=['POST'])
+@timed_route('/api/recommend')
+def recommend_crops():
+    """Rank the crops historically grown in a state and season for the given inputs.
+
+    One record per eligible crop is scored in a single batch and clamped to
+    each crop's bounds. The model was trained on state-level totals, so each
+    crop is scored at its historical mean area in that state and season with
+    the farm's per-hectare rates. Yields are reported in each crop's own
+    units (Coconut in nuts), so crops are ranked on a unit-free score: the
+    predicted yield relative to the crop's historical yield there, weighted
+    by the stability of those historical yields.
+    """
+    try:
+        # Fails with ModelNotReady until the model has warmed up
+        bundle = current_bundle()
+
+        with g.timer.stage('parse'):
+            data = request.json
+            state = data['state']
+            season = data['season']
+            area = float(data['area'])  # in acres
+            fertilizer = float(data['fertilizer'])  # per acre
+            pesticide = float(data['pesticide'])  # per acre
+            rainfall = float(data['rainfall'])  # in mm
+            limit = int(data.get('limit', 0))
+        logger.info(f"Received recommendation request: {data}")
+
+        with g.timer.stage('lookup'):
+            crops = get_crop_lookup().crops_for(state.strip(), season.strip())
+            group_index = get_group_index()
+            groups = [group_index.lookup(state, season, crop) for crop in crops]
+        if not crops:
+            return jsonify({
+                'error': f'No crops recorded in {state} during {season} season'
+            }), 404
+
+        base_record = {
+            'State': state,
+            'Season': season,
+            'Crop_Year': int(data.get('year', datetime.now().year)),
+            'Production': safe_float(data.get('production')),
+            'Annual_Rainfall': rainfall
+        }
+        # Convert acres to hectares (1 acre = 0.4047 hectares)
+        fertilizer_per_hectare = fertilizer / 0.4047
+        pesticide_per_hectare = pesticide / 0.4047
+        records = []
+        for crop, group in zip(crops, groups):
+            # Totals over the crop's typical historical area, as in the training data
+            crop_area = group.mean('Area')
+            records.append(dict(base_record, Crop=crop, Area=crop_area,
+                                Fertilizer=fertilizer_per_hectare * crop_area,
+                                Pesticide=pesticide_per_hectare * crop_area))
+        _, bounded_yields, _, _ = bundle.predict_bounded(records, crops, timer=g.timer)
+        per_acre, totals = yields_per_acre(bounded_yields, np.full(len(crops), area))
+
+        with g.timer.stage('rank'):
+            historical = np.array([group.mean('Yield') for group in groups])
+            stds = np.array([group.std('Yield') for group in groups])
+            # Single-season groups have no spread to judge; count them as unstable
+            stability = np.where(np.isnan(stds) | (historical <= 0), 0.0,
+                                 np.clip(1 - stds / np.where(historical > 0, historical, 1), 0.0, 1.0))
+            relative = np.where(historical > 0, bounded_yields / np.where(historical > 0, historical, 1), 0.0)
+            score = relative * stability
+            order = np.lexsort((-relative, -score))
+            if limit > 0:
+                order = order[:limit]
+
+        recommendations = [{
+            'rank': rank,
+            'crop': crops[i],
+            'yield_per_acre': float(per_acre[i]),
+            'expected_yield': float(totals[i]),
+            'relative_yield': round(float(relative[i]), 3),
+            'yield_stability': round(float(stability[i]) * 100, 1),
+            'score': round(float(score[i]), 3),
+            'historical_yield_per_acre': round(float(historical[i]) / ACRES_PER_HECTARE, 2),
+            'seasons_recorded': groups[i].count
+        } for rank, i in enumerate(order, start=1)]
+
+        logger.info(f"Ranked {len(crops)} crops for {state} in {season} season")
+        with g.timer.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'count': len(crops),
+                'recommendations': recommendations,
+                'input_parameters': {
+                    'state': state,
+                    'season': season,
+                    'area': area,
+                    'fertilizer_ratio': round(fertilizer, 2),
+                    'pesticide_ratio': round(pesticide, 2),
+                    'rainfall': rainfall
+                }
+            })
+
+    except ModelNotReady:
+        return model_warming_response()
+    except Exception as e:
+        logger.error(f"Error in recommend_crops: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
 
 @app.route('/detect_disease', methods=['POST'])
 def detect_disease():
@@ -0,0 +1,73 @@
+"""Write directories of memory-mapped artifacts under a temporary name and swap them into place"""
+
+import os
+import shutil
+import tempfile
+
+
+def write_directory(path, write, replace=True):
+    """Fill a new directory with ``write(tmp_dir)`` and make ``path`` point to it.
+
+    The new directory is a hidden, uniquely named sibling of ``path``, and
+    ``path`` itself is a symlink to the current one. Replacing swaps the
+    symlink with ``os.replace``, so ``path`` always exists and readers see
+    either the old directory or the new one, never a partial or missing
+    one. Files already written are never rewritten: the previous directory
+    is removed once the new one is in place, so processes that
+    memory-mapped its files keep reading them until they reload. A plain
+    directory left at ``path`` by older versions is renamed aside instead,
+    which is the only swap with a moment where ``path`` is missing.
+
+    With ``replace=False`` the new directory is renamed to ``path`` unless
+    it already exists (another process finished the same content first),
+    in which case the new directory is discarded. Returns True when
+    ``path`` now holds the new directory.
+    """
+    path = os.path.abspath(path)
+    parent = os.path.dirname(path)
+    name = os.path.basename(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f'.{name}-', dir=parent)
+    try:
+        write(tmp_dir)
+        if not replace:
+            try:
+                os.rename(tmp_dir, path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return False
+            return True
+        previous = _swap_link(path, tmp_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+    return True
+
+
+def _swap_link(path, target):
+    """Point the symlink ``path`` at the sibling directory ``target``; return the directory it replaced"""
+    parent, name = os.path.split(path)
+    link = target + '.link'
+    # Relative, so the whole model directory can be moved or mounted elsewhere
+    os.symlink(os.path.basename(target), link)
+    try:
+        previous = None
+        if os.path.islink(path):
+            previous = os.path.join(parent, os.readlink(path))
+            # Only ever remove directories written here
+            if os.path.dirname(os.path.abspath(previous)) != parent or \
+                    not os.path.basename(previous).startswith(f'.{name}-'):
+                previous = None
+        elif os.path.exists(path):
+            previous = tempfile.mkdtemp(prefix=f'.{name}-old-', dir=parent)
+            os.rmdir(previous)
+            os.rename(path, previous)
+        os.replace(link, path)
+    except Exception:
+        os.remove(link)
+        raise
+    return previous
@@ -0,0 +1,86 @@
+"""Compare model engines on fit time, artifact size, accuracy and single-row latency"""
+
+import os
+import tempfile
+import time
+import joblib
+import numpy as np
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from data.dataset_store import get_dataset
+from models.feature_encoder import FeatureEncoder
+from models.model_bundle import CROP_STATS_FILENAME, CropStats, ModelBundle
+from models.model_engines import ENGINES, MODEL_FILENAME, SCALER_FILENAME
+from train_model import ENGINE_PARAMS, SPLIT_RANDOM_STATE, TEST_SIZE
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+LATENCY_REPEATS = 500
+
+
+def artifact_size(path):
+    """Size in bytes of a file or of every file in a directory"""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(dirpath, name))
+                   for dirpath, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def single_row_latency(bundle, records):
+    """Per-call latencies (ms) of encoding and predicting one record through the bundle"""
+    for record in records[:10]:
+        bundle.predict([record])  # warm up
+    timings = []
+    for i in range(LATENCY_REPEATS):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        bundle.predict([record])
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return np.array(timings)
+
+
+def main():
+    data = get_dataset()
+    encoder = FeatureEncoder.from_files(
+        os.path.join(MODEL_DIR, 'categorical_values.json'),
+        os.path.join(MODEL_DIR, 'feature_columns.json')
+    )
+    crop_stats = CropStats.from_file(os.path.join(MODEL_DIR, CROP_STATS_FILENAME))
+    y = data['Yield'].to_numpy()
+    train_rows, test_rows = train_test_split(np.arange(len(data)), test_size=TEST_SIZE, random_state=SPLIT_RANDOM_STATE)
+    test_records = data.iloc[test_rows[:200]].to_dict('records')
+
+    print(f"{'engine':>24} {'fit s':>8} {'pkl MB':>8} {'serve MB':>9} {'test R2':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, engine in ENGINES.items():
+        X = engine.encode_frame(encoder, data)
+        scaler = None
+        if engine.uses_scaler:
+            scaler = StandardScaler().fit(X)
+            X = scaler.transform(X)
+
+        model = engine.create(ENGINE_PARAMS[name])
+        start = time.perf_counter()
+        model.fit(X[train_rows], y[train_rows])
+        fit_seconds = time.perf_counter() - start
+        r2 = r2_score(y[test_rows], model.predict(X[test_rows]))
+
+        with tempfile.TemporaryDirectory() as model_dir:
+            joblib.dump(model, os.path.join(model_dir, MODEL_FILENAME))
+            if scaler is not None:
+                joblib.dump(scaler, os.path.join(model_dir, SCALER_FILENAME))
+            engine.export(model, scaler, model_dir)
+            pickle_mb = artifact_size(os.path.join(model_dir, MODEL_FILENAME)) / 1e6
+            # What a worker loads to serve: the export if the engine has one
+            serving_mb = sum(artifact_size(os.path.join(model_dir, artifact)) for artifact in engine.extra_artifacts) / 1e6
+            serving_mb = serving_mb or pickle_mb
+
+            served_model, served_scaler = engine.load(model_dir)
+            bundle = ModelBundle(served_model, served_scaler, encoder, crop_stats, 'benchmark', engine=name)
+            timings = single_row_latency(bundle, test_records)
+
+        print(f"{name:>24} {fit_seconds:>8.1f} {pickle_mb:>8.1f} {serving_mb:>9.1f} {r2:>8.4f} "
+              f"{np.percentile(timings, 50):>8.3f} {np.percentile(timings, 99):>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
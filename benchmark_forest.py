@@ -0,0 +1,75 @@
+"""Compare sklearn, flattened-array and scaler-folded forest inference latency"""
+
+import os
+import time
+import joblib
+import numpy as np
+from data.dataset_store import get_dataset
+from models.feature_encoder import FeatureEncoder
+from models.forest_engine import FlatForest
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+BATCH_SIZES = [1, 64, 512, 4096]
+
+
+def load_features():
+    """Encode the full dataset; returns (scaler, raw features, scaled features)"""
+    encoder = FeatureEncoder.from_files(
+        os.path.join(MODEL_DIR, 'categorical_values.json'),
+        os.path.join(MODEL_DIR, 'feature_columns.json')
+    )
+    scaler = joblib.load(os.path.join(MODEL_DIR, 'scaler.pkl'))
+    data = get_dataset()
+    X_raw = encoder.encode_frame(data)
+    return scaler, X_raw, scaler.transform(X_raw)
+
+
+def time_predict(predict_fn, X, repeats):
+    """Return per-call latencies in milliseconds"""
+    predict_fn(X)  # warm up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_fn(X)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return np.array(timings)
+
+
+def main():
+    model = joblib.load(os.path.join(MODEL_DIR, 'crop_yield_model.pkl'))
+    scaler, X_raw, X = load_features()
+
+    start = time.perf_counter()
+    forest = FlatForest.from_sklearn(model)
+    export_ms = (time.perf_counter() - start) * 1000.0
+    print(f"Exported {forest.n_trees} trees, {forest.n_nodes} nodes, max depth {forest.max_depth}, "
+          f"{forest.nbytes / 1e6:.1f} MB in {export_ms:.0f} ms")
+
+    start = time.perf_counter()
+    folded = forest.fold_scaler(scaler)
+    print(f"Folded scaler into split thresholds in {(time.perf_counter() - start) * 1000.0:.0f} ms")
+
+    print(f"\n{'batch':>6} {'engine':>8} {'p50 ms':>10} {'p99 ms':>10}")
+    for batch_size in BATCH_SIZES:
+        repeats = 200 if batch_size < 1000 else 20
+        engines = [
+            ('sklearn', lambda rows: model.predict(scaler.transform(rows))),
+            ('flat', lambda rows: forest.predict(scaler.transform(rows))),
+            ('folded', folded.predict),
+        ]
+        for name, predict_fn in engines:
+            timings = time_predict(predict_fn, X_raw[:batch_size], repeats)
+            print(f"{batch_size:>6} {name:>8} {np.percentile(timings, 50):>10.3f} {np.percentile(timings, 99):>10.3f}")
+
+    print()
+    # sklearn sums tree outputs from worker threads in completion order, so
+    # compare against the single-threaded estimator for a bit-exact check
+    model.set_params(n_jobs=1)
+    expected = model.predict(X)
+    for name, actual in [('flat', forest.predict(X)), ('folded', folded.predict(X_raw))]:
+        print(f"{name}: identical predictions on {len(X)} rows: {np.array_equal(expected, actual)} "
+              f"(max abs diff {np.abs(expected - actual).max():.3g})")
+
+
+if __name__ == '__main__':
+    main()
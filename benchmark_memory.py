@@ -0,0 +1,102 @@
+"""Measure per-worker memory (RSS / PSS) for each way of loading the forest.
+
+Starts several worker processes per mode, each of which loads the model the
+way a gunicorn worker would and scores the whole dataset so every node array
+page is touched. While all workers of a mode are alive, their RSS and PSS are
+read from /proc/<pid>/smaps_rollup. PSS splits shared pages between the
+processes that map them, so it shows what each worker really costs.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import joblib
+import numpy as np
+from data.dataset_store import get_dataset
+from models.forest_engine import FlatForest
+from models.model_bundle import FOREST_FILENAME, MODEL_FILENAME, SCALER_FILENAME, ModelBundle
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# joblib: the pickled sklearn forest (the original serving path)
+# copy: the flattened forest read into private memory
+# mmap: the flattened forest memory-mapped from the .npy files
+MODES = ['baseline', 'joblib', 'copy', 'mmap']
+
+
+def load_model(mode):
+    """Load the model for ``mode``; returns a function mapping raw features to predictions"""
+    if mode == 'joblib':
+        model = joblib.load(os.path.join(MODEL_DIR, MODEL_FILENAME))
+        scaler = joblib.load(os.path.join(MODEL_DIR, SCALER_FILENAME))
+        model.set_params(n_jobs=1)
+        return lambda X: model.predict(scaler.transform(X))
+    mmap_mode = 'r' if mode == 'mmap' else None
+    forest = FlatForest.load(os.path.join(MODEL_DIR, FOREST_FILENAME), mmap_mode=mmap_mode)
+    return forest.predict
+
+
+def run_worker(mode):
+    encoder = ModelBundle.load(MODEL_DIR).encoder
+    X = encoder.encode_frame(get_dataset())
+    if mode != 'baseline':
+        predict = load_model(mode)
+        predict(X)
+    print('ready', flush=True)
+    # Stay alive until the parent has measured every worker
+    sys.stdin.read()
+
+
+def memory_usage(pid):
+    """RSS, PSS and private memory of a process in MB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024.0
+    private = fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0)
+    return fields['Rss'], fields['Pss'], private
+
+
+def measure(mode, n_workers):
+    workers = [
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker', mode],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(n_workers)
+    ]
+    try:
+        for worker in workers:
+            if worker.stdout.readline().strip() != 'ready':
+                raise RuntimeError(f"Worker for mode {mode} failed to start")
+        usage = np.array([memory_usage(worker.pid) for worker in workers])
+    finally:
+        for worker in workers:
+            worker.stdin.close()
+            worker.wait()
+    return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='concurrent workers per mode')
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    print(f"{args.workers} workers per mode, mean per worker (MB)")
+    print(f"{'mode':>9} {'RSS':>9} {'PSS':>9} {'private':>9} {'total PSS':>10}")
+    for mode in MODES:
+        usage = measure(mode, args.workers)
+        rss, pss, private = usage.mean(axis=0)
+        print(f"{mode:>9} {rss:>9.1f} {pss:>9.1f} {private:>9.1f} {usage[:, 1].sum():>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
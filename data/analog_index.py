@@ -0,0 +1,133 @@
+"""Nearest historical seasons ("analogs") for a set of farm inputs"""
+
+import threading
+import numpy as np
+from data.group_index import get_group_index
+
+# Inputs compared when searching for analogs. Per-hectare rates and rainfall
+# are log-scaled so distances reflect relative differences, then every
+# feature is standardized over the whole dataset.
+ANALOG_FEATURES = ['fertilizer_ratio', 'pesticide_ratio', 'Annual_Rainfall', 'Crop_Year']
+LOG_SCALED_FEATURES = ['fertilizer_ratio', 'pesticide_ratio', 'Annual_Rainfall']
+
+# Columns returned for every analog
+ANALOG_COLUMNS = ['State', 'Season', 'Crop', 'Crop_Year', 'Yield', 'fertilizer_ratio', 'pesticide_ratio',
+                  'Annual_Rainfall']
+
+
+class AnalogIndex:
+    """k-d trees over the group index's rows, per (State, Season, Crop) group and per (Season, Crop).
+
+    Trees are built once per dataset load, so a query only searches one
+    small tree. The per-(Season, Crop) trees span every state for
+    cross-state search.
+    """
+
+    def __init__(self, group_index):
+        # scipy is only needed once analogs are requested
+        from scipy.spatial import cKDTree
+
+        self.group_index = group_index
+        frame = group_index.frame
+        points = np.column_stack([self._transform(col, frame[col].to_numpy(dtype=np.float64))
+                                  for col in ANALOG_FEATURES])
+        self.mean = points.mean(axis=0)
+        self.scale = points.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        self.points = (points - self.mean) / self.scale
+
+        self.group_trees = [
+            cKDTree(self.points[start:start + count])
+            for start, count in zip(group_index.starts, group_index.counts)
+        ]
+        self.cross_state_rows = {
+            (str(season), str(crop)): rows
+            for (season, crop), rows in frame.groupby(['Season', 'Crop'], observed=True).indices.items()
+        }
+        self.cross_state_trees = {key: cKDTree(self.points[rows]) for key, rows in self.cross_state_rows.items()}
+        self.analog_columns = {col: frame[col].to_numpy() for col in ANALOG_COLUMNS}
+
+    @staticmethod
+    def _transform(col, values):
+        return np.log1p(np.maximum(values, 0.0)) if col in LOG_SCALED_FEATURES else values
+
+    def query_point(self, fertilizer_ratio, pesticide_ratio, rainfall, year):
+        """Scaled query vector for per-hectare inputs, rainfall and crop year"""
+        return self.query_points(fertilizer_ratio, pesticide_ratio, rainfall, year)[0]
+
+    def query_points(self, fertilizer_ratio, pesticide_ratio, rainfall, year):
+        """Scaled query vectors, one row per element of the input arrays"""
+        raw = {'fertilizer_ratio': fertilizer_ratio, 'pesticide_ratio': pesticide_ratio,
+               'Annual_Rainfall': rainfall, 'Crop_Year': year}
+        points = np.column_stack([self._transform(col, np.atleast_1d(np.asarray(raw[col], dtype=np.float64)))
+                                  for col in ANALOG_FEATURES])
+        return (points - self.mean) / self.scale
+
+    def analogs(self, state, season, crop, point, k=5):
+        """The ``k`` closest rows of the (State, Season, Crop) group, nearest first"""
+        return self.analogs_many(state, season, crop, np.atleast_2d(point), k)[0]
+
+    def analogs_many(self, state, season, crop, points, k=5):
+        """Analogs within one group for every row of ``points``, in a single tree query"""
+        group = self.group_index.lookup(state, season, crop)
+        if group is None:
+            return [[] for _ in range(len(points))]
+        tree = self.group_trees[group.position]
+        return self._query(tree, points, k, lambda positions: positions + group.start)
+
+    def cross_state_analogs(self, season, crop, point, k=5):
+        """The ``k`` closest rows of a season and crop across every state"""
+        return self.cross_state_analogs_many(season, crop, np.atleast_2d(point), k)[0]
+
+    def cross_state_analogs_many(self, season, crop, points, k=5):
+        key = (season.strip(), crop.strip())
+        tree = self.cross_state_trees.get(key)
+        if tree is None:
+            return [[] for _ in range(len(points))]
+        return self._query(tree, points, k, lambda positions: self.cross_state_rows[key][positions])
+
+    def _query(self, tree, points, k, to_rows):
+        k = min(k, tree.n)
+        if k <= 0:
+            return [[] for _ in range(len(points))]
+        distances, positions = tree.query(points, k=k)
+        # Always (n_points, k), also when k == 1
+        distances = np.asarray(distances).reshape(len(points), k)
+        rows = to_rows(np.asarray(positions).reshape(len(points), k))
+        return [self._analog_records(point_distances, point_rows) for point_distances, point_rows in zip(distances, rows)]
+
+    def _analog_records(self, distances, rows):
+        analogs = []
+        for distance, row in zip(distances, rows):
+            analog = {col: values[row] for col, values in self.analog_columns.items()}
+            analogs.append({
+                'state': str(analog['State']),
+                'season': str(analog['Season']),
+                'crop': str(analog['Crop']),
+                'year': int(analog['Crop_Year']),
+                'yield': round(float(analog['Yield']), 4),
+                'fertilizer_per_hectare': round(float(analog['fertilizer_ratio']), 2),
+                'pesticide_per_hectare': round(float(analog['pesticide_ratio']), 2),
+                'rainfall': round(float(analog['Annual_Rainfall']), 1),
+                'distance': round(float(distance), 4)
+            })
+        return analogs
+
+_analog_index = None
+_analog_lock = threading.Lock()
+
+
+def get_analog_index():
+    """Return the analog index for the current dataset, building it on first use.
+
+    The index is rebuilt when the dataset reload has replaced the group index.
+    """
+    global _analog_index
+    group_index = get_group_index()
+    index = _analog_index
+    if index is None or index.group_index is not group_index:
+        with _analog_lock:
+            if _analog_index is None or _analog_index.group_index is not group_index:
+                _analog_index = AnalogIndex(group_index)
+            index = _analog_index
+    return index
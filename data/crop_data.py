@@ -1,6 +1,8 @@
 """Crop data including optimal conditions and recommendations"""
 
+import threading
 import pandas as pd
+from data.dataset_store import get_dataset, load_crop_dataset
 CROP_DATA = {
     "Rice": {
         "name": "Rice",
@@ -504,9 +506,9 @@ CROP_DATA = {
 }
 
 def load_crop_yield_data(file_path):
-    """Load crop yield data from a CSV file."""
+    """Load crop yield data from a CSV file through the columnar cache."""
     try:
-        return pd.read_csv(file_path)
+        return load_crop_dataset(file_path)
     except Exception as e:
         print(f"Error loading crop yield data: {str(e)}")
         return pd.DataFrame()
@@ -519,21 +521,30 @@ def average_yield_per_crop(data):
         print(f"Error calculating average yield: {str(e)}")
         return pd.Series()
 
-# Load the dataset
-crop_yield_data = load_crop_yield_data('data/crop_yield.csv')
+_crop_data_lock = threading.Lock()
+_crop_data_extended = False
 
-# Calculate average yield
-average_yields = average_yield_per_crop(crop_yield_data)
+def get_crop_data():
+    """Return CROP_DATA, extended on first use with every crop in the crop yield dataset."""
+    global _crop_data_extended
+    if not _crop_data_extended:
+        with _crop_data_lock:
+            if not _crop_data_extended:
+                # Add crops from the crop yield dataset to the CROP_DATA structure
+                for crop in get_dataset()['Crop'].unique():
+                    if crop not in CROP_DATA:
+                        CROP_DATA[crop] = {
+                            "name": crop,
+                            "description": "",
+                            "optimal_conditions": {
+                                "temperature": {"min": 0, "max": 0},
+                                "humidity": {"min": 0, "max": 0},
+                                "rainfall": {"min": 0, "max": 0}
+                            }
+                        }
+                _crop_data_extended = True
+    return CROP_DATA
 
-# Add crops from crop_yields.csv to the CROP_DATA structure
-for crop in crop_yield_data['Crop'].unique():
-    if crop not in CROP_DATA:
-        CROP_DATA[crop] = {
-            "name": crop,
-            "description": "",
-            "optimal_conditions": {
-                "temperature": {"min": 0, "max": 0},
-                "humidity": {"min": 0, "max": 0},
-                "rainfall": {"min": 0, "max": 0}
-            }
-        }
+def get_average_yields():
+    """Average yield per crop in the shared dataset."""
+    return average_yield_per_crop(get_dataset())
@@ -0,0 +1,59 @@
+"""Precomputed state -> season -> crop lists for the crop dropdown"""
+
+import hashlib
+import json
+from data.dataset_store import dataset_store, get_dataset
+
+
+class CropLookup:
+    """Sorted crop lists per (state, season) with serialized JSON and ETags.
+
+    Response bodies are serialized once when the lookup is built, so serving
+    the dropdown is a dictionary lookup. Unknown combinations share the
+    serialized empty list.
+    """
+
+    def __init__(self, frame):
+        pairs = frame[['State', 'Season', 'Crop']].drop_duplicates()
+        self.crops = {}
+        for state, season, crop in zip(pairs['State'], pairs['Season'], pairs['Crop']):
+            self.crops.setdefault(str(state), {}).setdefault(str(season), []).append(str(crop))
+
+        self.responses = {}
+        for state, seasons in self.crops.items():
+            for season, crops in seasons.items():
+                crops.sort()
+                self.responses[(state, season)] = _serialize(crops)
+        self.empty_response = _serialize([])
+
+    def crops_for(self, state, season):
+        """Sorted crops historically grown in ``state`` during ``season``"""
+        return self.crops.get(state, {}).get(season, [])
+
+    def response_for(self, state, season):
+        """Return ``(json_bytes, etag)`` for the crop list of a state and season"""
+        return self.responses.get((state, season), self.empty_response)
+
+
+def _serialize(crops):
+    body = (json.dumps(crops, separators=(',', ':')) + '\n').encode('utf-8')
+    return body, hashlib.sha1(body).hexdigest()
+
+
+_crop_lookup = None
+
+
+def _rebuild_crop_lookup(frame):
+    global _crop_lookup
+    _crop_lookup = CropLookup(frame)
+
+
+dataset_store.add_listener(_rebuild_crop_lookup)
+
+
+def get_crop_lookup():
+    """Return the crop lookup for the current dataset"""
+    if _crop_lookup is None:
+        # Loading the dataset notifies the listener that builds the lookup
+        get_dataset()
+    return _crop_lookup
@@ -0,0 +1,146 @@
+"""Binary columnar cache of cleaned CSV datasets keyed by the CSV's content hash"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from atomic_dir import write_directory
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIRNAME = '.cache'
+META_FILENAME = 'meta.json'
+
+# Bump when the on-disk layout changes so old caches are ignored
+CACHE_FORMAT_VERSION = 2
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hex sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_dir_for(csv_path, digest, version=0):
+    """Cache directory for a CSV digest; identical CSVs share one directory"""
+    name = f'{digest[:16]}-v{CACHE_FORMAT_VERSION}.{version}'
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIRNAME, name)
+
+
+def write_columns(frame, cache_dir, digest, source):
+    """Write every column of ``frame`` as a .npy file plus a meta.json.
+
+    Categorical columns are stored as their integer codes with the categories
+    in the metadata. ``source`` is the CSV's file name. The directory is
+    written with :func:`atomic_dir.write_directory`, so readers never see a
+    partial cache; once it is in place, older caches of the same CSV are
+    removed (see :func:`prune_stale_caches`).
+    """
+    def write(tmp_dir):
+        columns = []
+        for i, col in enumerate(frame.columns):
+            series = frame[col]
+            filename = f'{i:03d}.npy'
+            entry = {'name': col, 'file': filename}
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                entry['categories'] = [str(value) for value in series.cat.categories]
+                np.save(os.path.join(tmp_dir, filename), series.cat.codes.to_numpy())
+            else:
+                np.save(os.path.join(tmp_dir, filename), series.to_numpy())
+            columns.append(entry)
+
+        meta = {
+            'format': CACHE_FORMAT_VERSION,
+            'sha256': digest,
+            'source': source,
+            'rows': len(frame),
+            'columns': columns,
+        }
+        with open(os.path.join(tmp_dir, META_FILENAME), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    # Another process may finish the same cache first; either copy will do
+    if write_directory(cache_dir, write, replace=False):
+        prune_stale_caches(cache_dir, source)
+
+
+def prune_stale_caches(cache_dir, source):
+    """Remove the caches next to ``cache_dir`` that no current load can use.
+
+    Those are caches of an older version of the ``source`` CSV or of its
+    cleaning, and caches in another format. Caches of other CSVs in the same
+    directory are kept, as are hidden directories that are still being
+    written. Processes that memory-mapped a removed cache keep their mapping.
+    """
+    parent = os.path.dirname(cache_dir)
+    current = os.path.basename(cache_dir)
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if name == current or name.startswith('.') or not os.path.isdir(path):
+            continue
+        try:
+            with open(os.path.join(path, META_FILENAME)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        if meta.get('format') != CACHE_FORMAT_VERSION or meta.get('source') == source:
+            logger.info(f"Removing stale dataset cache {path}")
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def read_columns(cache_dir, digest, mmap=True):
+    """Rebuild the DataFrame from a cache directory, or None if it is missing or stale.
+
+    With ``mmap`` the numeric columns are read-only memory maps of the .npy
+    files, so the frame must not be modified in place.
+    """
+    meta_path = os.path.join(cache_dir, META_FILENAME)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('format') != CACHE_FORMAT_VERSION or meta.get('sha256') != digest:
+        return None
+
+    mmap_mode = 'r' if mmap else None
+    data = {}
+    for entry in meta['columns']:
+        values = np.load(os.path.join(cache_dir, entry['file']), mmap_mode=mmap_mode)
+        if 'categories' in entry:
+            data[entry['name']] = pd.Categorical.from_codes(np.asarray(values), entry['categories'])
+        else:
+            # Plain ndarray view of the mapping so pandas sees an ordinary array
+            data[entry['name']] = values.view(np.ndarray)
+    return pd.DataFrame(data, copy=False)
+
+
+def load_cached_csv(csv_path, clean, version=0, mmap=True):
+    """Load ``clean(pd.read_csv(csv_path))`` through the columnar cache.
+
+    The cache is keyed by the sha256 of the CSV, so editing the CSV rebuilds
+    it on the next load. ``version`` identifies the cleaning logic; bump it
+    whenever ``clean`` changes its output.
+    """
+    digest = file_sha256(csv_path)
+    cache_dir = cache_dir_for(csv_path, digest, version)
+    try:
+        frame = read_columns(cache_dir, digest, mmap=mmap)
+        if frame is not None:
+            return frame
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable dataset cache {cache_dir}: {str(e)}")
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    frame = clean(pd.read_csv(csv_path))
+    try:
+        write_columns(frame, cache_dir, digest, os.path.basename(csv_path))
+        logger.info(f"Wrote dataset cache {cache_dir}")
+    except OSError as e:
+        logger.warning(f"Could not write dataset cache {cache_dir}: {str(e)}")
+    return frame
@@ -0,0 +1,109 @@
+"""Shared in-memory copy of the crop yield dataset"""
+
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+from data.dataset_cache import load_cached_csv
+
+logger = logging.getLogger(__name__)
+
+CROP_YIELD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crop_yield.csv')
+
+# String columns that are stripped and stored as categoricals
+CATEGORICAL_COLUMNS = ['State', 'Season', 'Crop']
+
+# Identifies the output of clean_crop_dataset in the columnar cache; bump it
+# whenever the cleaning changes
+CLEANING_VERSION = 1
+
+
+def _downcast(series):
+    """Downcast a numeric column to the smallest dtype that holds it losslessly"""
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer')
+    if pd.api.types.is_float_dtype(series):
+        narrowed = series.astype(np.float32)
+        if np.array_equal(narrowed.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+            return narrowed
+    return series
+
+
+def clean_crop_dataset(df):
+    """Strip and categorize string columns and downcast numeric columns"""
+    df = df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype(str).str.strip().astype('category')
+    for col in df.columns:
+        if col not in CATEGORICAL_COLUMNS:
+            df[col] = _downcast(df[col])
+    return df
+
+
+def load_crop_dataset(path=CROP_YIELD_PATH, mmap=True):
+    """Read and clean the crop yield CSV through the columnar cache"""
+    return load_cached_csv(path, clean_crop_dataset, version=CLEANING_VERSION, mmap=mmap)
+
+
+class DatasetStore:
+    """Loads the crop yield dataset once and shares it between callers.
+
+    The cleaned DataFrame must be treated as read-only. Listeners registered
+    with :meth:`add_listener` are called with the new frame every time the
+    dataset is loaded or reloaded, so derived lookups can be rebuilt.
+    """
+
+    def __init__(self, path=CROP_YIELD_PATH, loader=load_crop_dataset):
+        self.path = path
+        self.loader = loader
+        self._frame = None
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    def get(self):
+        """Return the cleaned dataset, loading it on first use"""
+        frame = self._frame
+        if frame is None:
+            with self._lock:
+                if self._frame is None:
+                    self._publish(self.loader(self.path))
+                frame = self._frame
+        return frame
+
+    @property
+    def loaded(self):
+        """Whether the dataset has been loaded (a later get() reads it from disk)"""
+        return self._frame is not None
+
+    def reload(self):
+        """Re-read the dataset from disk and notify listeners"""
+        frame = self.loader(self.path)
+        with self._lock:
+            self._publish(frame)
+        return frame
+
+    def add_listener(self, callback):
+        """Call ``callback(frame)`` now (if loaded) and after every reload"""
+        with self._lock:
+            self._listeners.append(callback)
+            frame = self._frame
+        if frame is not None:
+            callback(frame)
+
+    def _publish(self, frame):
+        self._frame = frame
+        logger.info(f"Crop dataset loaded from {self.path}. Shape: {frame.shape}")
+        for callback in list(self._listeners):
+            try:
+                callback(frame)
+            except Exception as e:
+                logger.error(f"Error in dataset listener {callback!r}: {str(e)}")
+
+
+dataset_store = DatasetStore()
+
+
+def get_dataset():
+    """Return the shared, cleaned crop yield dataset"""
+    return dataset_store.get()
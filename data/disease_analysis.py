@@ -2,9 +2,8 @@ import os
 import random
 import logging
 from PIL import Image
+import threading
 import numpy as np
-import torch
-from torchvision import models, transforms
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -12,16 +11,35 @@ logging.basicConfig(level=logging.INFO)
 # Path to the dataset
 DATASET_PATH = 'g:/Mini Project/data/archive'
 
-# Load a pre-trained model
-model = models.resnet18(weights='DEFAULT')  # Use the latest weights
-model.eval()  # Set the model to evaluation mode
-
-# Define the image transformations
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-])
+# The pre-trained model and its transforms are loaded on first use, so
+# importing this module does not import torch or download weights
+_model = None
+_transform = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """Return the pre-trained resnet18 in evaluation mode, loading it on first use"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from torchvision import models
+                model = models.resnet18(weights='DEFAULT')  # Use the latest weights
+                model.eval()  # Set the model to evaluation mode
+                _model = model
+    return _model
+
+def get_transform():
+    """Return the image transformations, building them on first use"""
+    global _transform
+    if _transform is None:
+        from torchvision import transforms
+        _transform = transforms.Compose([
+            transforms.Resize((224, 224)),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        ])
+    return _transform
 
 # Function to analyze disease based on image filename
 def analyze_disease(image_filename):
@@ -51,11 +69,12 @@ def analyze_disease(image_filename):
 def analyze_image(image_path):
     # Load and preprocess the image
     img = Image.open(image_path).convert("RGB")
-    img_tensor = transform(img).unsqueeze(0)  # Add batch dimension
+    img_tensor = get_transform()(img).unsqueeze(0)  # Add batch dimension
 
     # Perform inference
+    import torch
     with torch.no_grad():
-        outputs = model(img_tensor)
+        outputs = get_model()(img_tensor)
     
     # Log raw model outputs
     logging.info(f'Raw model outputs: {outputs}')  # Log the raw outputs
@@ -76,6 +95,7 @@ def compare_images(image1, image2):
     img1 = Image.open(image1).convert("RGB")
     img2 = Image.open(image2).convert("RGB")
     
+    transform = get_transform()
     img1 = transform(img1)
     img2 = transform(img2)
     
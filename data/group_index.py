@@ -0,0 +1,119 @@
+"""(State, Season, Crop) group index with precomputed aggregates"""
+
+import numpy as np
+from data.dataset_store import dataset_store, get_dataset
+
+GROUP_KEYS = ['State', 'Season', 'Crop']
+
+# Per-hectare input ratios derived from the raw totals
+RATIO_COLUMNS = {
+    'fertilizer_ratio': 'Fertilizer',
+    'pesticide_ratio': 'Pesticide',
+}
+
+# Columns whose sums and sums of squared deviations are kept for every group
+AGGREGATE_COLUMNS = ['Yield', 'Area', 'Annual_Rainfall', 'fertilizer_ratio', 'pesticide_ratio']
+
+
+class GroupStats:
+    """Row slice and precomputed statistics of one (State, Season, Crop) group"""
+
+    def __init__(self, index, position):
+        self._index = index
+        self.position = position
+        self.key = index.keys[position]
+        self.start = int(index.starts[position])
+        self.stop = int(index.starts[position] + index.counts[position])
+        self.count = int(index.counts[position])
+
+    def values(self, col):
+        """The group's own values of ``col`` (a view into the sorted column)"""
+        return self._index.columns[col][self.start:self.stop]
+
+    def rows(self):
+        """The group's rows of the sorted dataset"""
+        return self._index.frame.iloc[self.start:self.stop]
+
+    def sum(self, col):
+        return float(self._index.sums[self.position, self._index.column_position[col]])
+
+    def mean(self, col):
+        return self.sum(col) / self.count
+
+    def std(self, col):
+        """Sample standard deviation (ddof=1), NaN for single-row groups"""
+        if self.count < 2:
+            return float('nan')
+        m2 = self._index.m2[self.position, self._index.column_position[col]]
+        return float(np.sqrt(m2 / (self.count - 1)))
+
+
+class GroupIndex:
+    """Rows of the dataset sorted by (State, Season, Crop) with per-group aggregates.
+
+    Each group occupies a contiguous slice of the sorted columns. Counts and
+    sums are stored per group, together with the sum of squared deviations
+    from the group mean, so means and standard deviations are O(1) lookups.
+    """
+
+    def __init__(self, frame):
+        frame = frame.copy()
+        for ratio_col, total_col in RATIO_COLUMNS.items():
+            frame[ratio_col] = frame[total_col] / frame['Area']
+
+        # Combine the categorical codes into one sortable group code
+        group_codes = np.zeros(len(frame), dtype=np.int64)
+        for col in GROUP_KEYS:
+            categories = frame[col].cat.categories
+            group_codes = group_codes * len(categories) + frame[col].cat.codes.to_numpy()
+        order = np.argsort(group_codes, kind='stable')
+        self.frame = frame.iloc[order].reset_index(drop=True)
+
+        sorted_codes = group_codes[order]
+        _, starts, counts = np.unique(sorted_codes, return_index=True, return_counts=True)
+        self.starts = starts
+        self.counts = counts
+
+        key_columns = [self.frame[col].to_numpy()[starts] for col in GROUP_KEYS]
+        self.keys = [tuple(str(value) for value in key) for key in zip(*key_columns)]
+        self.positions = {key: position for position, key in enumerate(self.keys)}
+
+        self.columns = {col: self.frame[col].to_numpy(dtype=np.float64) for col in AGGREGATE_COLUMNS}
+        self.column_position = {col: i for i, col in enumerate(AGGREGATE_COLUMNS)}
+        group_of_row = np.repeat(np.arange(len(starts)), counts)
+        self.sums = np.empty((len(starts), len(AGGREGATE_COLUMNS)))
+        self.m2 = np.empty((len(starts), len(AGGREGATE_COLUMNS)))
+        for i, col in enumerate(AGGREGATE_COLUMNS):
+            values = self.columns[col]
+            self.sums[:, i] = np.add.reduceat(values, starts)
+            deviations = values - (self.sums[:, i] / counts)[group_of_row]
+            self.m2[:, i] = np.add.reduceat(deviations * deviations, starts)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, state, season, crop):
+        """Return the GroupStats for a key, or None when it has no rows"""
+        position = self.positions.get((state.strip(), season.strip(), crop.strip()))
+        if position is None:
+            return None
+        return GroupStats(self, position)
+
+
+_group_index = None
+
+
+def _rebuild_group_index(frame):
+    global _group_index
+    _group_index = GroupIndex(frame)
+
+
+dataset_store.add_listener(_rebuild_group_index)
+
+
+def get_group_index():
+    """Return the group index for the current dataset"""
+    if _group_index is None:
+        # Loading the dataset notifies the listener that builds the index
+        get_dataset()
+    return _group_index
@@ -0,0 +1,164 @@
+"""Lightweight per-route and per-stage latency histograms in Prometheus text format"""
+
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        index = 0
+        for bound in self.buckets:
+            if seconds <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.total += seconds
+        self.count += 1
+
+    def snapshot(self):
+        """Return (cumulative bucket counts incl. +Inf, sum, count)"""
+        cumulative = []
+        running = 0
+        for count in self.counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, self.total, self.count
+
+
+class _NullStage:
+    """Context manager that does nothing; used while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def stage(self, name):
+        return self
+
+
+NULL_TIMER = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('registry', 'route', 'name', 'start')
+
+    def __init__(self, registry, route, name):
+        self.registry = registry
+        self.route = route
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe_stage(self.route, self.name, (time.perf_counter_ns() - self.start) / 1e9)
+        return False
+
+
+class RouteTimer:
+    """Times a whole request and hands out timers for its stages"""
+
+    __slots__ = ('registry', 'route', 'start')
+
+    def __init__(self, registry, route):
+        self.registry = registry
+        self.route = route
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe_route(self.route, (time.perf_counter_ns() - self.start) / 1e9)
+        return False
+
+    def stage(self, name):
+        return _Stage(self.registry, self.route, name)
+
+
+class MetricsRegistry:
+    """Collects route and stage latencies once enabled.
+
+    Collection starts on the first scrape of ``/metrics`` (or at startup when
+    ``CROPSMART_METRICS=1``). Until then every timer is a shared no-op, so
+    instrumented code only pays for an attribute check.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._stages = {}
+
+    def route(self, route):
+        """Timer for one request to ``route``; use as a context manager"""
+        if not self.enabled:
+            return NULL_TIMER
+        return RouteTimer(self, route)
+
+    def observe_route(self, route, seconds):
+        with self._lock:
+            histogram = self._routes.get(route)
+            if histogram is None:
+                histogram = self._routes[route] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_stage(self, route, stage, seconds):
+        key = (route, stage)
+        with self._lock:
+            histogram = self._stages.get(key)
+            if histogram is None:
+                histogram = self._stages[key] = Histogram()
+            histogram.observe(seconds)
+
+    def render(self):
+        """Render all histograms in the Prometheus text exposition format"""
+        self.enabled = True
+        with self._lock:
+            routes = {route: histogram.snapshot() for route, histogram in self._routes.items()}
+            stages = {key: histogram.snapshot() for key, histogram in self._stages.items()}
+
+        lines = [
+            '# HELP cropsmart_request_duration_seconds Request latency by route.',
+            '# TYPE cropsmart_request_duration_seconds histogram',
+        ]
+        for route in sorted(routes):
+            lines.extend(_render_histogram('cropsmart_request_duration_seconds', f'route="{route}"', routes[route]))
+
+        lines.extend([
+            '# HELP cropsmart_stage_duration_seconds Latency of each request stage by route.',
+            '# TYPE cropsmart_stage_duration_seconds histogram',
+        ])
+        for route, stage in sorted(stages):
+            labels = f'route="{route}",stage="{stage}"'
+            lines.extend(_render_histogram('cropsmart_stage_duration_seconds', labels, stages[(route, stage)]))
+        return '\n'.join(lines) + '\n'
+
+
+def _render_histogram(name, labels, snapshot):
+    cumulative, total, count = snapshot
+    bounds = [repr(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+    lines = [f'{name}_bucket{{{labels},le="{bound}"}} {value}' for bound, value in zip(bounds, cumulative)]
+    lines.append(f'{name}_sum{{{labels}}} {total}')
+    lines.append(f'{name}_count{{{labels}}} {count}')
+    return lines
+
+
+registry = MetricsRegistry(enabled=os.environ.get('CROPSMART_METRICS', '0') == '1')
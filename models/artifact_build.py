@@ -0,0 +1,178 @@
+"""Content-hashed build graph that rebuilds only stale model artifacts"""
+
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'build_manifest.json'
+
+
+def content_hash(path):
+    """sha256 of a file, or of every file (with its relative name) in a directory"""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                file_path = os.path.join(dirpath, filename)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update(content_hash(file_path).encode())
+        return digest.hexdigest()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_hash(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class BuildTarget:
+    """One build step whose ``build(context)`` writes ``outputs``.
+
+    ``inputs`` are source files and ``deps`` name the targets whose outputs
+    this step reads. ``params`` holds every setting that changes the outputs
+    (hyperparameters, format versions); it must be JSON serializable.
+    """
+
+    def __init__(self, name, outputs, build, inputs=(), deps=(), params=None):
+        self.name = name
+        self.outputs = list(outputs)
+        self.build = build
+        self.inputs = list(inputs)
+        self.deps = list(deps)
+        self.params = params or {}
+
+
+class ArtifactBuild:
+    """Runs build targets in order, skipping those whose record is still current.
+
+    For every built target the manifest records the content hashes of its
+    inputs (including upstream outputs), of its parameters and of its
+    outputs. A target is stale when any of those no longer match what is on
+    disk, so editing the CSV, changing a hyperparameter or deleting or
+    hand-editing an output rebuilds exactly the affected targets. A rebuilt
+    target whose outputs come out byte-identical does not make downstream
+    targets stale.
+    """
+
+    def __init__(self, targets, manifest_path, root_dir):
+        self.targets = list(targets)
+        self.by_name = {target.name: target for target in self.targets}
+        self.manifest_path = manifest_path
+        self.root_dir = root_dir
+        self._hashes = {}
+
+    def input_paths(self, target):
+        paths = list(target.inputs)
+        for dep in target.deps:
+            paths.extend(self.by_name[dep].outputs)
+        return paths
+
+    def stale_reason(self, target, manifest):
+        """Why ``target`` must be rebuilt, or None when its outputs are current"""
+        record = manifest.get(target.name)
+        if record is None:
+            return 'never built'
+        if record.get('params') != params_hash(target.params):
+            return 'parameters changed'
+        for path in target.outputs:
+            if not os.path.exists(path):
+                return f'missing {self._relative(path)}'
+        recorded_inputs = record.get('inputs', {})
+        for path in self.input_paths(target):
+            if not os.path.exists(path) or recorded_inputs.get(self._relative(path)) != self._hash(path):
+                return f'{self._relative(path)} changed'
+        recorded_outputs = record.get('outputs', {})
+        for path in target.outputs:
+            if recorded_outputs.get(self._relative(path)) != self._hash(path):
+                return f'{self._relative(path)} was modified'
+        return None
+
+    def stale_targets(self):
+        """``[(name, reason)]`` of targets a build would run.
+
+        Targets downstream of a stale target are reported too, since they
+        may have to be rebuilt once its new outputs exist.
+        """
+        self._hashes = {}
+        manifest = self.load_manifest()
+        stale = {}
+        for target in self.targets:
+            reason = self.stale_reason(target, manifest)
+            if reason is None:
+                upstream = [dep for dep in target.deps if dep in stale]
+                if upstream:
+                    reason = f'depends on {", ".join(upstream)}'
+            if reason is not None:
+                stale[target.name] = reason
+        return list(stale.items())
+
+    def build(self, force=False, context=None):
+        """Rebuild stale targets (every target with ``force``); returns the rebuilt names"""
+        self._hashes = {}
+        context = {} if context is None else context
+        manifest = self.load_manifest()
+        rebuilt = []
+        for target in self.targets:
+            reason = 'forced' if force else self.stale_reason(target, manifest)
+            if reason is None:
+                logger.info(f"Artifact target {target.name} is up to date")
+                continue
+            logger.info(f"Building artifact target {target.name} ({reason})")
+            target.build(context)
+            for path in target.outputs:
+                self._hashes.pop(path, None)
+            # Save after every target so an interrupted build keeps its progress
+            manifest[target.name] = self._record(target)
+            self.save_manifest(manifest)
+            rebuilt.append(target.name)
+        return rebuilt
+
+    def record(self, names):
+        """Mark targets as built from what is on disk now.
+
+        For outputs brought up to date outside :meth:`build` (such as an
+        incremental model update), so the next build keeps them instead of
+        rebuilding them from scratch. Targets downstream of them become stale.
+        """
+        self._hashes = {}
+        manifest = self.load_manifest()
+        for name in names:
+            manifest[name] = self._record(self.by_name[name])
+        self.save_manifest(manifest)
+
+    def _record(self, target):
+        return {
+            'params': params_hash(target.params),
+            'inputs': {self._relative(path): self._hash(path) for path in self.input_paths(target)},
+            'outputs': {self._relative(path): self._hash(path) for path in target.outputs},
+        }
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except ValueError:
+            logger.warning(f"Ignoring unreadable build manifest {self.manifest_path}")
+            return {}
+
+    def save_manifest(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _hash(self, path):
+        if path not in self._hashes:
+            self._hashes[path] = content_hash(path)
+        return self._hashes[path]
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root_dir)
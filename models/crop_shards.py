@@ -0,0 +1,126 @@
+"""Per-crop model shards, loaded on demand into a size-capped LRU cache"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from atomic_dir import write_directory
+from models.forest_engine import FlatForest
+
+logger = logging.getLogger(__name__)
+
+# Directory (under the model directory) holding one flattened forest per crop
+SHARDS_DIRNAME = 'crop_shards'
+SHARD_INDEX_FILENAME = 'index.json'
+
+
+def shards_enabled():
+    """Whether crop shards are built and served (CROPSMART_SHARDS=1; off by default)"""
+    return os.environ.get('CROPSMART_SHARDS', '0') == '1'
+
+
+def shard_dirname(crop):
+    """Filesystem-safe, collision-free directory name for a crop's shard"""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', crop).strip('_').lower()
+    return f"{slug}-{hashlib.sha1(crop.encode()).hexdigest()[:8]}"
+
+
+def save_shards(path, forests, index):
+    """Write ``{crop: FlatForest}`` and the shard index into the directory ``path``.
+
+    Like :meth:`FlatForest.save`, the directory is replaced with
+    :func:`atomic_dir.write_directory`, so memory-mapped shards are never rewritten.
+    """
+    def write(tmp_dir):
+        for crop, forest in forests.items():
+            forest.save(os.path.join(tmp_dir, index['shards'][crop]['path']))
+        with open(os.path.join(tmp_dir, SHARD_INDEX_FILENAME), 'w') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+
+    write_directory(path, write)
+
+
+def read_shard_index(model_dir):
+    """The shard index written by training, or None when no shards were built"""
+    path = os.path.join(model_dir, SHARDS_DIRNAME, SHARD_INDEX_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class ShardCache:
+    """Crop shards loaded lazily and kept in least-recently-used order.
+
+    A shard is read into memory (not memory-mapped) the first time its crop
+    is requested, so ``max_bytes`` bounds the resident node arrays. When
+    the loaded shards exceed it, the least recently used shards are dropped
+    (the one just requested is always kept). Crops without a shard return
+    None and are served by the global model.
+    """
+
+    def __init__(self, shards_dir, index, max_bytes):
+        self.shards_dir = shards_dir
+        self.shards = index['shards']
+        self.n_features = index['n_features']
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @classmethod
+    def load(cls, model_dir, max_bytes, n_features):
+        """Cache over the shards in ``model_dir``, or None when there are none usable"""
+        index = read_shard_index(model_dir)
+        if index is None or not index['shards']:
+            return None
+        if index['n_features'] != n_features:
+            logger.warning(
+                f"Ignoring crop shards built for {index['n_features']} features (model has {n_features})"
+            )
+            return None
+        return cls(os.path.join(model_dir, SHARDS_DIRNAME), index, max_bytes)
+
+    def __contains__(self, crop):
+        return crop in self.shards
+
+    def get(self, crop):
+        """The crop's shard forest, loading it if needed, or None if it has no shard"""
+        entry = self.shards.get(crop)
+        if entry is None:
+            return None
+        with self._lock:
+            forest = self._loaded.get(crop)
+            if forest is not None:
+                self._loaded.move_to_end(crop)
+                self._hits += 1
+                return forest
+
+            forest = FlatForest.load(os.path.join(self.shards_dir, entry['path']), mmap_mode=None)
+            self._misses += 1
+            self._loaded[crop] = forest
+            self._bytes += forest.nbytes
+            while self._bytes > self.max_bytes and len(self._loaded) > 1:
+                _, evicted = self._loaded.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self._evictions += 1
+            return forest
+
+    def stats(self):
+        """Cache occupancy and hit counts for status endpoints"""
+        with self._lock:
+            return {
+                'shards': len(self.shards),
+                'loaded': list(self._loaded),
+                'loaded_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions
+            }
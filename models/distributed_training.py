@@ -0,0 +1,127 @@
+"""Train a random forest as independent tree jobs and merge them into one estimator.
+
+The coordinator writes the training matrix once as ``.npy`` files and a job
+spec (``jobs.json``) that splits ``n_estimators`` into fixed-size chunks,
+each with its own seed. Every job memory-maps the matrix, fits its trees
+and pickles them next to the spec. Jobs run in a local process pool, or on
+other machines that can read the same directory::
+
+    python -m models.distributed_training <work_dir>/jobs.json <job_id>
+
+Seeds belong to the chunks rather than to the workers, so the merged
+forest is the same whatever the number of workers.
+"""
+
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+JOB_SPEC_FILENAME = 'jobs.json'
+TREES_PER_JOB = 25
+# Rows copied into the shared matrix per step, so large inputs are never
+# converted in one piece
+WRITE_CHUNK_ROWS = 65536
+
+
+def write_training_matrix(X, y, work_dir):
+    """Write X (float32, the dtype trees train on) and y into ``work_dir``"""
+    X_path = os.path.join(work_dir, 'X.npy')
+    shared = np.lib.format.open_memmap(X_path, mode='w+', dtype=np.float32, shape=X.shape)
+    for start in range(0, X.shape[0], WRITE_CHUNK_ROWS):
+        shared[start:start + WRITE_CHUNK_ROWS] = X[start:start + WRITE_CHUNK_ROWS]
+    shared.flush()
+    del shared
+    np.save(os.path.join(work_dir, 'y.npy'), np.asarray(y, dtype=np.float64))
+
+
+def write_job_spec(work_dir, params, trees_per_job=TREES_PER_JOB):
+    """Split ``params['n_estimators']`` into seeded jobs; returns the spec path.
+
+    Job seeds are spawned from ``params['random_state']``, so the same
+    parameters always produce the same jobs.
+    """
+    params = dict(params)
+    n_estimators = params.pop('n_estimators')
+    random_state = params.pop('random_state', None)
+    params.pop('n_jobs', None)
+    seeds = np.random.SeedSequence(random_state).spawn(-(-n_estimators // trees_per_job))
+    jobs = []
+    for job_id, seed in enumerate(seeds):
+        jobs.append({
+            'id': job_id,
+            'n_estimators': min(trees_per_job, n_estimators - job_id * trees_per_job),
+            'seed': int(seed.generate_state(1)[0]),
+            'output': f'trees-{job_id:04d}.pkl'
+        })
+    spec = {'params': params, 'random_state': random_state, 'jobs': jobs}
+    spec_path = os.path.join(work_dir, JOB_SPEC_FILENAME)
+    with open(spec_path, 'w') as f:
+        json.dump(spec, f, indent=2)
+    return spec_path
+
+
+def run_job(spec_path, job_id):
+    """Fit one job's trees on the memory-mapped matrix and pickle them"""
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+
+    work_dir = os.path.dirname(os.path.abspath(spec_path))
+    with open(spec_path) as f:
+        spec = json.load(f)
+    job = spec['jobs'][job_id]
+    X = np.load(os.path.join(work_dir, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(work_dir, 'y.npy'), mmap_mode='r')
+
+    model = RandomForestRegressor(n_estimators=job['n_estimators'], random_state=job['seed'], n_jobs=1, **spec['params'])
+    model.fit(X, y)
+    output = os.path.join(work_dir, job['output'])
+    joblib.dump(model, output + '.tmp')
+    # Renamed into place so a partially written file never looks finished
+    os.replace(output + '.tmp', output)
+    return job_id
+
+
+def merge_jobs(spec_path):
+    """Load every job's trees into a single fitted RandomForestRegressor"""
+    import joblib
+
+    work_dir = os.path.dirname(os.path.abspath(spec_path))
+    with open(spec_path) as f:
+        spec = json.load(f)
+    merged = None
+    for job in spec['jobs']:
+        model = joblib.load(os.path.join(work_dir, job['output']))
+        if merged is None:
+            merged = model
+        else:
+            merged.estimators_.extend(model.estimators_)
+    merged.n_estimators = len(merged.estimators_)
+    merged.random_state = spec['random_state']
+    return merged
+
+
+def train_distributed(X, y, params, work_dir, max_workers=None, trees_per_job=TREES_PER_JOB):
+    """Fit a random forest with its tree jobs spread over ``max_workers`` processes"""
+    write_training_matrix(X, y, work_dir)
+    spec_path = write_job_spec(work_dir, params, trees_per_job)
+    with open(spec_path) as f:
+        n_jobs = len(json.load(f)['jobs'])
+    max_workers = min(max_workers or os.cpu_count() or 1, n_jobs)
+    logger.info(f"Training {params['n_estimators']} trees as {n_jobs} jobs on {max_workers} workers")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_job, spec_path, job_id) for job_id in range(n_jobs)]
+        for future in as_completed(futures):
+            logger.info(f"Tree job {future.result()} finished")
+    return merge_jobs(spec_path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        raise SystemExit(f"usage: python -m models.distributed_training <{JOB_SPEC_FILENAME}> <job_id>")
+    run_job(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,159 @@
+"""One-hot and ordinal feature encoding shared by model training and the prediction API"""
+
+import json
+import numpy as np
+import pandas as pd
+
+# Numeric inputs, in the order they appear in feature_columns.json
+NUMERIC_FEATURES = ['Crop_Year', 'Area', 'Production', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+
+# Categorical inputs that are one-hot encoded as "<column>_<value>"
+CATEGORICAL_FEATURES = ['Crop', 'Season', 'State']
+
+# Column order of the ordinal encoding: numeric features, then one category
+# code per categorical column
+ORDINAL_FEATURES = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+
+
+def build_feature_columns(categorical_values):
+    """Build the feature column order used for training.
+
+    Matches the layout produced by ``pd.get_dummies``: numeric features first,
+    then one dummy column per sorted category value for each categorical column.
+    """
+    columns = list(NUMERIC_FEATURES)
+    for col in CATEGORICAL_FEATURES:
+        columns.extend(f"{col}_{value}" for value in categorical_values[col])
+    return columns
+
+
+class FeatureEncoder:
+    """Encode raw crop records straight into a preallocated feature matrix.
+
+    Column positions for every numeric feature and every one-hot slot are
+    resolved once, so encoding a request is a handful of array writes instead
+    of building and reindexing DataFrames. Category values that were not seen
+    during training leave all of their dummy columns at zero.
+    """
+
+    def __init__(self, categorical_values, feature_columns):
+        self.categorical_values = {col: list(categorical_values[col]) for col in CATEGORICAL_FEATURES}
+        self.feature_columns = list(feature_columns)
+        self.n_features = len(self.feature_columns)
+
+        position = {name: i for i, name in enumerate(self.feature_columns)}
+        missing = [col for col in NUMERIC_FEATURES if col not in position]
+        if missing:
+            raise ValueError(f"Feature columns are missing numeric features: {missing}")
+        self.numeric_index = np.array([position[col] for col in NUMERIC_FEATURES], dtype=np.intp)
+
+        # value -> column position, plus the same mapping as an index/array pair
+        # for vectorized lookups over whole columns
+        self.category_slots = {}
+        self.category_codes = {}
+        self._category_index = {}
+        self._category_positions = {}
+        for col in CATEGORICAL_FEATURES:
+            values = self.categorical_values[col]
+            self.category_codes[col] = {value: code for code, value in enumerate(values)}
+            slots = {value: position.get(f"{col}_{value}", -1) for value in values}
+            self.category_slots[col] = {value: slot for value, slot in slots.items() if slot >= 0}
+            self._category_index[col] = pd.Index(values)
+            self._category_positions[col] = np.array([slots[value] for value in values], dtype=np.intp)
+
+    @classmethod
+    def from_files(cls, categorical_values_path, feature_columns_path):
+        """Build an encoder from categorical_values.json and feature_columns.json"""
+        with open(categorical_values_path, 'r') as f:
+            categorical_values = json.load(f)
+        with open(feature_columns_path, 'r') as f:
+            feature_columns = json.load(f)
+        return cls(categorical_values, feature_columns)
+
+    def allocate(self, n_rows=1):
+        """Allocate a zeroed feature matrix for ``n_rows`` records"""
+        return np.zeros((n_rows, self.n_features), dtype=np.float64)
+
+    def encode_row(self, record, out=None):
+        """Encode a single record dict into a (1, n_features) matrix.
+
+        ``out`` may be a preallocated row (or 1-row matrix) that is overwritten.
+        """
+        if out is None:
+            out = self.allocate(1)
+        else:
+            out.fill(0.0)
+        row = out.reshape(-1)
+        for col, index in zip(NUMERIC_FEATURES, self.numeric_index):
+            row[index] = float(record[col])
+        for col in CATEGORICAL_FEATURES:
+            slot = self.category_slots[col].get(str(record[col]).strip())
+            if slot is not None:
+                row[slot] = 1.0
+        return out
+
+    def encode_records(self, records, out=None):
+        """Encode a sequence of record dicts into an (n, n_features) matrix"""
+        n_rows = len(records)
+        if out is None:
+            out = self.allocate(n_rows)
+        else:
+            out.fill(0.0)
+        if n_rows == 0:
+            return out
+
+        numeric = np.array([[record[col] for col in NUMERIC_FEATURES] for record in records], dtype=np.float64)
+        out[:, self.numeric_index] = numeric
+
+        rows = np.arange(n_rows)
+        for col in CATEGORICAL_FEATURES:
+            slots = self.category_slots[col]
+            positions = np.array([slots.get(str(record[col]).strip(), -1) for record in records], dtype=np.intp)
+            known = positions >= 0
+            out[rows[known], positions[known]] = 1.0
+        return out
+
+    def encode_frame(self, frame, out=None):
+        """Encode a DataFrame with the raw numeric and categorical columns"""
+        n_rows = len(frame)
+        if out is None:
+            out = self.allocate(n_rows)
+        else:
+            out.fill(0.0)
+
+        out[:, self.numeric_index] = frame[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+
+        rows = np.arange(n_rows)
+        for col in CATEGORICAL_FEATURES:
+            values = frame[col].astype(str).str.strip()
+            codes = self._category_index[col].get_indexer(values)
+            positions = np.where(codes >= 0, self._category_positions[col][codes], -1)
+            known = positions >= 0
+            out[rows[known], positions[known]] = 1.0
+        return out
+
+    def encode_ordinal_records(self, records):
+        """Encode record dicts as numeric features plus one category code per column.
+
+        Codes index the sorted ``categorical_values``. Unseen values become
+        NaN, which models with native categorical support treat as missing.
+        """
+        out = np.empty((len(records), len(ORDINAL_FEATURES)), dtype=np.float64)
+        if len(records) == 0:
+            return out
+        out[:, :len(NUMERIC_FEATURES)] = np.array(
+            [[record[col] for col in NUMERIC_FEATURES] for record in records], dtype=np.float64
+        )
+        for i, col in enumerate(CATEGORICAL_FEATURES, start=len(NUMERIC_FEATURES)):
+            codes = self.category_codes[col]
+            out[:, i] = [codes.get(str(record[col]).strip(), np.nan) for record in records]
+        return out
+
+    def encode_ordinal_frame(self, frame):
+        """Ordinal encoding of a DataFrame with the raw numeric and categorical columns"""
+        out = np.empty((len(frame), len(ORDINAL_FEATURES)), dtype=np.float64)
+        out[:, :len(NUMERIC_FEATURES)] = frame[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+        for i, col in enumerate(CATEGORICAL_FEATURES, start=len(NUMERIC_FEATURES)):
+            codes = self._category_index[col].get_indexer(frame[col].astype(str).str.strip())
+            out[:, i] = np.where(codes >= 0, codes, np.nan)
+        return out
@@ -0,0 +1,420 @@
+"""Array-based random forest evaluator that needs no sklearn estimator at serve time"""
+
+import json
+import os
+import numpy as np
+from atomic_dir import write_directory
+
+# Marker sklearn uses for the feature/threshold of leaf nodes
+_TREE_LEAF = -1
+
+# Per-node arrays written as one .npy file each by FlatForest.save
+NODE_ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots', 'is_leaf')
+FOREST_META_FILENAME = 'meta.json'
+# Bump when the saved layout changes; 1 stored separate left.npy and right.npy
+FOREST_FORMAT_VERSION = 2
+
+# Rows evaluated together by FlatForest.apply. Caps the (tree, row) work
+# arrays at a few tens of MB however large the batch is.
+APPLY_CHUNK_ROWS = 2048
+# Finished (tree, row) pairs are dropped every this many levels; leaves point
+# at themselves, so pairs kept in between only repeat their leaf
+RETIRE_EVERY = 4
+
+
+class FlatForest:
+    """All trees of a fitted forest flattened into contiguous node arrays.
+
+    Node ``i`` of the flattened forest splits on ``feature[i]`` at
+    ``threshold[i]`` and continues to ``children[i, 0]`` (``left``) or
+    ``children[i, 1]`` (``right``); child indices are global across trees,
+    and leaves point at themselves. ``roots[t]`` is the first node of tree
+    ``t``. Evaluation steps every (tree, row) pair down one level per
+    iteration with array gathers.
+
+    Predictions match ``RandomForestRegressor.predict``: inputs are compared
+    as float32 like sklearn's tree code, and tree outputs are summed in tree
+    order before dividing by the number of trees. A forest returned by
+    :meth:`fold_scaler` instead reads raw (unscaled) features in float64.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, n_features,
+                 scaler_folded=False, is_leaf=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.children = np.ascontiguousarray(children, dtype=np.intp).reshape(-1, 2)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.scaler_folded = bool(scaler_folded)
+        self.input_dtype = np.float64 if self.scaler_folded else np.float32
+        if is_leaf is None:
+            is_leaf = self.left == np.arange(len(self.left))
+        self.is_leaf = np.ascontiguousarray(is_leaf, dtype=bool)
+
+    @property
+    def left(self):
+        return self.children[:, 0]
+
+    @property
+    def right(self):
+        return self.children[:, 1]
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in NODE_ARRAYS)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Export a fitted sklearn forest (or single tree) regressor"""
+        estimators = getattr(forest, 'estimators_', [forest])
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            nodes = np.arange(n_nodes)
+            is_leaf = tree.children_left == _TREE_LEAF
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(np.column_stack([
+                np.where(is_leaf, nodes, tree.children_left), np.where(is_leaf, nodes, tree.children_right)
+            ]) + offset)
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds), np.concatenate(children),
+            np.concatenate(values), np.array(roots),
+            max_depth, forest.n_features_in_
+        )
+
+    def fold_scaler(self, scaler):
+        """Return a forest that reads raw features, with ``scaler`` folded into its thresholds.
+
+        A split ``float32((x - mean) / scale) <= t`` is monotone in ``x``, so
+        it is equivalent to ``x <= T`` for the largest float64 ``T`` that
+        still satisfies it. ``T`` is found per split node by bisection, which
+        keeps predictions identical to scaling first and then predicting.
+        """
+        if self.scaler_folded:
+            raise ValueError("Scaler is already folded into this forest")
+        splits = ~self.is_leaf
+        threshold = self.threshold.copy()
+        features = self.feature[splits]
+        threshold[splits] = _fold_thresholds(
+            self.threshold[splits], scaler.mean_[features], scaler.scale_[features]
+        )
+        return FlatForest(
+            self.feature, threshold, self.children, self.value, self.roots,
+            self.max_depth, self.n_features, scaler_folded=True
+        )
+
+    def apply(self, X):
+        """Return the leaf node index reached by every row in every tree, shape (n_trees, n_rows)"""
+        X = np.asarray(X, dtype=self.input_dtype)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected input with {self.n_features} features, got shape {X.shape}")
+        leaves = np.empty((self.n_trees, X.shape[0]), dtype=np.intp)
+        for start in range(0, X.shape[0], APPLY_CHUNK_ROWS):
+            leaves[:, start:start + APPLY_CHUNK_ROWS] = self._apply_rows(X[start:start + APPLY_CHUNK_ROWS])
+        return leaves
+
+    def _apply_rows(self, X):
+        n_rows = X.shape[0]
+        # Column-major, so pairs at the same split read neighbouring values
+        flat_X = np.ascontiguousarray(X.T).reshape(-1)
+        flat_children = self.children.reshape(-1)
+        n_pairs = self.n_trees * n_rows
+        nodes = np.repeat(self.roots, n_rows)
+        rows = np.tile(np.arange(n_rows, dtype=np.intp), self.n_trees)
+        positions = np.arange(n_pairs, dtype=np.intp)
+        leaves = np.empty(n_pairs, dtype=np.intp)
+
+        # Step every unfinished (tree, row) pair one level down, retiring the
+        # pairs that reach a leaf so deep trees don't slow down shallow paths.
+        # np.take with mode='clip' skips the bounds checks of fancy indexing,
+        # and writing into preallocated buffers avoids a temporary per step.
+        depth = 0
+        while True:
+            if depth % RETIRE_EVERY == 0:
+                done = np.take(self.is_leaf, nodes, mode='clip')
+                if done.any():
+                    leaves[positions[done]] = nodes[done]
+                    active = ~done
+                    nodes, rows, positions = nodes[active], rows[active], positions[active]
+                if nodes.size == 0:
+                    break
+                index = np.empty_like(nodes)
+                values = np.empty(nodes.size, dtype=flat_X.dtype)
+                threshold = np.empty(nodes.size, dtype=np.float64)
+                go_left = np.empty(nodes.size, dtype=bool)
+            np.take(self.feature, nodes, out=index, mode='clip')
+            index *= n_rows
+            index += rows
+            np.take(flat_X, index, out=values, mode='clip')
+            np.take(self.threshold, nodes, out=threshold, mode='clip')
+            np.less_equal(values, threshold, out=go_left)
+            # children[node, 1 - go_left] in the flattened (n_nodes * 2) layout
+            nodes *= 2
+            nodes += 1
+            nodes -= go_left
+            np.take(flat_children, nodes, out=nodes, mode='clip')
+            depth += 1
+        return leaves.reshape(self.n_trees, n_rows)
+
+    def _follow_fixed(self, nodes, row, varied):
+        """Advance ``nodes`` through splits on features not in ``varied``, using ``row``"""
+        nodes = nodes.copy()
+        while True:
+            fixed = ~self.is_leaf[nodes] & ~varied[self.feature[nodes]]
+            if not fixed.any():
+                return nodes
+            current = nodes[fixed]
+            go_left = row[self.feature[current]] <= self.threshold[current]
+            nodes[fixed] = np.where(go_left, self.left[current], self.right[current])
+
+    def apply_variations(self, row, columns, values):
+        """Leaves reached by copies of ``row`` whose ``columns`` are set to ``values``.
+
+        ``values`` has one column per entry of ``columns``. Splits on every
+        other feature go the same way for all copies, so they are resolved
+        once for ``row``; the copies then only step through splits on the
+        varied columns. Returns the same array as :meth:`apply` on the full
+        matrix, shape (n_trees, n_rows).
+        """
+        row = np.asarray(row, dtype=self.input_dtype).reshape(-1)
+        values = np.asarray(values, dtype=self.input_dtype).reshape(len(values), len(columns))
+        n_rows = values.shape[0]
+        varied = np.zeros(self.n_features, dtype=bool)
+        varied[columns] = True
+        column_of = np.full(self.n_features, -1, dtype=np.intp)
+        column_of[columns] = np.arange(len(columns))
+
+        # Map every reachable split on a varied column to the next varied split
+        # (or leaf) down each branch. Dense arrays are only written at those nodes.
+        next_left = np.empty(self.n_nodes, dtype=np.intp)
+        next_right = np.empty(self.n_nodes, dtype=np.intp)
+        starts = self._follow_fixed(self.roots, row, varied)
+        frontier = np.unique(starts[~self.is_leaf[starts]])
+        while frontier.size:
+            next_left[frontier] = self._follow_fixed(self.left[frontier], row, varied)
+            next_right[frontier] = self._follow_fixed(self.right[frontier], row, varied)
+            reached = np.concatenate([next_left[frontier], next_right[frontier]])
+            frontier = np.unique(reached[~self.is_leaf[reached]])
+
+        flat_values = values.ravel()
+        n_pairs = self.n_trees * n_rows
+        nodes = np.repeat(starts, n_rows)
+        offsets = np.tile(np.arange(n_rows, dtype=np.intp) * len(columns), self.n_trees)
+        positions = np.arange(n_pairs, dtype=np.intp)
+        leaves = np.empty(n_pairs, dtype=np.intp)
+        done = self.is_leaf[nodes]
+        while True:
+            if done.any():
+                leaves[positions[done]] = nodes[done]
+                active = ~done
+                nodes, offsets, positions = nodes[active], offsets[active], positions[active]
+            if nodes.size == 0:
+                break
+            go_left = flat_values[offsets + column_of[self.feature[nodes]]] <= self.threshold[nodes]
+            nodes = np.where(go_left, next_left[nodes], next_right[nodes])
+            done = self.is_leaf[nodes]
+        return leaves.reshape(self.n_trees, n_rows)
+
+    def predict_variations(self, row, columns, values):
+        """Predict copies of ``row`` with ``columns`` replaced, like :meth:`predict` on the full matrix"""
+        return self._mean_of_leaves(self.apply_variations(row, columns, values))
+
+    def predict_grid(self, row, columns, axes):
+        """Predict ``row`` over the grid spanned by ``axes``, one axis per entry of ``columns``.
+
+        Returns an array of shape ``(len(axes[0]), len(axes[1]), ...)``. With
+        the other features fixed, each tree cuts the grid into boxes along
+        its splits on ``columns``. The boxes reached from ``row`` are found
+        once per tree, and their leaf values are added into a difference
+        array, so the cost grows with the number of boxes rather than with
+        the number of grid points. Results match :meth:`predict` on the
+        expanded grid up to float rounding.
+        """
+        row = np.asarray(row, dtype=self.input_dtype).reshape(-1)
+        axes = [np.asarray(axis, dtype=self.input_dtype).reshape(-1) for axis in axes]
+        orders = [np.argsort(axis, kind='stable') for axis in axes]
+        sorted_axes = [axis[order] for axis, order in zip(axes, orders)]
+        shape = tuple(len(axis) for axis in axes)
+        varied = np.zeros(self.n_features, dtype=bool)
+        varied[columns] = True
+        axis_of = np.full(self.n_features, -1, dtype=np.intp)
+        axis_of[columns] = np.arange(len(columns))
+
+        # Every box is a node plus a half-open index range [lo, hi) per axis
+        nodes = self._follow_fixed(self.roots, row, varied)
+        lo = np.zeros((len(nodes), len(axes)), dtype=np.intp)
+        hi = np.tile(np.asarray(shape, dtype=np.intp), (len(nodes), 1))
+        leaf_nodes, leaf_lo, leaf_hi = [], [], []
+        while nodes.size:
+            done = self.is_leaf[nodes]
+            leaf_nodes.append(nodes[done])
+            leaf_lo.append(lo[done])
+            leaf_hi.append(hi[done])
+            split = ~done
+            nodes, lo, hi = nodes[split], lo[split], hi[split]
+            if nodes.size == 0:
+                break
+            axis = axis_of[self.feature[nodes]]
+            # Grid points at or below the threshold go left
+            cut = np.empty(len(nodes), dtype=np.intp)
+            for a, sorted_axis in enumerate(sorted_axes):
+                on_axis = axis == a
+                cut[on_axis] = np.searchsorted(sorted_axis, self.threshold[nodes[on_axis]], side='right')
+            rows = np.arange(len(nodes))
+            left_hi = hi.copy()
+            left_hi[rows, axis] = np.minimum(hi[rows, axis], cut)
+            right_lo = lo.copy()
+            right_lo[rows, axis] = np.maximum(lo[rows, axis], cut)
+            nodes = np.concatenate([self._follow_fixed(self.left[nodes], row, varied),
+                                    self._follow_fixed(self.right[nodes], row, varied)])
+            lo = np.concatenate([lo, right_lo])
+            hi = np.concatenate([left_hi, hi])
+            keep = (lo < hi).all(axis=1)
+            nodes, lo, hi = nodes[keep], lo[keep], hi[keep]
+
+        leaves = np.concatenate(leaf_nodes)
+        lo = np.concatenate(leaf_lo)
+        hi = np.concatenate(leaf_hi)
+        weights = self.value[leaves] / self.n_trees
+        # Inclusion-exclusion over the box corners, then a prefix sum per axis
+        diff = np.zeros(tuple(n + 1 for n in shape), dtype=np.float64)
+        for corner in np.ndindex(*(2,) * len(axes)):
+            corner = np.asarray(corner, dtype=bool)
+            index = tuple(np.where(upper, hi[:, a], lo[:, a]) for a, upper in enumerate(corner))
+            np.add.at(diff, index, weights if corner.sum() % 2 == 0 else -weights)
+        for a in range(len(axes)):
+            diff = np.cumsum(diff, axis=a)
+        grid = diff[tuple(slice(0, n) for n in shape)]
+
+        # Back to the caller's axis order
+        for a, order in enumerate(orders):
+            inverse = np.empty_like(order)
+            inverse[order] = np.arange(len(order))
+            grid = np.take(grid, inverse, axis=a)
+        return grid
+
+    def predict(self, X):
+        """Predict the forest mean for every row of ``X``"""
+        return self._mean_of_leaves(self.apply(X))
+
+    def _mean_of_leaves(self, leaves):
+        leaf_values = self.value[leaves]
+        prediction = np.zeros(leaf_values.shape[1], dtype=np.float64)
+        for tree_values in leaf_values:
+            prediction += tree_values
+        prediction /= self.n_trees
+        return prediction
+
+    def save(self, path):
+        """Write the node arrays as ``.npy`` files into the directory ``path``.
+
+        ``path`` is swapped atomically to the new directory with
+        :func:`atomic_dir.write_directory`.
+        Files that workers have memory-mapped are never rewritten, so those
+        workers keep reading the previous forest until they reload.
+        """
+        def write(tmp_dir):
+            for name in NODE_ARRAYS:
+                np.save(os.path.join(tmp_dir, f'{name}.npy'), getattr(self, name))
+            meta = {
+                'format': FOREST_FORMAT_VERSION,
+                'n_trees': self.n_trees,
+                'n_nodes': self.n_nodes,
+                'max_depth': self.max_depth,
+                'n_features': self.n_features,
+                'scaler_folded': self.scaler_folded,
+            }
+            with open(os.path.join(tmp_dir, FOREST_META_FILENAME), 'w') as f:
+                json.dump(meta, f, indent=2)
+
+        write_directory(path, write)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a forest written by :meth:`save`.
+
+        With the default ``mmap_mode='r'`` the node arrays are read-only
+        memory maps, so every process serving the same files shares one
+        physical copy through the page cache. Pass ``mmap_mode=None`` to
+        read them into private memory instead.
+
+        Forests saved in format 1 still load, but their separate left and
+        right arrays are combined into a private ``children`` copy.
+        """
+        # Resolve the directory once, so every file comes from the same
+        # version even if a new one is swapped in meanwhile
+        path = os.path.realpath(path)
+        with open(os.path.join(path, FOREST_META_FILENAME)) as f:
+            meta = json.load(f)
+        names = NODE_ARRAYS
+        if meta.get('format', 1) == 1:
+            names = [name for name in NODE_ARRAYS if name != 'children'] + ['left', 'right']
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in names
+        }
+        if 'children' not in arrays:
+            arrays['children'] = np.column_stack([arrays['left'], arrays['right']])
+        return cls(
+            arrays['feature'], arrays['threshold'], arrays['children'], arrays['value'], arrays['roots'],
+            meta['max_depth'], meta['n_features'],
+            scaler_folded=meta['scaler_folded'], is_leaf=arrays['is_leaf']
+        )
+
+
+def _fold_thresholds(threshold, mean, scale):
+    """Largest raw x per split with float32((x - mean) / scale) <= threshold"""
+    def passes(x):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    # Bracket the exact boundary around the affine estimate
+    estimate = threshold * scale + mean
+    width = (np.abs(threshold) + 1.0) * scale * 1e-5
+    low, high = estimate - width, estimate + width
+    for _ in range(20):
+        failed = ~passes(low)
+        if not failed.any():
+            break
+        width[failed] *= 8
+        low[failed] = estimate[failed] - width[failed]
+    for _ in range(20):
+        failed = passes(high)
+        if not failed.any():
+            break
+        width[failed] *= 8
+        high[failed] = estimate[failed] + width[failed]
+    unbracketed = ~passes(low) | passes(high)
+    if unbracketed.any():
+        raise ValueError(
+            f"Could not fold the scaler into {int(unbracketed.sum())} split thresholds "
+            "(non-finite threshold, mean or scale?)"
+        )
+
+    # Bisect until low and high are adjacent float64 values
+    while (np.nextafter(low, np.inf) < high).any():
+        middle = low + (high - low) / 2
+        ok = passes(middle)
+        low = np.where(ok, middle, low)
+        high = np.where(ok, high, middle)
+    return low
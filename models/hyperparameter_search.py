@@ -0,0 +1,225 @@
+"""Cross-validated hyperparameter search over the registered model engines.
+
+Every trial is built by its engine (models/model_engines.py) and trained on
+that engine's own encoding, scaled when the engine uses a scaler, so the
+scores describe models that ``--engine`` actually deploys. Each engine's
+feature matrix, the target and the fold assignment are written once as .npy
+files and memory-mapped by every worker process, so trials never re-encode
+the dataset. Each trial reports accuracy next to model size and predict
+latency, so a serving config can be chosen on cost.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from models.forest_engine import FlatForest
+from models.model_engines import get_engine
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_DIRNAME = '.search_cache'
+
+# Parameter grids per registered engine; every combination is one trial
+SEARCH_SPACE = {
+    'random_forest': {
+        'n_estimators': [50, 100],
+        'max_depth': [None, 16, 32],
+        'min_samples_leaf': [1, 4],
+    },
+    'hist_gradient_boosting': {
+        'max_iter': [200, 500],
+        'max_leaf_nodes': [31, 63],
+        'learning_rate': [0.1],
+    },
+}
+
+# Rows scored per call when timing batch prediction
+LATENCY_BATCH_SIZE = 1024
+LATENCY_REPEATS = 50
+
+
+def grid_trials(search_space, engines=None):
+    """Expand the grids into ``[(engine, params)]``"""
+    trials = []
+    for engine, grid in search_space.items():
+        if engines and engine not in engines:
+            continue
+        get_engine(engine)  # only registered engines can be deployed
+        names = sorted(grid)
+        for values in itertools.product(*(grid[name] for name in names)):
+            trials.append((engine, dict(zip(names, values))))
+    return trials
+
+
+def _matrix_filename(engine):
+    return f'X_{engine}.npy'
+
+
+def prepare_search_data(data, encoder, engines, cache_root, n_splits=5, random_state=42):
+    """Write each engine's X, plus y and fold ids, as .npy files once; returns their directory.
+
+    ``X`` is the engine's own encoding of ``data``, standardized when the
+    engine uses a scaler, as in training. The directory is keyed by the
+    dataset, the feature layout and the fold settings, so repeated searches
+    reuse it; matrices of engines not searched before are added to it.
+    """
+    from sklearn.model_selection import KFold
+    from sklearn.preprocessing import StandardScaler
+
+    key = hashlib.sha256(json.dumps({
+        'rows': len(data),
+        'data': pd.util.hash_pandas_object(data, index=False).sum().item(),
+        'features': encoder.feature_columns,
+        'n_splits': n_splits,
+        'random_state': random_state,
+    }, sort_keys=True).encode()).hexdigest()[:16]
+    cache_dir = os.path.join(cache_root, SEARCH_CACHE_DIRNAME, key)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    def save(filename, array):
+        # Written under a temporary name, so a present file is always complete
+        tmp_path = os.path.join(cache_dir, f'.{filename}')
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, os.path.join(cache_dir, filename))
+
+    if not os.path.exists(os.path.join(cache_dir, 'folds.npy')):
+        folds = np.empty(len(data), dtype=np.int8)
+        for fold, (_, test_index) in enumerate(KFold(n_splits, shuffle=True, random_state=random_state).split(data)):
+            folds[test_index] = fold
+        save('y.npy', data['Yield'].to_numpy(dtype=np.float64))
+        save('folds.npy', folds)
+    for name in engines:
+        if os.path.exists(os.path.join(cache_dir, _matrix_filename(name))):
+            continue
+        engine = get_engine(name)
+        X = engine.encode_frame(encoder, data)
+        if engine.uses_scaler:
+            X = StandardScaler().fit_transform(X)
+        save(_matrix_filename(name), X)
+    return cache_dir
+
+
+_shared = {}
+
+
+def _init_worker(cache_dir, engines):
+    """Memory-map the shared matrices once per worker process"""
+    _shared['X'] = {
+        engine: np.load(os.path.join(cache_dir, _matrix_filename(engine)), mmap_mode='r') for engine in engines
+    }
+    _shared['y'] = np.load(os.path.join(cache_dir, 'y.npy'), mmap_mode='r')
+    _shared['folds'] = np.load(os.path.join(cache_dir, 'folds.npy'), mmap_mode='r')
+
+
+def _latency_ms(predict_fn, X, repeats):
+    predict_fn(X)  # warm up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_fn(X)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(timings))
+
+
+def run_trial(engine, params, base_params=None):
+    """Cross-validate one configuration of ``engine`` on the shared matrices.
+
+    The model is ``get_engine(engine).create`` with ``params`` over
+    ``base_params`` (the engine's training parameters), single-threaded
+    since trials already run in parallel.
+    """
+    X, y, folds = _shared['X'][engine], _shared['y'], _shared['folds']
+    model_params = dict(base_params or {}, **params)
+    if 'n_jobs' in model_params:
+        model_params['n_jobs'] = 1
+    r2_scores, rmse_scores, fit_seconds = [], [], []
+    model = None
+    for fold in range(int(folds.max()) + 1):
+        test = folds == fold
+        model = get_engine(engine).create(model_params)
+        start = time.perf_counter()
+        model.fit(X[~test], y[~test])
+        fit_seconds.append(time.perf_counter() - start)
+
+        residual = y[test] - model.predict(X[test])
+        rmse_scores.append(float(np.sqrt(np.mean(residual ** 2))))
+        r2_scores.append(1.0 - float(np.sum(residual ** 2) / np.sum((y[test] - y[test].mean()) ** 2)))
+
+    # Size and latency of the last fold's model, as it would be served
+    serving_engine = 'sklearn'
+    predict_fn = model.predict
+    if hasattr(model, 'estimators_'):
+        forest = FlatForest.from_sklearn(model)
+        predict_fn = forest.predict
+        serving_engine = 'flat_forest'
+    row = np.ascontiguousarray(X[:1])
+    batch = np.ascontiguousarray(X[:LATENCY_BATCH_SIZE])
+
+    return {
+        'engine': engine,
+        'params': json.dumps(params, sort_keys=True),
+        'r2_mean': float(np.mean(r2_scores)),
+        'r2_std': float(np.std(r2_scores)),
+        'rmse_mean': float(np.mean(rmse_scores)),
+        'fit_seconds': float(np.mean(fit_seconds)),
+        'model_mb': len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1e6,
+        'serving_engine': serving_engine,
+        'predict_ms_row': _latency_ms(predict_fn, row, LATENCY_REPEATS),
+        'predict_ms_batch': _latency_ms(predict_fn, batch, max(LATENCY_REPEATS // 10, 3)),
+    }
+
+
+def pareto_front(report):
+    """Rows no other row beats on R², model size and single-row latency at once"""
+    values = report[['r2_mean', 'model_mb', 'predict_ms_row']].to_numpy()
+    front = np.ones(len(report), dtype=bool)
+    for i, (r2, size, latency) in enumerate(values):
+        dominated = (
+            (values[:, 0] >= r2) & (values[:, 1] <= size) & (values[:, 2] <= latency)
+            & ((values[:, 0] > r2) | (values[:, 1] < size) | (values[:, 2] < latency))
+        )
+        front[i] = not dominated.any()
+    return front
+
+
+def run_search(cache_dir, trials, base_params=None, max_workers=None):
+    """Run ``trials`` across a process pool; returns the report sorted by R².
+
+    ``base_params`` maps engine names to the parameters each trial's grid
+    values are merged into.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    base_params = base_params or {}
+    engines = sorted({engine for engine, _ in trials})
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(cache_dir, engines)) as pool:
+        futures = {
+            pool.submit(run_trial, engine, params, base_params.get(engine)): (engine, params)
+            for engine, params in trials
+        }
+        for future in as_completed(futures):
+            engine, params = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Trial {engine} {params} failed: {str(e)}")
+                continue
+            logger.info(
+                f"{engine} {result['params']}: R2 {result['r2_mean']:.4f}, "
+                f"{result['model_mb']:.1f} MB, {result['predict_ms_row']:.3f} ms/row"
+            )
+            results.append(result)
+
+    report = pd.DataFrame(results)
+    if report.empty:
+        return report
+    report['pareto'] = pareto_front(report)
+    return report.sort_values('r2_mean', ascending=False).reset_index(drop=True)
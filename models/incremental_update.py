@@ -0,0 +1,115 @@
+"""Fold newly collected rows into the trained artifacts without a full retrain"""
+
+import bisect
+import copy
+import math
+import numpy as np
+
+# Columns whose new values extend categorical_values.json
+CATEGORICAL_COLUMNS = ['Crop', 'Season', 'State']
+
+
+def merge_crop_stats(crop_stats, new_rows):
+    """Fold ``new_rows`` into per-crop yield statistics.
+
+    ``crop_stats`` has ``means``, ``stds`` (sample standard deviation, as
+    pandas computes it) and ``counts`` per crop. Each crop's running
+    (count, mean, M2) is combined with the batch's own with Chan et al.'s
+    pairwise form of Welford's update, so no earlier rows are re-read.
+    Returns a new dict in the same shape.
+    """
+    means = dict(crop_stats['means'])
+    stds = dict(crop_stats['stds'])
+    counts = dict(crop_stats['counts'])
+
+    batch = new_rows.groupby('Crop', observed=True)['Yield'].agg(['count', 'mean', 'var'])
+    for crop, (n_b, mean_b, var_b) in batch.iterrows():
+        n_b = int(n_b)
+        m2_b = var_b * (n_b - 1) if n_b > 1 else 0.0
+        n_a = int(counts.get(crop, 0))
+        if n_a == 0:
+            n, mean, m2 = n_b, mean_b, m2_b
+        else:
+            mean_a = means[crop]
+            std_a = stds.get(crop)
+            m2_a = std_a ** 2 * (n_a - 1) if n_a > 1 and std_a is not None and not math.isnan(std_a) else 0.0
+            n = n_a + n_b
+            delta = mean_b - mean_a
+            mean = mean_a + delta * n_b / n
+            m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+        means[crop] = float(mean)
+        stds[crop] = float(np.sqrt(m2 / (n - 1))) if n > 1 else float('nan')
+        counts[crop] = n
+    return {'means': means, 'stds': stds, 'counts': counts}
+
+
+def extend_categorical_values(categorical_values, new_rows):
+    """Add unseen values of each categorical column in sorted position.
+
+    Returns ``(values, added)``; keeping the lists sorted keeps the one-hot
+    layout identical to what a full retrain on the combined data produces.
+    """
+    values = {col: list(categorical_values[col]) for col in categorical_values}
+    added = {}
+    for col in CATEGORICAL_COLUMNS:
+        known = set(values[col])
+        for value in sorted(set(new_rows[col].astype(str).str.strip()) - known):
+            bisect.insort(values[col], value)
+            added.setdefault(col, []).append(value)
+    return values, added
+
+
+def _column_mapping(old_columns, new_columns):
+    position = {col: i for i, col in enumerate(new_columns)}
+    missing = [col for col in old_columns if col not in position]
+    if missing:
+        raise ValueError(f"New feature layout is missing columns: {missing}")
+    return np.array([position[col] for col in old_columns], dtype=np.intp)
+
+
+def remap_forest_features(model, old_columns, new_columns):
+    """Copy of a fitted random forest reading the ``new_columns`` layout.
+
+    Every column of ``old_columns`` must appear in ``new_columns``; the
+    trees never split on the added columns. Each tree is rebuilt from its
+    pickled node array with the split features renumbered, so predictions
+    on the new layout match the original forest on the old one.
+    """
+    mapping = _column_mapping(old_columns, new_columns)
+    n_features = len(new_columns)
+    estimators = []
+    for estimator in model.estimators_:
+        tree_cls, (_, n_classes, n_outputs), state = estimator.tree_.__reduce__()
+        nodes = state['nodes'].copy()
+        split = nodes['feature'] >= 0
+        nodes['feature'][split] = mapping[nodes['feature'][split]]
+        tree = tree_cls(n_features, n_classes, n_outputs)
+        tree.__setstate__(dict(state, nodes=nodes))
+        estimator = copy.copy(estimator)
+        estimator.tree_ = tree
+        estimator.n_features_in_ = n_features
+        estimators.append(estimator)
+    remapped = copy.copy(model)
+    remapped.estimators_ = estimators
+    remapped.n_features_in_ = n_features
+    return remapped
+
+
+def extend_scaler(scaler, old_columns, new_columns):
+    """Copy of a fitted StandardScaler for ``new_columns``; added columns pass through unscaled"""
+    mapping = _column_mapping(old_columns, new_columns)
+    extended = copy.copy(scaler)
+    for name, fill in (('mean_', 0.0), ('var_', 1.0), ('scale_', 1.0)):
+        values = np.full(len(new_columns), fill)
+        values[mapping] = getattr(scaler, name)
+        setattr(extended, name, values)
+    extended.n_features_in_ = len(new_columns)
+    return extended
+
+
+def append_trees(model, added):
+    """Copy of ``model`` with the trees of ``added`` (same feature layout) appended"""
+    merged = copy.copy(model)
+    merged.estimators_ = list(model.estimators_) + list(added.estimators_)
+    merged.n_estimators = len(merged.estimators_)
+    return merged
@@ -0,0 +1,117 @@
+"""Coalesce concurrent single-row predictions into vectorized model calls"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collect submitted items for a short window and score them together.
+
+    ``predict_fn`` receives a list of submitted items and must return one
+    result per item, in the same order. A batch is dispatched as soon as it
+    holds ``max_batch_size`` items or ``max_wait_ms`` has passed since its
+    first item arrived, whichever comes first.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        # batch size -> number of batches dispatched with that size
+        self._size_counts = [0] * (self.max_batch_size + 1)
+
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Queue an item for prediction and return a Future for its result"""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        """Submit an item and wait for its result"""
+        return self.submit(item).result(timeout=timeout)
+
+    def close(self):
+        """Stop the worker after the queued items are processed"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def stats(self):
+        """Batch counts and fill ratios since the batcher started"""
+        with self._stats_lock:
+            batches = self._batches
+            items = self._items
+            size_counts = list(self._size_counts)
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': batches,
+            'items': items,
+            'mean_batch_size': items / batches if batches else 0.0,
+            'mean_fill_ratio': items / (batches * self.max_batch_size) if batches else 0.0,
+            'batch_size_counts': {size: count for size, count in enumerate(size_counts) if count}
+        }
+
+    def _collect(self, first):
+        """Gather a batch starting with ``first`` until it is full or the window closes"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # Re-queue the shutdown marker for the main loop
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._size_counts[len(batch)] += 1
+            logger.debug(f"Dispatching micro-batch of {len(batch)}/{self.max_batch_size}")
+
+            try:
+                results = self.predict_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"predict_fn returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                logger.error(f"Error in micro-batch prediction: {str(e)}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
@@ -0,0 +1,282 @@
+"""Versioned bundle of every artifact needed to serve crop yield predictions"""
+
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from models.crop_shards import SHARD_INDEX_FILENAME, SHARDS_DIRNAME, ShardCache
+from models.feature_encoder import NUMERIC_FEATURES, FeatureEncoder
+from models.forest_engine import FOREST_META_FILENAME, FlatForest
+from models.model_engines import DEFAULT_ENGINE, FOREST_FILENAME, MODEL_FILENAME, SCALER_FILENAME, get_engine
+from metrics import NULL_TIMER
+
+# Engine name and parameters of the trained model
+MODEL_INFO_FILENAME = 'model_info.json'
+FEATURES_FILENAME = 'feature_columns.json'
+CATEGORICAL_VALUES_FILENAME = 'categorical_values.json'
+CROP_STATS_FILENAME = 'crop_stats.json'
+
+BUNDLE_FILENAMES = [
+    MODEL_FILENAME,
+    SCALER_FILENAME,
+    FEATURES_FILENAME,
+    CATEGORICAL_VALUES_FILENAME,
+    CROP_STATS_FILENAME,
+]
+
+# With a batch estimator loaded, batches of at least this many rows go to it
+# instead of the flattened forest: sklearn's compiled traversal is about 2x
+# faster on 4096 rows, the flattened forest faster below ~500 (benchmark_forest.py)
+ESTIMATOR_MIN_ROWS = 512
+
+# Used for crops that have no recorded statistics
+DEFAULT_CROP_MEAN = 5.0
+DEFAULT_CROP_STD = 2.0
+
+
+class CropStats:
+    """Per-crop yield mean/std held as arrays, with precomputed clamp bounds"""
+
+    def __init__(self, means, stds):
+        self.crops = sorted(means)
+        self.index = {crop: i for i, crop in enumerate(self.crops)}
+        # Missing or undefined statistics (NaN/null in the file) use the defaults,
+        # so the clamp bounds are always finite
+        means = np.array([means[crop] for crop in self.crops] + [DEFAULT_CROP_MEAN], dtype=np.float64)
+        stds = np.array([stds.get(crop, DEFAULT_CROP_STD) for crop in self.crops] + [DEFAULT_CROP_STD],
+                        dtype=np.float64)
+        self.means = np.nan_to_num(means, nan=DEFAULT_CROP_MEAN, posinf=DEFAULT_CROP_MEAN, neginf=DEFAULT_CROP_MEAN)
+        self.stds = np.nan_to_num(stds, nan=DEFAULT_CROP_STD, posinf=DEFAULT_CROP_STD, neginf=DEFAULT_CROP_STD)
+
+        # Reasonable bounds based on crop statistics (mean ± 3 standard deviations)
+        self.min_yields = np.fmax(0.1, self.means - 3 * self.stds)
+        self.max_yields = self.means + 3 * self.stds
+
+    @classmethod
+    def from_file(cls, path):
+        """Load crop statistics from crop_stats.json"""
+        with open(path, 'r') as f:
+            crop_stats = json.load(f)
+        return cls(crop_stats['means'], crop_stats['stds'])
+
+    def lookup(self, crops):
+        """Map crop names to row positions; unknown crops use the default row"""
+        default = len(self.crops)
+        return np.array([self.index.get(crop, default) for crop in crops], dtype=np.intp)
+
+    def clamp(self, crops, yields):
+        """Clamp yields to each crop's bounds; returns (bounded, means, stds)"""
+        rows = self.lookup(crops)
+        bounded = np.maximum(self.min_yields[rows], np.minimum(self.max_yields[rows], yields))
+        return bounded, self.means[rows], self.stds[rows]
+
+
+class ModelBundle:
+    """Immutable set of model, scaler, encoder and crop statistics.
+
+    A bundle is loaded completely before it is published, so callers that
+    grab a reference once per request always see a consistent set of
+    artifacts even while a newer bundle is being swapped in.
+
+    With ``shards`` (a :class:`ShardCache`), records for crops that have
+    their own shard are scored by it and the rest by the global model.
+    With ``batch_estimator`` (an sklearn ``(estimator, scaler)`` pair),
+    batches of ESTIMATOR_MIN_ROWS or more records are scored by it.
+    """
+
+    def __init__(self, model, scaler, encoder, crop_stats, version, model_dir=None, engine=DEFAULT_ENGINE,
+                 shards=None, batch_estimator=None):
+        self.engine = get_engine(engine)
+        self.model = model
+        self.scaler = scaler
+        self.encoder = encoder
+        self.crop_stats = crop_stats
+        self.version = version
+        self.model_dir = model_dir
+        self.shards = shards
+        self.loaded_at = time.time()
+        self.batch_estimator = batch_estimator
+
+    @property
+    def feature_columns(self):
+        return self.encoder.feature_columns
+
+    @property
+    def categorical_values(self):
+        return self.encoder.categorical_values
+
+    @classmethod
+    def load(cls, model_dir, shard_cache_bytes=None, batch_estimator=False):
+        """Load every artifact in ``model_dir`` into a new bundle.
+
+        The engine recorded in model_info.json (random forest when absent)
+        decides how the model is loaded and how records are encoded. For the
+        random forest the flattened forest is preferred when it has been
+        exported. Its node arrays are memory-mapped, so pre-forked workers
+        share one copy through the page cache, and with the scaler folded
+        into its thresholds it needs no scaler at all.
+
+        With ``shard_cache_bytes`` the per-crop shards (if any were built)
+        are served from a cache holding at most that many bytes of trees.
+
+        With ``batch_estimator`` the pickled sklearn forest is loaded as well
+        and scores batches of ESTIMATOR_MIN_ROWS or more. It is faster on
+        large batches, but every process gets a private copy of its trees
+        (about as large as the pickle) and loading takes a few seconds.
+        """
+        version = artifact_version(model_dir)
+        engine = read_model_info(model_dir).get('engine', DEFAULT_ENGINE)
+        model, scaler = get_engine(engine).load(model_dir)
+        estimator = None
+        if batch_estimator and isinstance(model, FlatForest):
+            estimator = get_engine(engine).load_estimator(model_dir)
+        encoder = FeatureEncoder.from_files(
+            os.path.join(model_dir, CATEGORICAL_VALUES_FILENAME),
+            os.path.join(model_dir, FEATURES_FILENAME)
+        )
+        crop_stats = CropStats.from_file(os.path.join(model_dir, CROP_STATS_FILENAME))
+        shards = None
+        if shard_cache_bytes is not None:
+            shards = ShardCache.load(model_dir, shard_cache_bytes, encoder.n_features)
+        return cls(model, scaler, encoder, crop_stats, version, model_dir=model_dir, engine=engine, shards=shards,
+                   batch_estimator=estimator)
+
+    def predict(self, records, timer=NULL_TIMER):
+        """Predict raw yields (tonnes/hectare) for a list of input records"""
+        if self.shards is None:
+            return self._predict_global(records, timer)
+
+        yields = np.empty(len(records), dtype=np.float64)
+        rows_by_crop = {}
+        for i, record in enumerate(records):
+            rows_by_crop.setdefault(str(record['Crop']).strip(), []).append(i)
+        global_rows = []
+        for crop, rows in rows_by_crop.items():
+            with timer.stage('shard_load'):
+                shard = self.shards.get(crop)
+            if shard is None:
+                global_rows.extend(rows)
+                continue
+            # Shards are trained on the unscaled one-hot layout
+            with timer.stage('encode'):
+                features = self.encoder.encode_records([records[i] for i in rows])
+            with timer.stage('predict'):
+                yields[rows] = shard.predict(features)
+        if global_rows:
+            yields[global_rows] = self._predict_global([records[i] for i in global_rows], timer)
+        return yields
+
+    def _encode_base(self, record, names):
+        """Encoded ``record``, feature columns of ``names`` and the model/scaler that serve it"""
+        shard = self.shards.get(str(record['Crop']).strip()) if self.shards is not None else None
+        if shard is not None:
+            base, columns, model, scaler = self.encoder.encode_records([record]), self.encoder.numeric_index, shard, None
+        else:
+            base = self.engine.encode_records(self.encoder, [record])
+            columns, model, scaler = self.engine.numeric_index(self.encoder), self.model, self.scaler
+        return base, [columns[NUMERIC_FEATURES.index(name)] for name in names], model, scaler
+
+    def predict_variations(self, record, variations, timer=NULL_TIMER):
+        """Predict raw yields for copies of ``record`` with numeric inputs replaced.
+
+        ``variations`` maps numeric feature names to equal-length arrays. The
+        record is encoded once. A flattened forest resolves the splits on the
+        unchanged features once for the record; other models get the record
+        tiled with the varied columns written in place. Either way a whole
+        grid of inputs is scored in a single model call.
+        """
+        with timer.stage('encode'):
+            base, varied, model, scaler = self._encode_base(record, variations)
+            values = np.column_stack([np.asarray(column, dtype=np.float64) for column in variations.values()])
+        if scaler is None and hasattr(model, 'predict_variations'):
+            with timer.stage('predict'):
+                return model.predict_variations(base[0], varied, values)
+
+        with timer.stage('encode'):
+            features = np.repeat(base, len(values), axis=0)
+            features[:, varied] = values
+        if scaler is not None:
+            with timer.stage('scale'):
+                features = scaler.transform(features)
+        with timer.stage('predict'):
+            return model.predict(features)
+
+    def predict_grid(self, record, axes, timer=NULL_TIMER):
+        """Predict raw yields for ``record`` over every combination of ``axes``.
+
+        ``axes`` maps numeric feature names to 1-D arrays; the result has one
+        dimension per axis, in order. A flattened forest scores the grid
+        box by box (:meth:`FlatForest.predict_grid`); other models go
+        through :meth:`predict_variations` on the expanded grid.
+        """
+        shape = tuple(len(axis) for axis in axes.values())
+        with timer.stage('encode'):
+            base, varied, model, scaler = self._encode_base(record, axes)
+        if scaler is None and hasattr(model, 'predict_grid'):
+            with timer.stage('predict'):
+                return model.predict_grid(base[0], varied, list(axes.values()))
+
+        grids = np.meshgrid(*axes.values(), indexing='ij')
+        variations = {name: grid.ravel() for name, grid in zip(axes, grids)}
+        return self.predict_variations(record, variations, timer).reshape(shape)
+
+    def _predict_global(self, records, timer):
+        with timer.stage('encode'):
+            features = self.engine.encode_records(self.encoder, records)
+        model, scaler = self.model, self.scaler
+        if self.batch_estimator is not None and len(records) >= ESTIMATOR_MIN_ROWS:
+            model, scaler = self.batch_estimator
+        if scaler is not None:
+            with timer.stage('scale'):
+                features = scaler.transform(features)
+        with timer.stage('predict'):
+            return model.predict(features)
+
+    def predict_bounded(self, records, crops, timer=NULL_TIMER):
+        """Predict and clamp yields; returns (raw, bounded, crop means, crop stds)"""
+        raw_yields = self.predict(records, timer)
+        with timer.stage('crop_stats'):
+            bounded_yields, crop_means, crop_stds = self.crop_stats.clamp(crops, raw_yields)
+        return raw_yields, bounded_yields, crop_means, crop_stds
+
+    def describe(self):
+        """Summary of the bundle for status endpoints"""
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'engine': self.engine.name,
+            'estimator': type(self.model).__name__,
+            'scaler_folded': self.scaler is None,
+            'batch_estimator': type(self.batch_estimator[0]).__name__ if self.batch_estimator else None,
+            'n_features': self.encoder.n_features,
+            'n_crops': len(self.crop_stats.crops),
+            'shards': self.shards.stats() if self.shards is not None else None
+        }
+
+
+def read_model_info(model_dir):
+    """Engine and parameters recorded with the model, or {} for older artifacts"""
+    path = os.path.join(model_dir, MODEL_INFO_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def artifact_version(model_dir):
+    """Short fingerprint of the bundle artifacts on disk (name, size, mtime)"""
+    digest = hashlib.sha1()
+    # The shard directory is replaced as a whole, so its index marks every rebuild
+    shard_index = os.path.join(SHARDS_DIRNAME, SHARD_INDEX_FILENAME)
+    for filename in BUNDLE_FILENAMES + [MODEL_INFO_FILENAME, FOREST_FILENAME, shard_index]:
+        path = os.path.join(model_dir, filename)
+        if filename == FOREST_FILENAME:
+            # The forest directory is replaced as a whole; its metadata file
+            # changes with every export
+            path = os.path.join(path, FOREST_META_FILENAME)
+        if not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        digest.update(f"{filename}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
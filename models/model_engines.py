@@ -0,0 +1,130 @@
+"""Registry of model engines: how each regressor is encoded, fit, exported and served"""
+
+import os
+import numpy as np
+from models.feature_encoder import CATEGORICAL_FEATURES, NUMERIC_FEATURES, ORDINAL_FEATURES
+from models.forest_engine import FlatForest, FOREST_META_FILENAME
+
+MODEL_FILENAME = 'crop_yield_model.pkl'
+SCALER_FILENAME = 'scaler.pkl'
+# Directory of memory-mapped .npy node arrays written by FlatForest.save
+FOREST_FILENAME = 'crop_yield_forest'
+
+DEFAULT_ENGINE = 'random_forest'
+
+ENGINES = {}
+
+
+def register_engine(cls):
+    """Class decorator adding an engine to the registry under ``cls.name``"""
+    ENGINES[cls.name] = cls()
+    return cls
+
+
+def get_engine(name):
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown model engine: {name} (available: {', '.join(sorted(ENGINES))})")
+
+
+def _joblib_load(path):
+    # joblib (and sklearn) are only needed for pickled models, so they are
+    # imported on first use
+    import joblib
+    return joblib.load(path)
+
+
+@register_engine
+class RandomForestEngine:
+    """Random forest on one-hot features, served as a scaler-folded FlatForest"""
+
+    name = 'random_forest'
+    uses_scaler = True
+    # Artifacts written besides the pickled model, relative to the model directory
+    extra_artifacts = [SCALER_FILENAME, FOREST_FILENAME]
+
+    def feature_names(self, encoder):
+        return encoder.feature_columns
+
+    def encode_records(self, encoder, records):
+        return encoder.encode_records(records)
+
+    def encode_frame(self, encoder, frame):
+        return encoder.encode_frame(frame)
+
+    def numeric_index(self, encoder):
+        """Column of each NUMERIC_FEATURES entry in the encoded matrix"""
+        return encoder.numeric_index
+
+    def create(self, params):
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(**params)
+
+    def export(self, model, scaler, model_dir):
+        """Write the flattened forest with the scaler folded into its thresholds"""
+        FlatForest.from_sklearn(model).fold_scaler(scaler).save(os.path.join(model_dir, FOREST_FILENAME))
+
+    def load(self, model_dir):
+        """Return ``(model, scaler)``; the scaler is None when folded into the forest"""
+        forest_path = os.path.join(model_dir, FOREST_FILENAME)
+        if os.path.exists(os.path.join(forest_path, FOREST_META_FILENAME)):
+            model = FlatForest.load(forest_path)
+        else:
+            model = _joblib_load(os.path.join(model_dir, MODEL_FILENAME))
+        scaler = None
+        if not getattr(model, 'scaler_folded', False):
+            scaler = _joblib_load(os.path.join(model_dir, SCALER_FILENAME))
+        return model, scaler
+
+    def load_estimator(self, model_dir):
+        """The pickled sklearn ``(estimator, scaler)``, loaded into private memory"""
+        estimator = _joblib_load(os.path.join(model_dir, MODEL_FILENAME))
+        # Sum tree outputs in tree order, so predictions match the flattened forest exactly
+        estimator.set_params(n_jobs=1)
+        return estimator, _joblib_load(os.path.join(model_dir, SCALER_FILENAME))
+
+    def feature_importances(self, model, X, y):
+        return model.feature_importances_
+
+
+@register_engine
+class HistGradientBoostingEngine:
+    """Histogram gradient boosting with native categorical splits on Crop, Season and State.
+
+    Categories are passed as ordinal codes instead of 91 one-hot columns,
+    so the model sees 9 features. Trees bin their inputs, so no scaler is used.
+    """
+
+    name = 'hist_gradient_boosting'
+    uses_scaler = False
+    extra_artifacts = []
+
+    def feature_names(self, encoder):
+        return list(ORDINAL_FEATURES)
+
+    def encode_records(self, encoder, records):
+        return encoder.encode_ordinal_records(records)
+
+    def encode_frame(self, encoder, frame):
+        return encoder.encode_ordinal_frame(frame)
+
+    def numeric_index(self, encoder):
+        return np.arange(len(NUMERIC_FEATURES))
+
+    def create(self, params):
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        categorical = list(range(len(NUMERIC_FEATURES), len(NUMERIC_FEATURES) + len(CATEGORICAL_FEATURES)))
+        return HistGradientBoostingRegressor(categorical_features=categorical, **params)
+
+    def export(self, model, scaler, model_dir):
+        pass
+
+    def load(self, model_dir):
+        return _joblib_load(os.path.join(model_dir, MODEL_FILENAME)), None
+
+    def feature_importances(self, model, X, y):
+        """Permutation importance, since boosting exposes no impurity importances"""
+        from sklearn.inspection import permutation_importance
+        rows = np.random.default_rng(42).choice(len(X), size=min(len(X), 5000), replace=False)
+        return permutation_importance(model, X[rows], y[rows], n_repeats=3, random_state=42).importances_mean
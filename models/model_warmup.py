@@ -0,0 +1,147 @@
+"""Background model warm-up: build stale artifacts in a subprocess, then load them"""
+
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from models.model_bundle import artifact_version
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'train_model.py')
+TRAINING_LOCK_FILENAME = '.training.lock'
+
+# Warm-up states reported by /readyz
+STARTING = 'starting'
+TRAINING = 'training'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+MISSING = 'missing'
+
+
+class ModelNotReady(Exception):
+    """Raised when a prediction is requested before the model bundle is loaded"""
+
+
+class ModelWarmup:
+    """Brings the model bundle up on a background thread.
+
+    If the model artifact is missing and ``autotrain`` is set, ``train_model.py``
+    runs in a separate process so the web workers stay responsive. Once an
+    existing bundle is serving, the same incremental build runs again; it
+    only retrains when an input or parameter changed, and the bundle is
+    reloaded if any artifact was rebuilt. An exclusive lock in the model
+    directory makes sure only one of several workers builds, while the
+    others wait and then find nothing stale. ``load_fn`` loads and publishes
+    the bundle and returns True on success.
+    """
+
+    def __init__(self, model_path, load_fn, autotrain=True, train_command=None):
+        self.model_path = model_path
+        self.load_fn = load_fn
+        self.autotrain = autotrain
+        self.train_command = train_command or [sys.executable, TRAIN_SCRIPT]
+        self.state = STARTING
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start warming up on a daemon thread; returns immediately"""
+        if self._thread is None:
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name='model-warmup', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def wait(self, timeout=None):
+        """Block until the bundle is published; returns True when ready"""
+        return self._ready.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def mark_ready(self):
+        """Record that a bundle was published outside the warm-up thread"""
+        self.state = READY
+        self.error = None
+        self._ready.set()
+
+    def status(self):
+        """Warm-up state for the readiness endpoint"""
+        status = {'state': self.state}
+        if self.error:
+            status['error'] = self.error
+        if self.started_at is not None:
+            end = self.finished_at or time.time()
+            status['elapsed_seconds'] = round(end - self.started_at, 3)
+        return status
+
+    def _run(self):
+        try:
+            if not os.path.exists(self.model_path):
+                if not self.autotrain:
+                    self._finish(MISSING, f"Model not found at {self.model_path} and training is disabled")
+                    return
+                self.state = TRAINING
+                self._build()
+                if not os.path.exists(self.model_path):
+                    raise RuntimeError(f"Training did not produce {self.model_path}")
+            self.state = LOADING
+            if not self.load_fn():
+                self._finish(FAILED, "Failed to load model bundle")
+                return
+            self.mark_ready()
+            self.finished_at = time.time()
+        except Exception as e:
+            logger.error(f"Error warming up model: {str(e)}")
+            self._finish(FAILED, str(e))
+            return
+
+        if self.autotrain:
+            self._refresh()
+
+    def _refresh(self):
+        """Rebuild stale artifacts behind the serving bundle and reload if anything changed"""
+        try:
+            version = artifact_version(os.path.dirname(self.model_path))
+            self._build()
+            if artifact_version(os.path.dirname(self.model_path)) != version:
+                logger.info("Model artifacts were rebuilt; reloading the bundle")
+                self.load_fn()
+        except Exception as e:
+            logger.error(f"Error rebuilding stale model artifacts: {str(e)}")
+
+    def _build(self):
+        """Run the incremental artifact build; a no-op when nothing is stale"""
+        lock_path = os.path.join(os.path.dirname(self.model_path), TRAINING_LOCK_FILENAME)
+        with open(lock_path, 'w') as lock_file:
+            if fcntl is not None:
+                # Another worker may be building; wait for it instead of building
+                # twice, after which this build finds nothing stale
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                logger.info("Building stale model artifacts in a background process...")
+                completed = subprocess.run(self.train_command, cwd=os.path.dirname(TRAIN_SCRIPT))
+                if completed.returncode != 0:
+                    raise RuntimeError(f"Model training failed (exit code {completed.returncode})")
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _finish(self, state, error):
+        self.state = state
+        self.error = error
+        self.finished_at = time.time()
+        logger.error(f"Model warm-up {state}: {error}")
@@ -0,0 +1,203 @@
+"""Behaviour of the JSON API routes, served by small bundles with known responses.
+
+The warm-up is disabled, so no trained model is needed: each test publishes
+a bundle whose model is a plain function of the encoded features. Groups,
+crop lists and analogs come from the crop yield CSV in the repository.
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from models.model_warmup import ModelWarmup
+
+# Tests publish their own bundles; never load or train the real model
+ModelWarmup.start = lambda self: None
+
+import app  # noqa: E402
+from data.group_index import get_group_index  # noqa: E402
+from models.feature_encoder import FeatureEncoder, NUMERIC_FEATURES  # noqa: E402
+from models.model_bundle import CropStats, ModelBundle  # noqa: E402
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+FARM = {'state': 'Andhra Pradesh', 'season': 'Kharif', 'crop': 'Rice', 'area': 5,
+        'fertilizer': 40, 'pesticide': 0.5, 'rainfall': 1000}
+
+
+class FunctionModel:
+    """Model predicting ``fn(inputs)``, where ``inputs`` maps numeric feature names
+    (and ``Crop``, decoded from its one-hot columns) to columns"""
+
+    def __init__(self, encoder, fn):
+        self.encoder = encoder
+        self.fn = fn
+        self.calls = []
+
+    def predict(self, X):
+        inputs = {name: X[:, column] for name, column in zip(NUMERIC_FEATURES, self.encoder.numeric_index)}
+        inputs['Crop'] = np.full(len(X), None, dtype=object)
+        for crop, column in self.encoder.category_slots['Crop'].items():
+            inputs['Crop'][X[:, column] == 1] = crop
+        self.calls.append(inputs)
+        return np.asarray(self.fn(inputs), dtype=np.float64)
+
+
+def publish(fn, crop_means=None):
+    """Serve ``fn`` as the model; crops get wide clamp bounds unless ``crop_means`` says otherwise"""
+    encoder = FeatureEncoder.from_files(
+        os.path.join(MODEL_DIR, 'categorical_values.json'),
+        os.path.join(MODEL_DIR, 'feature_columns.json')
+    )
+    means = crop_means or {}
+    model = FunctionModel(encoder, fn)
+    crop_stats = CropStats(means, {crop: mean for crop, mean in means.items()})
+    app.model_bundle = ModelBundle(model, None, encoder, crop_stats, 'test')
+    app.model_warmup.mark_ready()
+    return model
+
+
+@pytest.fixture
+def client():
+    yield app.app.test_client()
+    app.model_bundle = None
+
+
+@pytest.mark.parametrize('best_multiplier', [0.75, 1.25])
+def test_model_optimum_follows_the_response(client, best_multiplier):
+    current_per_hectare = FARM['fertilizer'] / 0.4047
+    peak = current_per_hectare * best_multiplier
+
+    def response(inputs):
+        # Yield peaks at one fertilizer rate per hectare
+        rate = inputs['Fertilizer'] / inputs['Area']
+        return 5.0 - ((rate - peak) / peak) ** 2
+
+    model = publish(response, crop_means={'Rice': 5.0})
+    result = client.post('/api/optimize', json=dict(FARM, mode='model')).get_json()['model_optimization']
+
+    assert result['best']['fertilizer'] == pytest.approx(FARM['fertilizer'] * best_multiplier, abs=0.01)
+    assert result['best']['yield_gain_pct'] > 0
+    # Scored at the group's historical area, with the farm's rates as totals over it
+    group = get_group_index().lookup(FARM['state'], FARM['season'], FARM['crop'])
+    assert np.allclose(model.calls[-1]['Area'], group.mean('Area'))
+    surface = np.array(result['surface']['yield_per_acre'])
+    assert surface.max() > surface.min()
+
+
+@pytest.mark.parametrize('low, high, steps', [(1997.2, 2003.5, 50), (1997, 2003, 3), (1990.5, 2020.5, 7), (2000, 2000, 2)])
+def test_year_sweep_stays_within_range(client, low, high, steps):
+    publish(lambda inputs: inputs['Crop_Year'] - 1990, crop_means={'Rice': 10.0})
+    sweep = [{'variable': 'year', 'min': low, 'max': high, 'steps': steps}]
+    result = client.post('/api/predict/sensitivity', json=dict(FARM, sweep=sweep)).get_json()
+
+    years = np.array(result['variables'][0]['values'])
+    assert np.array_equal(years, np.round(years))
+    assert low <= years.min() and years.max() <= high
+    assert years.min() == np.ceil(low) and years.max() == np.floor(high)
+    assert len(years) == min(steps, np.floor(high) - np.ceil(low) + 1)
+    assert np.all(np.diff(years) > 0)
+
+
+def test_year_sweep_without_whole_years_is_an_error(client):
+    publish(lambda inputs: inputs['Crop_Year'] - 1990, crop_means={'Rice': 10.0})
+    sweep = [{'variable': 'year', 'min': 2003.2, 'max': 2003.8}]
+    result = client.post('/api/predict/sensitivity', json=dict(FARM, sweep=sweep)).get_json()
+
+    assert not result['success']
+
+
+def test_batch_reports_invalid_rows_individually(client):
+    model = publish(lambda inputs: inputs['Fertilizer'] / 10, crop_means={'Rice': 10.0})
+    missing_state = {key: value for key, value in FARM.items() if key != 'state'}
+    items = [dict(FARM, fertilizer=10), missing_state, 'not a farm', dict(FARM, fertilizer=30, area=2),
+             dict(FARM, year='last year')]
+    result = client.post('/api/predict/batch', json=items).get_json()
+
+    assert result['success']
+    assert (result['count'], result['failed']) == (5, 3)
+    assert [row['index'] for row in result['results']] == list(range(5))
+    assert [row['success'] for row in result['results']] == [True, False, False, True, False]
+    assert all(row['error'] for row in result['results'] if not row['success'])
+    # The valid rows keep their own inputs and are scored in one model call
+    first, second = result['results'][0], result['results'][3]
+    assert first['predicted_yield'] == pytest.approx(1.0 / app.ACRES_PER_HECTARE, abs=0.01)
+    assert second['predicted_yield'] == pytest.approx(3.0 / app.ACRES_PER_HECTARE, abs=0.01)
+    assert second['total_yield'] == pytest.approx(3.0 / app.ACRES_PER_HECTARE * 2, abs=0.01)
+    assert len(model.calls) == 1 and len(model.calls[0]['Fertilizer']) == 2
+
+
+def test_crop_list_revalidates_with_etag(client):
+    query = {'state': FARM['state'], 'season': FARM['season']}
+    first = client.get('/get_crops', query_string=query)
+    etag = first.headers['ETag']
+
+    data = get_group_index().frame
+    grown = data[(data['State'] == FARM['state']) & (data['Season'] == FARM['season'])]
+    assert first.status_code == 200
+    assert first.get_json() == sorted(grown['Crop'].astype(str).unique())
+
+    cached = client.get('/get_crops', query_string=query, headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    stale = client.get('/get_crops', query_string=query, headers={'If-None-Match': '"stale"'})
+    assert stale.status_code == 200 and stale.headers['ETag'] == etag
+
+    other = client.get('/get_crops', query_string=dict(query, season='Rabi'))
+    assert other.headers['ETag'] != etag
+    unknown = client.get('/get_crops', query_string=dict(query, state='Atlantis'))
+    assert unknown.get_json() == []
+
+
+def test_recommendations_rank_on_stable_relative_yield(client):
+    data = get_group_index().frame
+    grown = data[(data['State'] == FARM['state']) & (data['Season'] == FARM['season'])]
+    history = grown.groupby(grown['Crop'].astype(str))['Yield'].agg(['mean', 'std'])
+    # Each crop is predicted at a multiple of its historical yield; repeated
+    # multiples make crops tie on relative yield
+    factors = {crop: 0.5 + 0.25 * (i % 5) for i, crop in enumerate(history.index)}
+    publish(lambda inputs: [factors[crop] * history.loc[crop, 'mean'] for crop in inputs['Crop']],
+            crop_means={crop: 1e9 for crop in history.index})
+
+    payload = {key: FARM[key] for key in ('state', 'season', 'area', 'fertilizer', 'pesticide', 'rainfall')}
+    result = client.post('/api/recommend', json=payload).get_json()
+
+    # Crops that never yielded have no relative yield
+    relative = {crop: factors[crop] if history.loc[crop, 'mean'] > 0 else 0.0 for crop in history.index}
+    stability = np.clip(1 - history['std'] / history['mean'], 0, 1).fillna(0)
+    score = {crop: relative[crop] * stability[crop] for crop in history.index}
+    expected = sorted(history.index, key=lambda crop: (-score[crop], -relative[crop]))
+    ranked = result['recommendations']
+    assert [row['crop'] for row in ranked] == expected
+    assert [row['rank'] for row in ranked] == list(range(1, len(expected) + 1))
+    assert all(row['relative_yield'] == pytest.approx(relative[row['crop']], abs=1e-3) for row in ranked)
+    # Crops seen in a single season have no stability and rank last
+    single = [row['crop'] for row in ranked if row['seasons_recorded'] == 1]
+    assert single and all(row['score'] == 0 for row in ranked[-len(single):])
+
+    top = client.post('/api/recommend', json=dict(payload, limit=3)).get_json()['recommendations']
+    assert [row['crop'] for row in top] == expected[:3]
+
+
+def test_optimize_batch_streams_one_line_per_farm(client):
+    wheat = dict(FARM, crop='Wheat', season='Rabi', fertilizer=60)
+    missing_area = {key: value for key, value in FARM.items() if key != 'area'}
+    farms = [FARM, dict(FARM, crop='Dragonfruit'), 'not a farm', wheat, missing_area, dict(FARM, area=12)]
+    response = client.post('/api/optimize/batch', json=farms)
+
+    assert response.mimetype == 'application/x-ndjson'
+    text = response.get_data(as_text=True)
+    assert text.endswith('\n')
+    lines = [json.loads(line) for line in text.splitlines()]
+    by_index = {line['index']: line for line in lines}
+    assert len(lines) == len(farms) and sorted(by_index) == list(range(len(farms)))
+    assert [by_index[index]['success'] for index in range(len(farms))] == [True, False, False, True, False, True]
+    assert 'Dragonfruit' in by_index[1]['error']
+    assert all(line['error'] for line in lines if not line['success'])
+    # Each farm's line matches what /api/optimize answers for it alone
+    for index in (0, 3, 5):
+        single = client.post('/api/optimize', json=farms[index]).get_json()
+        assert by_index[index]['recommendations'] == single['recommendations']
+        assert by_index[index]['input_parameters'] == single['input_parameters']
@@ -0,0 +1,68 @@
+"""Replacing an artifact directory must never leave its path missing or partial"""
+
+import os
+
+import numpy as np
+import pytest
+
+import atomic_dir
+from atomic_dir import write_directory
+
+
+def write_values(value):
+    def write(tmp_dir):
+        np.save(os.path.join(tmp_dir, 'values.npy'), np.full(4, value))
+    return write
+
+
+def hidden_entries(tmp_path):
+    return sorted(name for name in os.listdir(tmp_path) if name.startswith('.'))
+
+
+def test_replace_swaps_a_symlink(tmp_path, monkeypatch):
+    path = str(tmp_path / 'forest')
+    write_directory(path, write_values(1))
+    mapped = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+
+    swaps = []
+    replace = os.replace
+
+    def checked_replace(src, dst):
+        # The old directory is still in place right up to the swap
+        swaps.append(np.load(os.path.join(dst, 'values.npy'))[0])
+        replace(src, dst)
+
+    monkeypatch.setattr(atomic_dir.os, 'replace', checked_replace)
+    write_directory(path, write_values(2))
+
+    assert swaps == [1]
+    assert os.path.islink(path)
+    assert np.load(os.path.join(path, 'values.npy'))[0] == 2
+    # The previous version is gone, but mapped files stay readable
+    assert len(hidden_entries(tmp_path)) == 1
+    assert mapped[0] == 1
+
+
+def test_replace_migrates_a_plain_directory(tmp_path):
+    path = tmp_path / 'forest'
+    path.mkdir()
+    (path / 'stale.npy').write_bytes(b'')
+
+    write_directory(str(path), write_values(3))
+
+    assert os.path.islink(path)
+    assert os.listdir(path) == ['values.npy']
+    assert len(hidden_entries(tmp_path)) == 1
+
+
+def test_failed_write_keeps_the_current_directory(tmp_path):
+    path = str(tmp_path / 'forest')
+    write_directory(path, write_values(1))
+
+    def fail(tmp_dir):
+        raise RuntimeError('disk full')
+
+    with pytest.raises(RuntimeError):
+        write_directory(path, fail)
+    assert np.load(os.path.join(path, 'values.npy'))[0] == 1
+    assert len(hidden_entries(tmp_path)) == 1
@@ -0,0 +1,43 @@
+"""Crop shards are built only when enabled and held within their memory cap"""
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+import train_model
+from models.crop_shards import SHARDS_DIRNAME, ShardCache, save_shards, shard_dirname
+from models.forest_engine import FlatForest
+
+CROPS = ['Rice', 'Wheat', 'Maize']
+
+
+def make_forest(seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, 3))
+    model = RandomForestRegressor(n_estimators=4, max_depth=6, random_state=seed, n_jobs=1)
+    return FlatForest.from_sklearn(model.fit(X, X[:, 0] + rng.normal(size=200)))
+
+
+def test_cache_holds_shards_in_memory_within_cap(tmp_path):
+    forests = {crop: make_forest(seed) for seed, crop in enumerate(CROPS)}
+    index = {'n_features': 3, 'shards': {crop: {'path': shard_dirname(crop)} for crop in CROPS}}
+    save_shards(str(tmp_path / SHARDS_DIRNAME), forests, index)
+    cap = max(forest.nbytes for forest in forests.values()) * 2
+    cache = ShardCache.load(str(tmp_path), cap, n_features=3)
+
+    for crop in CROPS:
+        shard = cache.get(crop)
+        # Read into private memory, so the cap counts resident bytes
+        assert not isinstance(shard.threshold, np.memmap)
+        assert cache.stats()['loaded_bytes'] <= cap
+    stats = cache.stats()
+    assert stats['evictions'] >= 1
+    assert stats['loaded'][-1] == CROPS[-1]
+    assert cache.get('Cotton') is None
+
+
+def test_shards_target_only_when_enabled(monkeypatch):
+    monkeypatch.delenv('CROPSMART_SHARDS', raising=False)
+    assert 'crop_shards' not in train_model.artifact_build('random_forest').by_name
+
+    monkeypatch.setenv('CROPSMART_SHARDS', '1')
+    assert 'crop_shards' in train_model.artifact_build('random_forest').by_name
@@ -0,0 +1,52 @@
+"""The columnar dataset cache must keep exactly one usable cache per CSV"""
+
+import os
+
+import pandas as pd
+
+from data.dataset_cache import CACHE_DIRNAME, load_cached_csv
+
+
+def write_csv(path, rows):
+    pd.DataFrame({'Crop': ['Rice', 'Wheat'] * rows, 'Yield': range(2 * rows)}).to_csv(path, index=False)
+
+
+def clean(frame):
+    # Like the real cleaning: text columns are cached as categorical codes
+    return frame.astype({'Crop': 'category'})
+
+
+def cache_entries(tmp_path):
+    return sorted(os.listdir(tmp_path / CACHE_DIRNAME))
+
+
+def test_changed_csv_replaces_its_cache(tmp_path):
+    first, second = tmp_path / 'first.csv', tmp_path / 'second.csv'
+    write_csv(first, 2)
+    write_csv(second, 3)
+    load_cached_csv(str(first), clean)
+    load_cached_csv(str(second), clean)
+    before = set(cache_entries(tmp_path))
+
+    write_csv(first, 4)
+    frame = load_cached_csv(str(first), clean)
+    assert len(frame) == 8
+    entries = cache_entries(tmp_path)
+    assert len(entries) == 2
+    # The other CSV's cache survives
+    assert len(before & set(entries)) == 1
+
+    cached = load_cached_csv(str(first), lambda frame: clean(frame).head(0))
+    assert len(cached) == 8
+    assert cache_entries(tmp_path) == entries
+
+
+def test_new_cleaning_version_replaces_its_cache(tmp_path):
+    path = tmp_path / 'data.csv'
+    write_csv(path, 2)
+    load_cached_csv(str(path), clean, version=0)
+    (old,) = cache_entries(tmp_path)
+
+    load_cached_csv(str(path), clean, version=1)
+    (new,) = cache_entries(tmp_path)
+    assert new != old
@@ -0,0 +1,159 @@
+"""FlatForest must predict exactly what the sklearn forest it was exported from predicts.
+
+A small forest is fitted on synthetic data whose features span very
+different scales, like area and rainfall do in the crop dataset.
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+import models.forest_engine as forest_engine
+from models.forest_engine import FOREST_META_FILENAME, FlatForest, _fold_thresholds
+
+SCALES = np.array([1.0, 1e3, 1e6, 0.01])
+
+
+def make_data(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, len(SCALES))) * SCALES + np.array([2000.0, 0.0, 5e6, 1.0])
+    # Repeated values put grid points on the same side of a split as training rows
+    X[:, 0] = np.round(X[:, 0])
+    y = np.sin(X[:, 0]) + X[:, 1] / SCALES[1] + (X[:, 2] > 5e6) + rng.normal(scale=0.1, size=n_rows)
+    return X, y
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    X, y = make_data(400, seed=0)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestRegressor(n_estimators=8, max_depth=8, random_state=0, n_jobs=1)
+    model.fit(scaler.transform(X), y)
+    return model, scaler
+
+
+def test_matches_sklearn(fitted):
+    model, scaler = fitted
+    X = scaler.transform(make_data(300, seed=1)[0])
+    forest = FlatForest.from_sklearn(model)
+
+    assert np.array_equal(forest.predict(X), model.predict(X))
+    leaves = forest.apply(X) - forest.roots[:, None]
+    assert np.array_equal(leaves, model.apply(X).T)
+
+
+def test_apply_in_row_chunks(fitted, monkeypatch):
+    model, scaler = fitted
+    X = scaler.transform(make_data(300, seed=6)[0])
+    forest = FlatForest.from_sklearn(model)
+    expected = forest.apply(X)
+
+    monkeypatch.setattr(forest_engine, 'APPLY_CHUNK_ROWS', 7)
+    assert np.array_equal(forest.apply(X), expected)
+    assert forest.apply(X[:0]).shape == (forest.n_trees, 0)
+
+
+def test_folded_scaler_matches_scaled_input(fitted):
+    model, scaler = fitted
+    X = make_data(300, seed=2)[0]
+    folded = FlatForest.from_sklearn(model).fold_scaler(scaler)
+
+    assert folded.scaler_folded
+    assert np.array_equal(folded.predict(X), model.predict(scaler.transform(X)))
+
+
+def test_folded_thresholds_are_exact(fitted):
+    model, scaler = fitted
+    forest = FlatForest.from_sklearn(model)
+    folded = forest.fold_scaler(scaler)
+    splits = ~forest.is_leaf
+    mean = scaler.mean_[forest.feature[splits]]
+    scale = scaler.scale_[forest.feature[splits]]
+
+    def passes(x):
+        return ((x - mean) / scale).astype(np.float32) <= forest.threshold[splits]
+
+    # Each folded threshold is the last raw value still going left
+    assert passes(folded.threshold[splits]).all()
+    assert not passes(np.nextafter(folded.threshold[splits], np.inf)).any()
+
+
+def test_fold_thresholds_rejects_non_finite_scaler():
+    with pytest.raises(ValueError):
+        _fold_thresholds(np.array([0.5, 1.0]), np.array([0.0, np.nan]), np.array([1.0, 1.0]))
+
+
+@pytest.mark.parametrize('folded', [False, True])
+def test_predict_variations_matches_predict(fitted, folded):
+    model, scaler = fitted
+    forest = FlatForest.from_sklearn(model)
+    X = make_data(50, seed=3)[0]
+    if folded:
+        forest = forest.fold_scaler(scaler)
+    else:
+        X = scaler.transform(X)
+    row, columns = X[0], [0, 2]
+
+    expanded = np.repeat(row[None, :], len(X), axis=0)
+    expanded[:, columns] = X[:, columns]
+    assert np.array_equal(forest.predict_variations(row, columns, X[:, columns]), forest.predict(expanded))
+
+
+@pytest.mark.parametrize('folded', [False, True])
+def test_predict_grid_matches_predict(fitted, folded):
+    model, scaler = fitted
+    forest = FlatForest.from_sklearn(model)
+    X = make_data(40, seed=4)[0]
+    if folded:
+        forest = forest.fold_scaler(scaler)
+    else:
+        X = scaler.transform(X)
+    row, columns = X[0], [0, 1]
+    # Unsorted axes with repeated values
+    axes = [X[:15, 0], np.concatenate([X[15:25, 1], X[15:18, 1]])]
+
+    grid = forest.predict_grid(row, columns, axes)
+
+    first, second = np.meshgrid(*axes, indexing='ij')
+    expanded = np.repeat(row[None, :], first.size, axis=0)
+    expanded[:, 0] = first.ravel()
+    expanded[:, 1] = second.ravel()
+    assert grid.shape == (len(axes[0]), len(axes[1]))
+    assert np.allclose(grid, forest.predict(expanded).reshape(grid.shape), rtol=0, atol=1e-12)
+
+
+def test_save_and_load_round_trip(fitted, tmp_path):
+    model, scaler = fitted
+    forest = FlatForest.from_sklearn(model).fold_scaler(scaler)
+    X = make_data(100, seed=5)[0]
+    path = str(tmp_path / 'forest')
+
+    forest.save(path)
+    loaded = FlatForest.load(path)
+
+    assert loaded.scaler_folded
+    assert np.array_equal(loaded.predict(X), forest.predict(X))
+
+
+def test_load_format_1(fitted, tmp_path):
+    model, scaler = fitted
+    forest = FlatForest.from_sklearn(model).fold_scaler(scaler)
+    X = make_data(100, seed=7)[0]
+    path = str(tmp_path / 'forest')
+    forest.save(path)
+
+    # Format 1 stored left.npy and right.npy and had no format key
+    np.save(os.path.join(path, 'left.npy'), forest.left)
+    np.save(os.path.join(path, 'right.npy'), forest.right)
+    os.remove(os.path.join(path, 'children.npy'))
+    with open(os.path.join(path, FOREST_META_FILENAME)) as f:
+        meta = json.load(f)
+    del meta['format']
+    with open(os.path.join(path, FOREST_META_FILENAME), 'w') as f:
+        json.dump(meta, f)
+
+    assert np.array_equal(FlatForest.load(path).predict(X), forest.predict(X))
@@ -0,0 +1,53 @@
+"""GroupIndex aggregates must match a pandas groupby over the same rows"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.group_index import AGGREGATE_COLUMNS, GROUP_KEYS, GroupIndex
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(0)
+    n_rows = 500
+    frame = pd.DataFrame({
+        'State': rng.choice(['Assam', 'Bihar', 'Kerala'], n_rows),
+        'Season': rng.choice(['Kharif', 'Rabi', 'Whole Year'], n_rows),
+        'Crop': rng.choice(['Rice', 'Wheat', 'Maize', 'Jute'], n_rows),
+        'Yield': rng.gamma(2.0, 2.0, n_rows),
+        'Area': rng.uniform(10, 1e5, n_rows),
+        'Annual_Rainfall': rng.normal(1500, 400, n_rows),
+    })
+    frame['Fertilizer'] = frame['Area'] * rng.uniform(50, 200, n_rows)
+    frame['Pesticide'] = frame['Area'] * rng.uniform(0.1, 0.5, n_rows)
+    # A group with a single row has no standard deviation
+    frame.loc[len(frame)] = ['Goa', 'Rabi', 'Rice', 1.0, 20.0, 3000.0, 2000.0, 5.0]
+    # Categories listed out of order, as the cleaned dataset may have them
+    return frame.astype({col: pd.CategoricalDtype(sorted(frame[col].unique(), reverse=True)) for col in GROUP_KEYS})
+
+
+def test_aggregates_match_groupby(frame):
+    index = GroupIndex(frame)
+    expected = frame.assign(
+        fertilizer_ratio=frame['Fertilizer'] / frame['Area'],
+        pesticide_ratio=frame['Pesticide'] / frame['Area'],
+    ).groupby(GROUP_KEYS, observed=True)[AGGREGATE_COLUMNS]
+    means, stds, counts = expected.mean(), expected.std(), expected.size()
+
+    assert len(index) == len(counts)
+    for key, count in counts.items():
+        group = index.lookup(*key)
+        assert group.count == count
+        assert len(group.rows()) == count
+        for col in AGGREGATE_COLUMNS:
+            assert np.array_equal(np.sort(group.values(col)), np.sort(expected.get_group(key)[col].to_numpy()))
+            assert group.mean(col) == pytest.approx(means.loc[key, col], rel=1e-12)
+            if count > 1:
+                assert group.std(col) == pytest.approx(stds.loc[key, col], rel=1e-9)
+            else:
+                assert np.isnan(group.std(col))
+
+    assert index.lookup(' Goa ', 'Rabi', 'Rice').count == 1
+    assert index.lookup('Goa', 'Kharif', 'Rice') is None
+
@@ -0,0 +1,59 @@
+"""Incremental crop statistics must equal a recompute over all rows"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.incremental_update import merge_crop_stats
+
+
+def pandas_stats(frame):
+    grouped = frame.groupby('Crop')['Yield']
+    return {
+        'means': grouped.mean().to_dict(),
+        'stds': grouped.std().to_dict(),
+        'counts': {crop: int(count) for crop, count in grouped.count().items()},
+    }
+
+
+def make_rows(seed):
+    rng = np.random.default_rng(seed)
+    crops = ['Rice'] * 40 + ['Wheat'] * 25 + ['Maize'] * 3 + ['Jute']
+    return pd.DataFrame({
+        'Crop': crops,
+        'Yield': rng.lognormal(mean=1.0, sigma=1.5, size=len(crops)),
+    }).sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+
+def assert_stats_equal(merged, expected):
+    assert merged['counts'] == expected['counts']
+    for crop in expected['counts']:
+        assert merged['means'][crop] == pytest.approx(expected['means'][crop], rel=1e-12)
+        if math.isnan(expected['stds'][crop]):
+            assert math.isnan(merged['stds'][crop])
+        else:
+            assert merged['stds'][crop] == pytest.approx(expected['stds'][crop], rel=1e-9)
+
+
+@pytest.mark.parametrize('split', [1, 10, 35, 68])
+def test_split_then_merge_matches_recompute(split):
+    rows = make_rows(seed=split)
+    merged = merge_crop_stats(pandas_stats(rows.iloc[:split]), rows.iloc[split:])
+    assert_stats_equal(merged, pandas_stats(rows))
+
+
+def test_merge_in_several_batches():
+    rows = make_rows(seed=7)
+    stats = pandas_stats(rows.iloc[:20])
+    for start in range(20, len(rows), 9):
+        stats = merge_crop_stats(stats, rows.iloc[start:start + 9])
+    assert_stats_equal(stats, pandas_stats(rows))
+
+
+def test_merge_new_crop():
+    old = make_rows(seed=3)
+    new = pd.DataFrame({'Crop': ['Dragonfruit', 'Dragonfruit', 'Rice'], 'Yield': [1.5, 2.5, 3.0]})
+    merged = merge_crop_stats(pandas_stats(old), new)
+    assert_stats_equal(merged, pandas_stats(pd.concat([old, new])))
@@ -0,0 +1,45 @@
+"""MicroBatcher must hand every caller its own result and coalesce queued items"""
+
+import threading
+
+import pytest
+
+from models.micro_batcher import MicroBatcher
+
+
+def test_results_follow_their_items_and_batches_coalesce():
+    entered, release = threading.Event(), threading.Event()
+
+    def predict_fn(items):
+        entered.set()
+        # Hold the first batch so the rest queue up behind it
+        release.wait(timeout=5)
+        return [(item, len(items)) for item in items]
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, max_wait_ms=50)
+    try:
+        futures = [batcher.submit(0)]
+        assert entered.wait(timeout=5)
+        futures += [batcher.submit(item) for item in range(1, 10)]
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.close()
+
+    assert [item for item, _ in results] == list(range(10))
+    assert [size for _, size in results] == [1, 4, 4, 4, 4, 4, 4, 4, 4, 1]
+    stats = batcher.stats()
+    assert (stats['batches'], stats['items']) == (4, 10)
+    assert stats['batch_size_counts'] == {1: 2, 4: 2}
+    assert stats['mean_fill_ratio'] == pytest.approx(10 / 16)
+
+
+def test_failed_batch_fails_each_of_its_callers():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=4, max_wait_ms=50)
+    try:
+        futures = [batcher.submit(item) for item in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
@@ -1,5 +1,3 @@
-import requests
-
 # Sample input data for prediction
 sample_data = {
     'area': 100,
@@ -13,11 +11,14 @@ sample_data = {
     'season': 'Kharif'
 }
 
-# URL of the prediction endpoint
-url = 'http://localhost:5000/api/predict'
+if __name__ == '__main__':
+    import requests
+
+    # URL of the prediction endpoint
+    url = 'http://localhost:5000/api/predict'
 
-# Make the POST request to the prediction endpoint
-response = requests.post(url, json=sample_data)
+    # Make the POST request to the prediction endpoint
+    response = requests.post(url, json=sample_data)
 
-# Print the response from the server
-print(response.json())
+    # Print the response from the server
+    print(response.json())
@@ -0,0 +1,80 @@
+"""Startup budget checks for app.py: import cost and time to first response.
+
+Each check runs in a fresh interpreter so nothing is already imported. The
+budgets are generous wall-clock limits meant to catch regressions such as a
+heavy module or a dataset load sneaking back into the import path; they can
+be raised on slow machines through the environment.
+"""
+
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get('CROPSMART_IMPORT_BUDGET', '2.0'))
+FIRST_RESPONSE_BUDGET_SECONDS = float(os.environ.get('CROPSMART_FIRST_RESPONSE_BUDGET', '3.0'))
+
+# Modules that importing app.py must not pull in; they load on first use
+LAZY_MODULES = ['sklearn', 'scipy', 'joblib', 'torch', 'torchvision', 'train_model', 'data.disease_analysis']
+
+# Import app without starting the background model warm-up, so only the
+# import path itself is measured
+IMPORT_APP = (
+    "from models.model_warmup import ModelWarmup\n"
+    "ModelWarmup.start = lambda self: None\n"
+    "import app\n"
+)
+
+
+def run_python(code, *options):
+    env = dict(os.environ, CROPSMART_AUTOTRAIN='0')
+    return subprocess.run(
+        [sys.executable, *options, '-c', code],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def parse_importtime(stderr):
+    """Map module name -> cumulative import time in seconds from ``-X importtime`` output"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_import_time():
+    times = parse_importtime(run_python(IMPORT_APP, '-X', 'importtime').stderr)
+    assert 'app' in times
+
+    eager = [module for module in LAZY_MODULES if module in times]
+    assert not eager, f"Importing app imports {eager} eagerly"
+
+    assert times['app'] < IMPORT_BUDGET_SECONDS, (
+        f"Importing app took {times['app']:.3f}s (budget {IMPORT_BUDGET_SECONDS}s)"
+    )
+
+
+def test_time_to_first_response():
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        "import app\n"
+        "client = app.app.test_client()\n"
+        "assert client.get('/healthz').status_code == 200\n"
+        "healthz = time.perf_counter() - start\n"
+        "assert client.get('/get_crops?state=Karnataka&season=Kharif').status_code == 200\n"
+        "print(healthz, time.perf_counter() - start)\n"
+    )
+    healthz, first_data = map(float, run_python(code).stdout.split()[-2:])
+
+    assert healthz < FIRST_RESPONSE_BUDGET_SECONDS, (
+        f"First /healthz response after {healthz:.3f}s (budget {FIRST_RESPONSE_BUDGET_SECONDS}s)"
+    )
+    assert first_data < FIRST_RESPONSE_BUDGET_SECONDS, (
+        f"First /get_crops response after {first_data:.3f}s (budget {FIRST_RESPONSE_BUDGET_SECONDS}s)"
+    )
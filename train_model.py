@@ -1,224 +1,607 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.preprocessing import StandardScaler
+import argparse
+import functools
 import joblib
 import logging
 import os
 import json
-from flask import request, Flask
+import tempfile
+from models.incremental_update import (append_trees, extend_categorical_values, extend_scaler, merge_crop_stats,
+                                       remap_forest_features)
+from models.distributed_training import TREES_PER_JOB, train_distributed
+from models.crop_shards import SHARDS_DIRNAME, save_shards, shard_dirname, shards_enabled
+from models.forest_engine import FlatForest
+from models.artifact_build import ArtifactBuild, BuildTarget, MANIFEST_FILENAME
+from models.feature_encoder import FeatureEncoder, build_feature_columns
+from models.model_bundle import DEFAULT_CROP_STD, MODEL_INFO_FILENAME, read_model_info
+from models.model_engines import DEFAULT_ENGINE, ENGINES, FOREST_FILENAME, MODEL_FILENAME, SCALER_FILENAME, get_engine
+from models.hyperparameter_search import SEARCH_SPACE, grid_trials, prepare_search_data, run_search
+from data.dataset_store import CLEANING_VERSION, clean_crop_dataset, dataset_store, get_dataset
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-
-def train_model():
-    try:
-        # Update the path to the crop yield data
-        crop_yield_data_path = 'data/crop_yield.csv'
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(ROOT_DIR, 'models')
+
+# String columns are already stripped by the dataset store
+CATEGORICAL_COLUMNS = ['Crop', 'Season', 'State']
+
+# Random forest with adjusted parameters
+FOREST_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': None,
+    'min_samples_split': 2,
+    'min_samples_leaf': 1,
+    'random_state': 42,
+    'n_jobs': -1
+}
+
+# Histogram gradient boosting with native categorical splits
+HIST_GRADIENT_BOOSTING_PARAMS = {
+    'max_iter': 500,
+    'max_leaf_nodes': 31,
+    'learning_rate': 0.1,
+    'early_stopping': False,
+    'random_state': 42
+}
+
+# Hyperparameters for each registered model engine (see models/model_engines.py)
+ENGINE_PARAMS = {
+    'random_forest': FOREST_PARAMS,
+    'hist_gradient_boosting': HIST_GRADIENT_BOOSTING_PARAMS
+}
+
+# Compact per-crop forests (see models/crop_shards.py), built only when
+# CROPSMART_SHARDS=1 since they are only served then. A crop gets a shard
+# only with enough training rows and when the shard beats the global model
+# on that crop's test rows; every other crop is served by the global model.
+SHARD_PARAMS = {
+    'n_estimators': 50,
+    'min_samples_leaf': 2,
+    'random_state': 42,
+    'n_jobs': -1
+}
+SHARD_MIN_ROWS = 100
+
+# Incremental updates add this many trees, fit on the new rows plus the
+# training rows of the most recent crop years already in the dataset
+UPDATE_TREES = 20
+UPDATE_RECENT_YEARS = 5
+
+TEST_SIZE = 0.2
+SPLIT_RANDOM_STATE = 42
+
+CATEGORICAL_VALUES_PATH = os.path.join(MODELS_DIR, 'categorical_values.json')
+FEATURE_COLUMNS_PATH = os.path.join(MODELS_DIR, 'feature_columns.json')
+CROP_STATS_PATH = os.path.join(MODELS_DIR, 'crop_stats.json')
+SCALER_PATH = os.path.join(MODELS_DIR, SCALER_FILENAME)
+MODEL_PATH = os.path.join(MODELS_DIR, MODEL_FILENAME)
+MODEL_INFO_PATH = os.path.join(MODELS_DIR, MODEL_INFO_FILENAME)
+MODEL_FEATURES_PATH = os.path.join(ROOT_DIR, 'model_features.txt')
+FEATURE_IMPORTANCE_PATH = os.path.join(ROOT_DIR, 'feature_importance.csv')
+TUNING_REPORT_PATH = os.path.join(MODELS_DIR, 'tuning_report.csv')
+CROP_SHARDS_PATH = os.path.join(MODELS_DIR, SHARDS_DIRNAME)
+FOREST_PATH = os.path.join(MODELS_DIR, FOREST_FILENAME)
+
+
+def load_training_data(context):
+    """Cleaned dataset without missing values, loaded once per build"""
+    if 'data' not in context:
+        crop_yield_data_path = dataset_store.path
         logger.info(f"Loading data from {crop_yield_data_path}")
-        
+
         if not os.path.exists(crop_yield_data_path):
             raise FileNotFoundError(f"Data file not found at {crop_yield_data_path}")
-        
-        data = pd.read_csv(crop_yield_data_path)
-        logger.info(f"Loaded dataset with shape: {data.shape}")
 
-        # Analyze data to identify trends
-        average_yield = data.groupby('Crop')['Yield'].mean().reset_index()
-        print('Average Yield per Crop:', average_yield)
+        data = get_dataset()
+        logger.info(f"Loaded dataset with shape: {data.shape}")
 
-        # Data preprocessing
-        logger.info("Starting data preprocessing")
-        
         # Drop any missing values
         if data.isnull().values.any():
             data = data.dropna()
             logger.info("Dropped missing values")
+        context['data'] = data
+    return context['data']
+
+
+def selected_engine(engine=None):
+    """Engine to build: the explicit choice, then CROPSMART_ENGINE, then the current model's engine"""
+    name = engine or os.environ.get('CROPSMART_ENGINE') or read_model_info(MODELS_DIR).get('engine', DEFAULT_ENGINE)
+    return get_engine(name)
+
+
+def distributed_workers(workers=None):
+    """Worker processes for distributed forest training: the explicit choice, then
+    CROPSMART_DISTRIBUTED_WORKERS; 0 trains in a single process"""
+    if workers is None:
+        workers = int(os.environ.get('CROPSMART_DISTRIBUTED_WORKERS', '0'))
+    return workers
+
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def build_categorical_values(context):
+    """Save the unique values of each categorical column"""
+    data = load_training_data(context)
+    categorical_values = {
+        col: sorted(data[col].unique().tolist())
+        for col in CATEGORICAL_COLUMNS
+    }
+    with open(CATEGORICAL_VALUES_PATH, 'w') as f:
+        json.dump(categorical_values, f)
+    context['categorical_values'] = categorical_values
+    logger.info("Saved categorical values")
+
+
+def build_feature_columns_artifacts(context):
+    """Save the one-hot feature layout shared with the prediction API"""
+    categorical_values = load_json(CATEGORICAL_VALUES_PATH)
+    feature_columns = build_feature_columns(categorical_values)
+    with open(FEATURE_COLUMNS_PATH, 'w') as f:
+        json.dump(feature_columns, f)
+    with open(MODEL_FEATURES_PATH, 'w') as f:
+        f.write('\n'.join(feature_columns))
+    context['feature_columns'] = feature_columns
+    logger.info("Saved feature columns")
+
+
+def build_crop_stats(context):
+    """Calculate and save crop statistics for denormalization"""
+    data = load_training_data(context)
+    crop_means = data.groupby('Crop')['Yield'].mean()
+    crop_stds = data.groupby('Crop')['Yield'].std()
+    # Row counts let incremental updates fold in new rows (see update_model)
+    crop_counts = data.groupby('Crop')['Yield'].count()
+    crop_stats = {
+        'means': crop_means.to_dict(),
+        'stds': crop_stds.to_dict(),
+        'counts': {crop: int(count) for crop, count in crop_counts.items()}
+    }
+    write_crop_stats(crop_stats)
+    logger.info("Saved crop statistics")
+
+
+def write_crop_stats(crop_stats):
+    """Save crop statistics; crops with fewer than two rows have no std and get DEFAULT_CROP_STD.
+
+    JSON has no NaN, so an undefined std would otherwise make the clamp bounds
+    (and every response for that crop) invalid. With a count below two the
+    running update treats the crop's spread as zero, so the placeholder never
+    enters a later merge.
+    """
+    counts = crop_stats['counts']
+    stds = {
+        crop: std if counts.get(crop, 0) > 1 and std is not None and np.isfinite(std) else DEFAULT_CROP_STD
+        for crop, std in crop_stats['stds'].items()
+    }
+    with open(CROP_STATS_PATH, 'w') as f:
+        json.dump(dict(crop_stats, stds=stds), f, allow_nan=False)
+
+
+def build_model(context, engine, workers=0):
+    """Fit the engine's model (and scaler, if it uses one), save it and export it for serving"""
+    data = load_training_data(context)
+
+    # Analyze data to identify trends
+    average_yield = data.groupby('Crop')['Yield'].mean().reset_index()
+    print('Average Yield per Crop:', average_yield)
+
+    # Build the encoder from the saved one-hot layout
+    encoder = FeatureEncoder(load_json(CATEGORICAL_VALUES_PATH), load_json(FEATURE_COLUMNS_PATH))
+
+    # Split features and target
+    logger.info("Starting data preprocessing")
+    X = engine.encode_frame(encoder, data)
+    y = data['Yield'].to_numpy()
+
+    # Create and fit the scaler
+    scaler = None
+    X_scaled = X
+    if engine.uses_scaler:
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
 
-        # Strip whitespace from string columns
-        categorical_columns = ['Crop', 'Season', 'State']
-        for col in categorical_columns:
-            data[col] = data[col].str.strip()
-        logger.info("Cleaned string columns")
-
-        # Save unique values for each categorical column
-        categorical_values = {
-            col: sorted(data[col].unique().tolist())
-            for col in categorical_columns
+    # Split data
+    X_train, X_test, y_train, y_test = train_test_split(
+        X_scaled, y, test_size=TEST_SIZE, random_state=SPLIT_RANDOM_STATE
+    )
+    logger.info("Split data into training and test sets")
+
+    # Check for negative yield stability
+    yield_stability = np.std(y) / np.mean(y)
+    if yield_stability < 0:
+        raise ValueError("Yield stability cannot be negative.")
+
+    params = ENGINE_PARAMS[engine.name]
+    if workers and engine.name == 'random_forest':
+        # Tree jobs read one shared copy of the training matrix from disk
+        with tempfile.TemporaryDirectory(prefix='.distributed-', dir=MODELS_DIR) as work_dir:
+            model = train_distributed(X_train, y_train, params, work_dir, max_workers=workers)
+    else:
+        model = engine.create(params)
+        logger.info(f"Training {engine.name} model")
+        model.fit(X_train, y_train)
+    logger.info("Model training completed")
+
+    # Save model and scaler, then the engine's serving export
+    joblib.dump(model, MODEL_PATH)
+    if scaler is not None:
+        joblib.dump(scaler, SCALER_PATH)
+    engine.export(model, scaler, MODELS_DIR)
+    logger.info(f"Exported {engine.name} model for serving")
+
+    # Evaluate model
+    train_predictions = model.predict(X_train)
+    test_predictions = model.predict(X_test)
+
+    train_mse = mean_squared_error(y_train, train_predictions)
+    test_mse = mean_squared_error(y_test, test_predictions)
+    train_r2 = r2_score(y_train, train_predictions)
+    test_r2 = r2_score(y_test, test_predictions)
+
+    logger.info(f"Train MSE: {train_mse:.4f}, R2: {train_r2:.4f}")
+    logger.info(f"Test MSE: {test_mse:.4f}, R2: {test_r2:.4f}")
+
+    metrics = {
+        'train_mse': train_mse,
+        'test_mse': test_mse,
+        'train_r2': train_r2,
+        'test_r2': test_r2
+    }
+    # Record the engine so the serving bundle loads and encodes accordingly
+    with open(MODEL_INFO_PATH, 'w') as f:
+        json.dump({'engine': engine.name, 'params': params, 'metrics': metrics}, f, indent=2)
+
+    context.update({
+        'model': model,
+        'scaler': scaler,
+        'encoder': encoder,
+        'metrics': metrics
+    })
+
+
+def build_feature_importance(context, engine):
+    """Save the model's feature importances, most important first"""
+    model = context.get('model')
+    if model is None:
+        model = joblib.load(MODEL_PATH)
+    data = load_training_data(context)
+    encoder = FeatureEncoder(load_json(CATEGORICAL_VALUES_PATH), load_json(FEATURE_COLUMNS_PATH))
+    importance = pd.DataFrame({
+        'feature': engine.feature_names(encoder),
+        'importance': engine.feature_importances(model, engine.encode_frame(encoder, data), data['Yield'].to_numpy())
+    }).sort_values('importance', ascending=False)
+    importance.to_csv(FEATURE_IMPORTANCE_PATH, index=False)
+    logger.info("Saved feature importance")
+
+
+def rmse(y_true, y_pred):
+    return float(np.sqrt(mean_squared_error(y_true, y_pred)))
+
+
+def build_crop_shards(context, engine):
+    """Train a compact forest per crop and keep those that beat the global model"""
+    data = load_training_data(context)
+    encoder = FeatureEncoder(load_json(CATEGORICAL_VALUES_PATH), load_json(FEATURE_COLUMNS_PATH))
+    # Shards read the unscaled one-hot layout; trees don't need scaling
+    X = encoder.encode_frame(data)
+    y = data['Yield'].to_numpy()
+    crops = data['Crop'].to_numpy()
+
+    # Same partition as the global model, so both are scored on unseen rows
+    train_rows, test_rows = train_test_split(
+        np.arange(len(data)), test_size=TEST_SIZE, random_state=SPLIT_RANDOM_STATE
+    )
+    global_model, global_scaler = engine.load(MODELS_DIR)
+    X_global = engine.encode_frame(encoder, data.iloc[test_rows])
+    if global_scaler is not None:
+        X_global = global_scaler.transform(X_global)
+    global_predictions = global_model.predict(X_global)
+
+    forests, shards, skipped = {}, {}, {}
+    for crop in sorted(np.unique(crops)):
+        crop_train = train_rows[crops[train_rows] == crop]
+        crop_test = crops[test_rows] == crop
+        if len(crop_train) < SHARD_MIN_ROWS or not crop_test.any():
+            skipped[crop] = 'too few rows'
+            continue
+
+        model = RandomForestRegressor(**SHARD_PARAMS)
+        model.fit(X[crop_train], y[crop_train])
+        shard_rmse = rmse(y[test_rows][crop_test], model.predict(X[test_rows][crop_test]))
+        global_rmse = rmse(y[test_rows][crop_test], global_predictions[crop_test])
+        if shard_rmse > global_rmse:
+            skipped[crop] = 'global model is more accurate'
+            continue
+
+        forests[crop] = FlatForest.from_sklearn(model)
+        shards[crop] = {
+            'path': shard_dirname(crop),
+            'train_rows': int(len(crop_train)),
+            'test_rmse': shard_rmse,
+            'global_test_rmse': global_rmse,
+            'n_nodes': forests[crop].n_nodes
         }
 
-        # Create dummy variables for each categorical column
-        encoded_data = data.copy()
-        for col in categorical_columns:
-            # Create dummy variables
-            dummies = pd.get_dummies(encoded_data[col], prefix=col)
-            # Add dummy variables to the dataset
-            encoded_data = pd.concat([encoded_data, dummies], axis=1)
-            # Remove the original categorical column
-            encoded_data.drop(col, axis=1, inplace=True)
-
-        # Get feature columns (all columns except 'Yield')
-        feature_columns = [col for col in encoded_data.columns if col != 'Yield']
-        
+    index = {'n_features': encoder.n_features, 'params': SHARD_PARAMS, 'shards': shards, 'skipped': skipped}
+    save_shards(CROP_SHARDS_PATH, forests, index)
+    logger.info(f"Saved {len(shards)} crop shards; {len(skipped)} crops use the global model")
+
+
+def artifact_build(engine=None, workers=None):
+    """Build graph of every derived artifact, from the crop yield CSV down"""
+    engine = selected_engine(engine)
+    workers = distributed_workers(workers) if engine.name == 'random_forest' else 0
+    dataset_params = {'cleaning_version': CLEANING_VERSION}
+    # n_jobs only changes how fast the forest trains, not what it learns
+    model_params = dict(
+        {key: value for key, value in ENGINE_PARAMS[engine.name].items() if key != 'n_jobs'},
+        engine=engine.name, test_size=TEST_SIZE, split_random_state=SPLIT_RANDOM_STATE, **dataset_params
+    )
+    if workers:
+        # Distributed jobs seed each chunk of trees, so the forest depends on
+        # the chunk size but not on the number of workers
+        model_params['trees_per_job'] = TREES_PER_JOB
+    model_outputs = [MODEL_INFO_PATH, MODEL_PATH] + [os.path.join(MODELS_DIR, name) for name in engine.extra_artifacts]
+    targets = [
+        BuildTarget(
+            'categorical_values', [CATEGORICAL_VALUES_PATH], build_categorical_values,
+            inputs=[dataset_store.path], params=dict(dataset_params, columns=CATEGORICAL_COLUMNS)
+        ),
+        BuildTarget(
+            'feature_columns', [FEATURE_COLUMNS_PATH, MODEL_FEATURES_PATH], build_feature_columns_artifacts,
+            deps=['categorical_values']
+        ),
+        BuildTarget(
+            'crop_stats', [CROP_STATS_PATH], build_crop_stats,
+            inputs=[dataset_store.path], params=dict(dataset_params, with_counts=True)
+        ),
+        BuildTarget(
+            'model', model_outputs, functools.partial(build_model, engine=engine, workers=workers),
+            inputs=[dataset_store.path], deps=['categorical_values', 'feature_columns'], params=model_params
+        ),
+        BuildTarget(
+            'feature_importance', [FEATURE_IMPORTANCE_PATH], functools.partial(build_feature_importance, engine=engine),
+            inputs=[dataset_store.path], deps=['model', 'feature_columns'], params={'engine': engine.name}
+        ),
+    ]
+    if shards_enabled():
+        targets.append(BuildTarget(
+            'crop_shards', [CROP_SHARDS_PATH], functools.partial(build_crop_shards, engine=engine),
+            inputs=[dataset_store.path], deps=['model', 'feature_columns'],
+            params=dict(
+                {key: value for key, value in SHARD_PARAMS.items() if key != 'n_jobs'},
+                min_rows=SHARD_MIN_ROWS, test_size=TEST_SIZE, split_random_state=SPLIT_RANDOM_STATE, **dataset_params
+            )
+        ))
+    return ArtifactBuild(targets, os.path.join(MODELS_DIR, MANIFEST_FILENAME), ROOT_DIR)
+
+
+def train_model(force=True, engine=None, workers=None):
+    """Rebuild the model artifacts; with ``force=False`` only stale ones are rebuilt"""
+    try:
         # Create models directory if it doesn't exist
-        models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
-        if not os.path.exists(models_dir):
-            os.makedirs(models_dir)
+        if not os.path.exists(MODELS_DIR):
+            os.makedirs(MODELS_DIR)
+
+        context = {}
+        rebuilt = artifact_build(engine, workers).build(force=force, context=context)
+        result = {'status': 'success', 'rebuilt': rebuilt}
+        for key in ('model', 'scaler', 'encoder', 'feature_columns', 'categorical_values', 'metrics'):
+            if key in context:
+                result[key] = context[key]
+        return result
+    except Exception as e:
+        logger.error(f"Error in training model: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
 
-        # Save categorical values
-        with open(os.path.join(models_dir, 'categorical_values.json'), 'w') as f:
-            json.dump(categorical_values, f)
-        logger.info("Saved categorical values")
+def regression_metrics(y_true, y_pred):
+    return {'mse': float(mean_squared_error(y_true, y_pred)), 'r2': float(r2_score(y_true, y_pred))}
 
-        # Save feature columns
-        with open(os.path.join(models_dir, 'feature_columns.json'), 'w') as f:
-            json.dump(feature_columns, f)
-        logger.info("Saved feature columns")
-
-        # Calculate and save crop statistics for denormalization
-        crop_means = data.groupby('Crop')['Yield'].mean()
-        crop_stds = data.groupby('Crop')['Yield'].std()
-        crop_stats = {
-            'means': crop_means.to_dict(),
-            'stds': crop_stds.to_dict()
-        }
-        with open(os.path.join(models_dir, 'crop_stats.json'), 'w') as f:
-            json.dump(crop_stats, f)
-        logger.info("Saved crop statistics")
 
-        # Split features and target
-        X = encoded_data[feature_columns]
-        y = encoded_data['Yield']
+def update_model(new_rows_path, n_trees=UPDATE_TREES, compare=True):
+    """Fold new dataset rows into the served model without retraining it.
 
-        # Create and fit the scaler
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        X_scaled = pd.DataFrame(X_scaled, columns=X.columns)
-
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
-        logger.info("Split data into training and test sets")
-
-        # Check for negative yield stability
-        yield_stability = np.std(y) / np.mean(y)
-        if yield_stability < 0:
-            raise ValueError("Yield stability cannot be negative.")
-
-        # Function to calculate optimal rainfall
-        def calculate_optimal_rainfall(rainfall_input):
-            optimal_rainfall = 919.82  # mm/year
-            if rainfall_input < optimal_rainfall:
-                return f'Optimal rainfall is {optimal_rainfall} mm/year.'
-            else:
-                return 'Rainfall is sufficient.'
-
-        @app.route('/rainfall', methods=['POST'])
-        def process_rainfall():
-            rainfall_input = float(request.form['rainfall'])  # Get rainfall from the request
-            rainfall_status = calculate_optimal_rainfall(rainfall_input)
-            return rainfall_status
-
-        @app.route('/api/predict', methods=['POST'])
-        def predict():
-            data = request.get_json()
-            # Validate input data
-            required_fields = ['area', 'rainfall', 'annual_rainfall', 'production', 'fertilizer', 'pesticide', 'state', 'crop', 'season']
-            for field in required_fields:
-                if field not in data:
-                    return json.dumps({'success': False, 'error': f'Missing field: {field}'})
-
-            # Check if model file exists
-            model_path = 'g:/Mini Project/models/crop_yield_model.pkl'
-            if not os.path.exists(model_path):
-                return json.dumps({'success': False, 'error': 'Model file not found.'})
-
-            # Load the trained model
-            model = joblib.load(model_path)
-
-            # Extract input data
-            area = data['area']
-            rainfall = data['rainfall']
-            annual_rainfall = data['annual_rainfall']
-            production = data['production']
-            fertilizer = data['fertilizer']
-            pesticide = data['pesticide']
-            state = data['state']
-            crop = data['crop']
-            season = data['season']
-
-            # Prepare the input features for prediction
-            input_features = np.array([[area, rainfall, annual_rainfall, production, fertilizer, pesticide]])
-
-            logger.info('Starting prediction process')
-            # Make the prediction
-            try:
-                logger.info('Calling model.predict()')
-                prediction = model.predict(input_features)
-                logger.info(f'Prediction result: {prediction}')
-                logger.info('Prediction process completed')
-                return json.dumps({'success': True, 'prediction': prediction[0]})
-            except Exception as e:
-                logger.error(f"Error during prediction: {str(e)}")
-                return json.dumps({'success': False, 'error': 'Prediction failed. Please check your input.'})
-
-        # Analyze crop yield data and adjust model training
-        crop_yield_data = pd.read_csv('data/crop_yield.csv')
-        average_yield = crop_yield_data.groupby('Crop')['Yield'].mean().reset_index()
-        print('Average Yield per Crop:', average_yield)
-
-        # Train random forest model with adjusted parameters
-        model = RandomForestRegressor(
-            n_estimators=100,
-            max_depth=None,
-            min_samples_split=2,
-            min_samples_leaf=1,
-            random_state=42,
-            n_jobs=-1
-        )
-        
-        logger.info("Training model")
-        model.fit(X_train, y_train)
-        logger.info("Model training completed")
-
-        # Save model and scaler
-        joblib.dump(model, os.path.join(models_dir, 'crop_yield_model.pkl'))
-        joblib.dump(scaler, os.path.join(models_dir, 'scaler.pkl'))
-
-        # Evaluate model
-        train_predictions = model.predict(X_train)
-        test_predictions = model.predict(X_test)
-
-        train_mse = mean_squared_error(y_train, train_predictions)
-        test_mse = mean_squared_error(y_test, test_predictions)
-        train_r2 = r2_score(y_train, train_predictions)
-        test_r2 = r2_score(y_test, test_predictions)
-
-        logger.info(f"Train MSE: {train_mse:.4f}, R2: {train_r2:.4f}")
-        logger.info(f"Test MSE: {test_mse:.4f}, R2: {test_r2:.4f}")
-
-        return {
-            'status': 'success',
-            'model': model,
-            'scaler': scaler,
-            'feature_columns': feature_columns,
-            'categorical_values': categorical_values,
-            'metrics': {
-                'train_mse': train_mse,
-                'test_mse': test_mse,
-                'train_r2': train_r2,
-                'test_r2': test_r2
+    New crops, seasons and states extend categorical_values.json (and the
+    one-hot layout, which the existing trees and scaler are remapped to),
+    per-crop statistics are updated from their running counts, and
+    ``n_trees`` trees fit on the new and recent rows are added to the
+    forest. The pickled forest, the scaler and the exported flattened
+    forest are all rewritten, so they keep matching each other. The rows
+    are appended to the dataset CSV and the updated artifacts are recorded
+    in the build manifest. A later build only rebuilds what depends on the
+    model (feature importances, crop shards); ``--force`` retrains from
+    scratch on everything.
+
+    Validation uses the original test split plus a held-out share of the new
+    rows. With ``compare`` a full retrain is fit on the same training rows
+    and scored next to the model before and after the update.
+    """
+    try:
+        engine = selected_engine()
+        if engine.name != 'random_forest':
+            raise ValueError("Incremental updates need the random forest engine; run a full build first")
+        current = joblib.load(MODEL_PATH)
+        scaler = joblib.load(SCALER_PATH)
+
+        data = load_training_data({})
+        csv_columns = pd.read_csv(dataset_store.path, nrows=0).columns.tolist()
+        raw_rows = pd.read_csv(new_rows_path)
+        missing = [col for col in csv_columns if col not in raw_rows.columns]
+        if missing:
+            raise ValueError(f"New rows are missing columns: {missing}")
+        raw_rows = raw_rows[csv_columns].dropna()
+        new_data = clean_crop_dataset(raw_rows)
+        if len(new_data) < 2:
+            raise ValueError("Need at least two new rows to update the model")
+        logger.info(f"Updating model with {len(new_data)} new rows from {new_rows_path}")
+
+        # Extend the categorical values and move the existing trees and scaler onto the new layout
+        categorical_values, added_values = extend_categorical_values(load_json(CATEGORICAL_VALUES_PATH), new_data)
+        old_columns = load_json(FEATURE_COLUMNS_PATH)
+        feature_columns = build_feature_columns(categorical_values)
+        encoder = FeatureEncoder(categorical_values, feature_columns)
+        base = remap_forest_features(current, old_columns, feature_columns)
+        scaler = extend_scaler(scaler, old_columns, feature_columns)
+        if added_values:
+            logger.info(f"New categorical values: {added_values}")
+
+        X_old, y_old = scaler.transform(encoder.encode_frame(data)), data['Yield'].to_numpy()
+        X_new, y_new = scaler.transform(encoder.encode_frame(new_data)), new_data['Yield'].to_numpy()
+        old_train, old_test = train_test_split(np.arange(len(data)), test_size=TEST_SIZE, random_state=SPLIT_RANDOM_STATE)
+        new_train, new_test = train_test_split(np.arange(len(new_data)), test_size=TEST_SIZE, random_state=SPLIT_RANDOM_STATE)
+        years = data['Crop_Year'].to_numpy()
+        recent = old_train[years[old_train] > years.max() - UPDATE_RECENT_YEARS]
+
+        trees = RandomForestRegressor(**dict(FOREST_PARAMS, n_estimators=n_trees, random_state=SPLIT_RANDOM_STATE + len(base.estimators_)))
+        trees.fit(np.vstack([X_old[recent], X_new[new_train]]), np.concatenate([y_old[recent], y_new[new_train]]))
+        updated = append_trees(base, trees)
+        logger.info(f"Added {n_trees} trees fit on {len(new_train)} new and {len(recent)} recent rows")
+
+        candidates = {'before': base, 'incremental': updated}
+        if compare:
+            logger.info("Fitting the full-retrain baseline")
+            full = RandomForestRegressor(**FOREST_PARAMS)
+            full.fit(np.vstack([X_old[old_train], X_new[new_train]]), np.concatenate([y_old[old_train], y_new[new_train]]))
+            candidates['full_retrain'] = full
+        X_val = np.vstack([X_old[old_test], X_new[new_test]])
+        y_val = np.concatenate([y_old[old_test], y_new[new_test]])
+        # Held-out new rows with a crop, season or state the model had never seen
+        unseen = np.zeros(len(new_test), dtype=bool)
+        for col, values in added_values.items():
+            unseen |= new_data[col].astype(str).iloc[new_test].isin(values).to_numpy()
+        validation = {}
+        for name, model in candidates.items():
+            predictions = model.predict(X_val)
+            new_predictions = predictions[len(old_test):]
+            validation[name] = {
+                'all': regression_metrics(y_val, predictions),
+                'new_rows': regression_metrics(y_new[new_test], new_predictions)
             }
-        }
+            if unseen.sum() > 1:
+                validation[name]['unseen_values'] = regression_metrics(y_new[new_test][unseen], new_predictions[unseen])
+
+        # Crop statistics from their running counts (older files lack counts)
+        crop_stats = load_json(CROP_STATS_PATH)
+        if 'counts' not in crop_stats:
+            crop_stats['counts'] = data.groupby('Crop', observed=True)['Yield'].count().astype(int).to_dict()
+        crop_stats = merge_crop_stats(crop_stats, new_data)
+
+        joblib.dump(updated, MODEL_PATH)
+        joblib.dump(scaler, SCALER_PATH)
+        engine.export(updated, scaler, MODELS_DIR)
+        with open(CATEGORICAL_VALUES_PATH, 'w') as f:
+            json.dump(categorical_values, f)
+        with open(FEATURE_COLUMNS_PATH, 'w') as f:
+            json.dump(feature_columns, f)
+        with open(MODEL_FEATURES_PATH, 'w') as f:
+            f.write('\n'.join(feature_columns))
+        write_crop_stats(crop_stats)
+
+        model_info = read_model_info(MODELS_DIR)
+        model_info['metrics'] = validation['incremental']['all']
+        model_info.setdefault('updates', []).append({
+            'rows': len(new_data),
+            'trees_added': n_trees,
+            'n_trees': len(updated.estimators_),
+            'added_values': added_values,
+            'validation': validation
+        })
+        with open(MODEL_INFO_PATH, 'w') as f:
+            json.dump(model_info, f, indent=2)
+
+        raw_rows.to_csv(dataset_store.path, mode='a', header=False, index=False)
+        logger.info(f"Appended {len(raw_rows)} rows to {dataset_store.path}")
+
+        # The updated artifacts now correspond to the extended CSV; record them so
+        # the next build (e.g. the server's warm-up) keeps them, then rebuild what
+        # is derived from the model on the combined dataset
+        build = artifact_build(engine.name)
+        build.record(['categorical_values', 'feature_columns', 'crop_stats', 'model'])
+        dataset_store.reload()
+        rebuilt = build.build()
+        logger.info(f"Rebuilt after the update: {', '.join(rebuilt) or 'nothing'}")
+        return {'status': 'success', 'validation': validation, 'added_values': added_values, 'rebuilt': rebuilt}
     except Exception as e:
-        logger.error(f"Error in training model: {str(e)}")
+        logger.error(f"Error in updating model: {str(e)}")
         return {'status': 'error', 'message': str(e)}
 
+def tune_model(engines=None, n_splits=5, max_workers=None, report_path=TUNING_REPORT_PATH):
+    """Cross-validated search over forest size, depth, leaf size and engines"""
+    data = load_training_data({})
+    encoder = FeatureEncoder(load_json(CATEGORICAL_VALUES_PATH), load_json(FEATURE_COLUMNS_PATH))
+    trials = grid_trials(SEARCH_SPACE, engines)
+    cache_dir = prepare_search_data(
+        data, encoder, sorted({engine for engine, _ in trials}), MODELS_DIR,
+        n_splits=n_splits, random_state=SPLIT_RANDOM_STATE
+    )
+    logger.info(f"Running {len(trials)} trials with {n_splits}-fold cross-validation")
+
+    report = run_search(cache_dir, trials, base_params=ENGINE_PARAMS, max_workers=max_workers)
+    report.to_csv(report_path, index=False)
+    logger.info(f"Saved tuning report to {report_path}")
+    return report
+
 if __name__ == '__main__':
-    result = train_model()
+    parser = argparse.ArgumentParser(description='Build the model artifacts, skipping the ones that are up to date')
+    parser.add_argument('--force', action='store_true', help='rebuild every artifact')
+    parser.add_argument('--check', action='store_true', help='list stale artifacts and exit non-zero if any')
+    parser.add_argument('--engine', choices=sorted(ENGINES),
+                        help='model engine to build (default: CROPSMART_ENGINE, else the current model\'s engine)')
+    parser.add_argument('--distributed', type=int, metavar='N',
+                        help='train the random forest as tree jobs on N worker processes '
+                             '(default: CROPSMART_DISTRIBUTED_WORKERS, else a single process)')
+    parser.add_argument('--update', metavar='CSV', help='fold the rows of CSV into the current model, then append them to the dataset')
+    parser.add_argument('--update-trees', type=int, default=UPDATE_TREES, help='trees to add with --update')
+    parser.add_argument('--skip-baseline', action='store_true', help='do not fit the full-retrain baseline with --update')
+    parser.add_argument('--tune', action='store_true', help='run the cross-validated hyperparameter search')
+    parser.add_argument('--engines', nargs='+', choices=sorted(SEARCH_SPACE), help='engines to search (default: all)')
+    parser.add_argument('--folds', type=int, default=5, help='cross-validation folds for --tune')
+    parser.add_argument('--workers', type=int, help='worker processes for --tune (default: CPU count)')
+    args = parser.parse_args()
+
+    if args.update:
+        result = update_model(args.update, n_trees=args.update_trees, compare=not args.skip_baseline)
+        if result['status'] != 'success':
+            raise SystemExit(f"Model update failed: {result['message']}")
+        rows = [
+            dict(model=name, subset=subset, **scores)
+            for name, subsets in result['validation'].items() for subset, scores in subsets.items()
+        ]
+        print(pd.DataFrame(rows).to_string(index=False, float_format='%.4f'))
+        raise SystemExit(0)
+
+    if args.tune:
+        report = tune_model(engines=args.engines, n_splits=args.folds, max_workers=args.workers)
+        with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.max_colwidth', 60):
+            print(report.drop(columns=['serving_engine']).to_string(index=False, float_format='%.4g'))
+        raise SystemExit(0)
+
+    if args.check:
+        stale = artifact_build(args.engine, args.distributed).stale_targets()
+        for name, reason in stale:
+            print(f"{name}: {reason}")
+        if stale:
+            raise SystemExit(1)
+        print("All artifacts are up to date")
+        raise SystemExit(0)
+
+    result = train_model(force=args.force, engine=args.engine, workers=args.distributed)
     if result['status'] == 'success':
-        logger.info("Model training completed successfully!")
\ No newline at end of file
+        if result['rebuilt']:
+            logger.info(f"Rebuilt artifacts: {', '.join(result['rebuilt'])}")
+        else:
+            logger.info("All artifacts are up to date; nothing to rebuild")
+    else:
+        # Non-zero exit status tells the background warm-up that training failed
+        raise SystemExit(f"Model training failed: {result.get('message', 'Unknown error')}")